@@ -1,14 +1,23 @@
 from __future__ import annotations
 import bpy                                          # type: ignore
+from bpy.app.handlers import persistent             # type: ignore
 from bpy.types import Node, NodeSocket              # type: ignore
-from typing import List, Tuple
+from typing import List, Tuple, TYPE_CHECKING
 import colorsys
 import math
-from PIL import Image, ImageDraw                    # type: ignore
 from enum import Enum
 
 import os
 import tempfile
+import time
+if TYPE_CHECKING:                                   # NumPy is imported on first use, see the functions
+    import numpy as np
+
+from . import ccn_utils as ccnu
+from . import ccn_materials as ccnm
+from . import ccn_color as ccnc
+from . import ccn_palette as ccnp
+from . import ccn_arrays as ccna
 
 #------------------------------------------------------------------------------------------------------------------    
 # Type Aliases
@@ -33,10 +42,27 @@ MONOCHROMATIC_RADIUS_VALUES     = [0.8, 0.9, 1.0] # positions in percent
 
 previous_harmony_type           = None          # to check the change of harmony type in the drop down
 
-# Create a global preview collection for the color wheel icon
-color_wheel_previews = bpy.utils.previews.new()
+# The color wheel caches keep their values if the module is reloaded (importlib.reload executes the module again
+# in its old namespace), they are only used again if their keys are still valid.
+# preview collection for the color wheel icons, created with the first icon in load_color_wheel_icon()
+color_wheel_previews = globals().get("color_wheel_previews")
 # cache the colorwheel image after creation to only generate it one time
-cached_color_wheel_image = None
+cached_color_wheel_image = globals().get("cached_color_wheel_image")
+cached_color_wheel_key = globals().get("cached_color_wheel_key")
+# node name -> key of the harmony drawn into its icon in color_wheel_previews
+color_wheel_icon_keys = globals().get("color_wheel_icon_keys", {})
+
+# Pillow is only needed to draw the color wheel icons and is imported with the first one, see load_pil()
+Image = None
+ImageDraw = None
+
+#------------------------------------------------------------------------------------------------------------------    
+def load_pil():
+    """Imports Pillow on first use, so importing and registering the add-on does not need it."""
+    global Image, ImageDraw
+    if Image is None:
+        from PIL import Image as pil_image, ImageDraw as pil_image_draw   # type: ignore
+        Image, ImageDraw = pil_image, pil_image_draw
 
 #------------------------------------------------------------------------------------------------------------------    
 class Harmony(Enum):
@@ -52,45 +78,29 @@ class Harmony(Enum):
     #--------------------
     @staticmethod
     def get_preset_angle(harmony: 'Harmony') -> float:
-        angle = 30.0
-        match harmony:
-            case Harmony.COMPLEMENTARY.value:
-                angle = 180.0
-            case Harmony.SPLIT_COMPLEMENTARY.value:
-                angle = 30.0
-            case Harmony.ANALOGOUS.value:
-                angle = 30.0
-            case Harmony.TRIADIC.value:
-                angle = 120.0
-            case Harmony.TETRADIC_SQUARE.value:
-                angle = 90.0
-            case Harmony.TETRADIC_ANGLE.value:
-                angle = 90.0
-            case Harmony.MONOCHROMATIC.value:
-                angle = 0.0
-        return angle
+        definition = ccnc.harmony_registry.get(harmony)
+        return definition.preset_angle if definition else 30.0
 
     #--------------------
     @staticmethod
     def get_num_color_pickers(harmony: 'Harmony') -> int:
-        num_color_pickers = 1
-        match harmony:
-            case Harmony.COMPLEMENTARY.value:
-                num_color_pickers = 2
-            case Harmony.SPLIT_COMPLEMENTARY.value:
-                num_color_pickers = 3
-            case Harmony.ANALOGOUS.value:
-                num_color_pickers = 3
-            case Harmony.TRIADIC.value:
-                num_color_pickers = 3
-            case Harmony.TETRADIC_SQUARE.value:
-                num_color_pickers = 4
-            case Harmony.TETRADIC_ANGLE.value:
-                num_color_pickers = 4
-            case Harmony.MONOCHROMATIC.value:
-                num_color_pickers = 3
-        return num_color_pickers
+        definition = ccnc.harmony_registry.get(harmony)
+        return definition.num_colors if definition else 1
     
+    #--------------------
+    @staticmethod
+    def uses_angle(harmony: 'Harmony') -> bool:
+        definition = ccnc.harmony_registry.get(harmony)
+        return definition.uses_angle if definition else False
+
+    #--------------------
+    @staticmethod
+    def get_enum_items(self, context):
+        """Items for the harmony EnumProperty from the harmony registry, custom harmonies included."""
+        if len(harmony_enum_items) != len(ccnc.harmony_registry):     # a harmony was registered by a script
+            update_harmony_enum_items()
+        return harmony_enum_items
+
     #--------------------
     @staticmethod
     def get_colors(node: CCNHarmonyColorNode, harmony: 'Harmony'):
@@ -118,19 +128,8 @@ class Harmony(Enum):
     #--------------------
     @staticmethod
     def get_line_indices(harmony: 'Harmony') -> List[Tuple[int, int]]:
-        line_indices = []
-        match harmony:
-            case Harmony.COMPLEMENTARY.value:
-                line_indices = [(1, 2)]
-            case Harmony.SPLIT_COMPLEMENTARY.value | Harmony.ANALOGOUS.value:
-                line_indices = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]
-            case Harmony.TRIADIC.value:
-                line_indices = [(0, 1), (0, 2), (0, 3), (1, 2), (2, 3), (3, 1)]
-            case Harmony.TETRADIC_SQUARE.value | Harmony.TETRADIC_ANGLE.value:
-                line_indices = [(1, 2), (2, 3), (3, 4), (4, 1)]
-            case Harmony.MONOCHROMATIC.value:
-                line_indices = [(0, 1), (0, 2), (0, 3)]
-        return line_indices
+        definition = ccnc.harmony_registry.get(harmony)
+        return definition.line_indices if definition else []
     
     #--------------------
     @staticmethod
@@ -145,6 +144,18 @@ class Harmony(Enum):
         return line_coords    
     
 
+#----------------------
+def update_harmony_enum_items():
+    """Rebuilds the enum items after a harmony was registered. The numbers keep the order of the registry
+    so that the values saved with the built-in harmonies stay the same."""
+    harmony_enum_items.clear()
+    for number, definition in enumerate(ccnc.harmony_registry.values()):
+        harmony_enum_items.append((definition.identifier, definition.label, f"{definition.label} Harmony", "", number))
+
+# enum items must be kept referenced by Python for dynamic EnumProperty items
+harmony_enum_items = []
+update_harmony_enum_items()
+
 #------------------------------------------------------------------------------------------------------------------    
 class HarmonyDraw():
 
@@ -169,6 +180,7 @@ class HarmonyDraw():
     @staticmethod
     def draw_marker(image, colors, radius, center):
         """Draws color markers for a list of colors on the color wheel image."""
+        load_pil()
         draw = ImageDraw.Draw(image)
         
         colors_rgb_pil = [tuple(int(c * 255) for c in color) for color in colors] # conversion in PIL RGB-Tuple (0-255)
@@ -192,6 +204,7 @@ class HarmonyDraw():
     @staticmethod
     def draw_harmony(node: CCNHarmonyColorNode, image, harmony_type, radius, center):
         """Draws harmony elements (circles, lines) on the color wheel image based on harmony type and base colors."""
+        load_pil()
         draw = ImageDraw.Draw(image)
         
         for line_points in Harmony.get_line_coords(node, harmony_type, radius, center):
@@ -256,83 +269,60 @@ def get_harmony_colors(harmony_color_node: CCNHarmonyColorNode) -> List:
         list: List of HSV color tuples (Hue, Saturation, Value) in the range 0.0-1.0, representing the harmony colors.
         Returns an empty list if the harmony type is unknown or no harmony colors are defined.
     """
-    harmony_colors_hsv = []  # Initialize empty list for harmony colors
-    
     harmony_type    = harmony_color_node.color_harmony_type
     angle           = harmony_color_node.angle
     base_color_rgb  = harmony_color_node.base_color
     base_color_hsv  = rgb_to_hsv(base_color_rgb) # Convert base color to HSV
-    
-    base_hue, base_saturation, base_value, base_alpha = base_color_hsv  # Unpack HSV values of the base color
-
-    match harmony_type:
-        case Harmony.COMPLEMENTARY.value:
-            # Complementary Harmony: 1 color (complementary color)
-            harmony_hue = (base_hue + 0.5) % 1.0  # Complementary hue is 180° (0.5 in 0.0-1.0 range) opposite
-            harmony_colors_hsv = [(harmony_hue, base_saturation, base_value, base_alpha)]  # List with only the complementary color
-
-        case Harmony.SPLIT_COMPLEMENTARY.value:
-            # Split Complementary Harmony: 2 colors (split complementary colors)
-            angle_fraction = angle / 360.0  # Convert angle to 0.0-1.0 range
-            harmony_hue1 = ((base_hue + 0.5 - angle_fraction) % 1.0)  # -angle degrees from complementary hue
-            harmony_hue2 = ((base_hue + 0.5 + angle_fraction) % 1.0)  # +angle degrees from complementary hue
-            harmony_colors_hsv = [(harmony_hue1, base_saturation, base_value, base_alpha),
-                                  (harmony_hue2, base_saturation, base_value, base_alpha)]  # List with both split complementary colors
-
-        case Harmony.ANALOGOUS.value:
-            # Analogous Harmony: 2 colors (adjacent colors)
-            angle_fraction = angle / 360.0  # Convert angle to 0.0-1.0 range
-            harmony_hue1 = ((base_hue - angle_fraction) % 1.0)  # -angle degrees from base hue
-            harmony_hue2 = ((base_hue + angle_fraction) % 1.0)  # +angle degrees from base hue
-            harmony_colors_hsv = [(harmony_hue1, base_saturation, base_value, base_alpha),
-                                  (harmony_hue2, base_saturation, base_value, base_alpha)]  # List with both analogous colors
-
-        case Harmony.TRIADIC.value:
-            # Triadic Harmony: 2 colors (equilateral triangle in the color wheel)
-            angle_fraction = angle / 360.0  # Convert angle to 0.0-1.0 range
-            harmony_hue1 = ((base_hue - angle_fraction) % 1.0)  # -angle degrees from base hue
-            harmony_hue2 = ((base_hue + angle_fraction) % 1.0)  # +angle degrees from base hue
-            harmony_colors_hsv = [(harmony_hue1, base_saturation, base_value, base_alpha),
-                                  (harmony_hue2, base_saturation, base_value, base_alpha)]  # List with both triadic colors
-
-        case Harmony.TETRADIC_SQUARE.value:
-            # Tetradic (Square) Harmony: 3 colors (square in the color wheel)
-            harmony_hue1 = (base_hue + 1/4) % 1.0  # +90 degrees from base hue
-            harmony_hue2 = (base_hue + 0.5) % 1.0  # +180 degrees from base hue
-            harmony_hue3 = (base_hue + 3/4) % 1.0  # +270 degrees from base hue
-            harmony_colors_hsv = [(harmony_hue1, base_saturation, base_value, base_alpha),
-                                  (harmony_hue2, base_saturation, base_value, base_alpha),
-                                  (harmony_hue3, base_saturation, base_value, base_alpha)]  # List with all tetradic colors
-
-        case Harmony.TETRADIC_ANGLE.value:
-            # Tetradic (Square) Harmony: 3 colors (square in the color wheel)
-            angle_fraction = angle / 360.0  # Convert angle to 0.0-1.0 range
-            
-            harmony_hue1 = (base_hue - angle_fraction) % 1.0  # +90 degrees from base hue
-            harmony_hue2 = (base_hue + angle_fraction) % 1.0  # +180 degrees from base hue
-            harmony_hue3 = (harmony_hue1 - angle_fraction) % 1.0  # +270 degrees from base hue
-            harmony_colors_hsv = [(harmony_hue1, base_saturation, base_value, base_alpha),
-                                  (harmony_hue2, base_saturation, base_value, base_alpha),
-                                  (harmony_hue3, base_saturation, base_value, base_alpha)]  # List with all tetradic colors
-
-        case Harmony.MONOCHROMATIC.value:
-            # Monochromatic Harmony: 2 colors (variations of the base color in saturation)
-            if base_saturation > 0.0:
-                harmony_saturation1 = max(0, base_saturation - 0.2)  # Reduce saturation by 0.2 (min 0.0)
-                harmony_saturation2 = max(0, base_saturation - 0.4)  # Reduce saturation by 0.4 (min 0.0)
-                harmony_colors_hsv = [(base_hue, harmony_saturation1, base_value, base_alpha), 
-                                      (base_hue, harmony_saturation2, base_value, base_alpha)]  # List with both monochromatic colors
-            else:
-                harmony_value1 = max(0, base_value - 0.2)  # Reduce saturation by 0.2 (min 0.0)
-                harmony_value2 = max(0, base_value - 0.4)  # Reduce saturation by 0.4 (min 0.0)
-                harmony_colors_hsv = [(0.0, 0.0, harmony_value1, base_alpha),
-                                      (0.0, 0.0, harmony_value2, base_alpha)]  # List with both monochromatic colors
 
-        case _:
-            print(f"Unknown harmony type: {harmony_type}") 
-            return []  # Return empty list if harmony type is unknown
+    try:
+        harmony_colors_hsv = ccnc.harmony_hsv([base_color_hsv], harmony_type, angle)[0]
+    except ValueError:
+        print(f"Unknown harmony type: {harmony_type}") 
+        return []  # Return empty list if harmony type is unknown
 
-    return harmony_colors_hsv  # Return the list of harmony colors (HSV tuples)
+    return [tuple(color) for color in harmony_colors_hsv]  # Return the list of harmony colors (HSV tuples)
+
+#----------------------
+def get_harmony_palette(harmony_color_node: CCNHarmonyColorNode) -> List:
+    """
+    Calculates the harmony colors of the node as RGBA tuples using the same kernel as the batch API.
+    The base color is not included, returns an empty list if the harmony type is unknown.
+    """
+    try:
+        palette = ccnc.harmony_palette(harmony_color_node.base_color, harmony_color_node.color_harmony_type, harmony_color_node.angle)[0]
+    except ValueError:
+        print(f"Unknown harmony type: {harmony_color_node.color_harmony_type}") 
+        return []
+    return [tuple(color) for color in palette[1:]]
+
+#----------------------
+def snap_to_palette_library(color, palette_filepath: str):
+    """
+    Returns the nearest color of the palette library file (OKLab distance), the library is loaded and indexed
+    only once. Returns the color unchanged if the file cannot be read.
+    """
+    if not palette_filepath:
+        return tuple(color)
+    try:
+        library = ccnc.get_palette_library(bpy.path.abspath(palette_filepath))
+    except (OSError, ValueError) as e:
+        print(f"Error loading palette library '{palette_filepath}': {e}")
+        return tuple(color)
+    return library.snap(tuple(color))
+
+#------------------------------------------------------------------------------------------------------------------    
+def update_live_update(self, context):
+    """
+    Enabling Live Update for a node of a file saved before the materials were remembered searches all
+    materials one time for RGB nodes generated from the node.
+    """
+    if not self.live_update or self.live_materials:
+        return
+    names = [mat.name for mat in bpy.data.materials if mat.use_nodes and mat.node_tree and
+             any(find_shader_node(mat, get_ccn_id(self.name, f"Color{i}")) is not None
+                 for i in range(1, NUM_HARMONY_COLORS + 1))]
+    self.live_materials = "\n".join(names)
+    live_links_built.discard(self.name)
 
 #------------------------------------------------------------------------------------------------------------------    
 def update_dynamic_color_wheel(self, context):  # self, context are needed because this is called from the property change
@@ -475,8 +465,8 @@ class CCNHarmonyColorNode(Node):
     color_harmony_type: bpy.props.EnumProperty( # type: ignore
                                                name = "",
                                                description = "The color harmony which you want to visualize",
-                                               items = [(harmony.value, harmony.name.replace('_', ' ').title(), f"{harmony.name.replace('_', ' ').title()} Harmony") for harmony in Harmony], 
-                                               default = Harmony.COMPLEMENTARY.value, 
+                                               items = Harmony.get_enum_items, 
+                                               default = 0,     # Complementary
                                                update = update_dynamic_color_wheel
                                               )
     previous_harmony_type: bpy.props.StringProperty( # type: ignore
@@ -508,6 +498,41 @@ class CCNHarmonyColorNode(Node):
                                    update = update_dynamic_color_wheel                                              
                                   )
     
+    live_update: bpy.props.BoolProperty( # type: ignore
+                                        name = "",
+                                        description = "If enabled, Shader RGB Nodes generated from this node get the new colors " \
+                                                      "whenever the harmony changes, without generating them again. " \
+                                                      "Manual changes of their colors are overwritten then",
+                                        default = False,
+                                        update = update_live_update
+                                       )
+
+    # names of the materials with RGB nodes generated from this node, one per line, so the live links are
+    # found without searching all materials
+    live_materials: bpy.props.StringProperty(default = "") # type: ignore
+
+    use_node_group: bpy.props.BoolProperty( # type: ignore
+                                           name = "",
+                                           description = "If enabled, the colors are generated into one shared shader node group which is instanced " \
+                                                         "in the materials. Changing the harmony then updates all materials at once",
+                                           default = False
+                                          )
+
+    snap_to_palette: bpy.props.BoolProperty( # type: ignore
+                                            name = "",
+                                            description = "If enabled, the output colors are replaced by the nearest colors of the palette library",
+                                            default = False,
+                                            update = update_dynamic_color_wheel
+                                           )
+
+    palette_filepath: bpy.props.StringProperty( # type: ignore
+                                               name = "Palette Library",
+                                               description = "Palette file with the allowed colors (.gpl, .json or one hex color per line)",
+                                               subtype = 'FILE_PATH',
+                                               default = "",
+                                               update = update_dynamic_color_wheel
+                                              )
+
     icon_id: bpy.props.IntProperty(default=-1)  # type: ignore
 
     def init(self, context):
@@ -555,19 +580,19 @@ class CCNHarmonyColorNode(Node):
         else:                
             self.base_color = self.inputs["Base Color"].default_value
 
-        harmonic_colors_rgb = [] # list of harmonic colors
-        harmony_colors_hsv = get_harmony_colors(self)
-
-        # convert the hsv colors back to rgb
-        harmonic_colors_rgb = [hsv_to_rgb(hsv_color) for hsv_color in harmony_colors_hsv]
+        harmonic_colors_rgb = get_harmony_palette(self) # list of harmonic colors
+        output_base_color = tuple(self.base_color)
+        if self.snap_to_palette:
+            output_base_color = snap_to_palette_library(output_base_color, self.palette_filepath)
+            harmonic_colors_rgb = [snap_to_palette_library(color, self.palette_filepath) for color in harmonic_colors_rgb]
 
         # Set outputs
         # base color to Color 1 always:
         if f"Color 1" in self.outputs:
-            self.outputs[f"Color 1"].default_value = self.base_color
+            self.outputs[f"Color 1"].default_value = output_base_color
 
         if f"ColorRGB 1" in self.outputs:
-            self.outputs[f"ColorRGB 1"].default_value = self.base_color[:3]
+            self.outputs[f"ColorRGB 1"].default_value = output_base_color[:3]
         for i, color in enumerate(harmonic_colors_rgb):
             # Color 1 is always the base value
             if f"Color {i + 2}" in self.outputs:
@@ -575,23 +600,38 @@ class CCNHarmonyColorNode(Node):
 
             if f"ColorRGB {i + 2}" in self.outputs:
                 self.outputs[f"ColorRGB {i + 2}"].default_value = color[:3]
-        self.load_color_wheel_icon()
+
+        # the materials instance the node group, so only the group needs the new colors
+        if self.use_node_group:
+            group = bpy.data.node_groups.get(get_harmony_group_name(self.name))
+            if group:
+                write_harmony_group_colors(group, self)
+        elif self.live_update:
+            queue_live_link_update(self)
+
+        ccnm.run_or_defer(("color_wheel_icon", self.as_pointer()), self.load_color_wheel_icon)
 
     
     def draw_buttons(self, context, layout):
         layout.prop(self, "color_harmony_type", text="Harmony")
 
-        if self.color_harmony_type in [Harmony.SPLIT_COMPLEMENTARY.value
-                                      ,Harmony.ANALOGOUS.value
-                                      ,Harmony.TRIADIC.value
-                                      ,Harmony.TETRADIC_ANGLE.value]:
+        if Harmony.uses_angle(self.color_harmony_type):
             temp_angle = Harmony.get_preset_angle(self.color_harmony_type)
             layout.label(text=f"{temp_angle:.2f}° preset angle)")
             layout.label(text=f"Angle setting is active!")
 
+        layout.prop(self, "snap_to_palette", text="Snap To Palette")
+        if self.snap_to_palette:
+            layout.prop(self, "palette_filepath", text="")
+
         if context.space_data.tree_type == 'ShaderNodeTree':
             layout.operator("node.generate_harmony_shader", text="Generate Harmony Colors", icon='NODE').node_name = self.name
+            op = layout.operator("node.generate_harmony_shader", text="Generate For Selected Objects", icon='NODE')
+            op.node_name = self.name
+            op.all_selected = True
             layout.prop(self, "auto_link", text="Auto Link")
+            layout.prop(self, "live_update", text="Live Update")
+            layout.prop(self, "use_node_group", text="Shared Node Group")
 
         if self.icon_id != -1:
             layout.template_icon(icon_value = self.icon_id, scale = COLORWHEEL_SCALE)
@@ -602,8 +642,12 @@ class CCNHarmonyColorNode(Node):
     def generate_base_color_wheel(self):
         """Generates and returns the base color wheel without harmony elements."""
         global cached_color_wheel_image  # Zugriff auf die globale Variable für den Cache
+        global cached_color_wheel_key
 
-        if cached_color_wheel_image is None:
+        wheel_key = (COLORWHEEL_ICONSIZE,)
+        if cached_color_wheel_image is None or cached_color_wheel_key != wheel_key:
+            cached_color_wheel_key = wheel_key
+            load_pil()
             width, height = COLORWHEEL_ICONSIZE, COLORWHEEL_ICONSIZE
             center_x, center_y = width // 2, height // 2
             radius = min(center_x, center_y) * 0.95
@@ -682,6 +726,16 @@ class CCNHarmonyColorNode(Node):
         global cached_color_wheel_image
         
         icon_key = self.name # Unique key for the dynamic icon
+        harmony_key = (tuple(self.base_color), self.color_harmony_type, self.angle, COLORWHEEL_ICONSIZE,
+                       MARKER_SIZE, MARKER_LINE_WIDTH, MARKER_LINE_COLOR, LINE_WIDTH, LINE_COLOR)
+        if color_wheel_previews is not None and icon_key in color_wheel_previews \
+           and color_wheel_icon_keys.get(icon_key) == harmony_key:
+            # the icon shows this harmony already, e.g. after reloading the add-on
+            icon_id = color_wheel_previews[icon_key].icon_id
+            if self.icon_id != icon_id:
+                self.icon_id = icon_id
+            return icon_id
+
         temp_filepath = os.path.join(tempfile.gettempdir(), f"{self.name}_icon.png")
         
         # reload a copy from cache to not use the reference to the cached picture
@@ -703,6 +757,7 @@ class CCNHarmonyColorNode(Node):
         image_with_harmony.save(temp_filepath) # Save PIL image to temporary file
         
         if color_wheel_previews is None:
+            import bpy.utils.previews                   # type: ignore
             color_wheel_previews = bpy.utils.previews.new()
         
         if icon_key in color_wheel_previews:
@@ -715,9 +770,205 @@ class CCNHarmonyColorNode(Node):
             print(f"Error loading color wheel image: {e}")
             return -1
 
+        color_wheel_icon_keys[icon_key] = harmony_key
         self.icon_id = color_wheel_previews[icon_key].icon_id
         return self.icon_id # Icon ID
 
+# ---------------------------------------------------------------------------------------
+# Index of the shader nodes generated by the harmony node, per material
+
+CCN_ID_PROPERTY     = "ccn_id"      # custom property on generated shader nodes, e.g. "Harmony Color:Color1"
+BSDF_INDEX_KEY      = "__BSDF__"    # index key of the first Principled BSDF of a material
+
+# material name -> {ccn id: shader node name}, rebuilt lazily with one scan of the node tree
+shader_node_index = {}
+ccnm.register_session_cache(shader_node_index)
+
+#----------------------
+def get_ccn_id(harmony_node_name: str, part: str) -> str:
+    return f"{harmony_node_name}:{part}"
+
+#----------------------
+def get_legacy_ccn_id(shader_node):
+    """Returns the ccn id of nodes generated by older versions which only have the name or label set."""
+    if shader_node.type == 'FRAME' and shader_node.name.startswith("Frame_"):
+        return get_ccn_id(shader_node.name[len("Frame_"):], "Frame")
+    if shader_node.type == 'RGB' and "_Color" in shader_node.label:
+        harmony_node_name, _, number = shader_node.label.rpartition("_Color")
+        if number.isdigit():
+            return get_ccn_id(harmony_node_name, f"Color{number}")
+    return None
+
+#----------------------
+def rebuild_shader_node_index(mat) -> dict:
+    """Scans the node tree of the material one time and returns the new index."""
+    index = {}
+    for shader_node in mat.node_tree.nodes:
+        ccn_id = shader_node.get(CCN_ID_PROPERTY)
+        if ccn_id is None:
+            ccn_id = get_legacy_ccn_id(shader_node)
+            if ccn_id is not None:
+                shader_node[CCN_ID_PROPERTY] = ccn_id
+        if ccn_id is not None:
+            index[ccn_id] = shader_node.name
+        elif shader_node.type == 'BSDF_PRINCIPLED' and BSDF_INDEX_KEY not in index:
+            index[BSDF_INDEX_KEY] = shader_node.name
+    shader_node_index[mat.name] = index
+    return index
+
+#----------------------
+def find_shader_node(mat, ccn_id: str):
+    """Returns the generated shader node with the ccn id (or the Principled BSDF) of the material or None."""
+    nodes = mat.node_tree.nodes
+    index = shader_node_index.get(mat.name)
+    if index is None:
+        index = rebuild_shader_node_index(mat)
+
+    node_name = index.get(ccn_id)
+    if node_name is None:
+        return None
+
+    shader_node = nodes.get(node_name)
+    if shader_node is not None and (ccn_id == BSDF_INDEX_KEY or shader_node.get(CCN_ID_PROPERTY) == ccn_id):
+        return shader_node
+
+    # node was renamed or removed by the user: rebuild the index one time
+    node_name = rebuild_shader_node_index(mat).get(ccn_id)
+    return nodes.get(node_name) if node_name is not None else None
+
+#----------------------
+def add_shader_node(mat, ccn_id: str, node_type: str):
+    """Creates a new shader node, tags it with the ccn id and adds it to the index."""
+    shader_node = mat.node_tree.nodes.new(type = node_type)
+    shader_node[CCN_ID_PROPERTY] = ccn_id
+    index = shader_node_index.get(mat.name)
+    if index is None:
+        index = rebuild_shader_node_index(mat)
+    index[ccn_id] = shader_node.name
+    return shader_node
+
+# ---------------------------------------------------------------------------------------
+# Shared harmony node group: one palette datablock which is instanced by all materials
+
+HARMONY_GROUP_PREFIX    = "CCNHarmony_"
+NUM_HARMONY_COLORS      = 4
+
+#----------------------
+def get_harmony_group_name(harmony_node_name: str) -> str:
+    return f"{HARMONY_GROUP_PREFIX}{harmony_node_name}"
+
+#----------------------
+def get_or_create_harmony_group(harmony_node):
+    """Returns the shader node group with the harmony colors as outputs, creates it if needed."""
+    group_name = get_harmony_group_name(harmony_node.name)
+    group = bpy.data.node_groups.get(group_name)
+    if group is None:
+        group = bpy.data.node_groups.new(group_name, 'ShaderNodeTree')
+        group_output = group.nodes.new(type = 'NodeGroupOutput')
+        group_output.location = (300, 0)
+        for i in range(1, NUM_HARMONY_COLORS + 1):
+            group.interface.new_socket(name = f"Color {i}", in_out = 'OUTPUT', socket_type = 'NodeSocketColor')
+            rgb_node = group.nodes.new(type = "ShaderNodeRGB")
+            rgb_node.name = f"Color{i}"
+            rgb_node.label = f"{harmony_node.name}_Color{i}"
+            rgb_node.location = (0, 200 - 200 * i)
+            group.links.new(rgb_node.outputs[0], group_output.inputs[i - 1])
+
+    write_harmony_group_colors(group, harmony_node)
+    return group
+
+#----------------------
+def write_harmony_group_colors(group, harmony_node):
+    """Writes the output colors of the harmony node into the group, only changed colors are written."""
+    for i in range(1, NUM_HARMONY_COLORS + 1):
+        rgb_node = group.nodes.get(f"Color{i}")
+        output_name = f"Color {i}"
+        if rgb_node is None or output_name not in harmony_node.outputs:
+            continue
+        color = tuple(harmony_node.outputs[output_name].default_value)
+        if tuple(rgb_node.outputs[0].default_value) != color:
+            rgb_node.outputs[0].default_value = color
+
+# ---------------------------------------------------------------------------------------
+# Live links: generated RGB nodes follow the harmony node without running the operator again
+
+# harmony node name -> {output number: set of (material name, shader node name)}
+live_links = {}
+# harmony node names whose live links were collected in this session (cleared with undo or loading a file)
+live_links_built = set()
+# harmony node name -> {output number: last color written to the linked RGB nodes}
+live_link_colors = {}
+# harmony node name -> {output number: color}, written by flush_live_links() at most once per redraw
+pending_live_updates = {}
+
+ccnm.register_session_cache(live_links)
+ccnm.register_session_cache(live_links_built)
+ccnm.register_session_cache(live_link_colors)
+
+#----------------------
+def register_live_link(harmony_node_name: str, output_number: int, mat_name: str, shader_node_name: str):
+    live_links.setdefault(harmony_node_name, {}).setdefault(output_number, set()).add((mat_name, shader_node_name))
+    live_link_colors.get(harmony_node_name, {}).pop(output_number, None)     # force the next write
+
+#----------------------
+def remember_live_material(harmony_node, mat_name: str):
+    """Adds the material to the materials with RGB nodes generated from the harmony node."""
+    names = harmony_node.live_materials.splitlines()
+    if mat_name not in names:
+        harmony_node.live_materials = "\n".join(names + [mat_name])
+
+#----------------------
+def build_live_links(harmony_node):
+    """
+    Collects the RGB nodes generated by the harmony node one time per session. Only the materials remembered
+    by the node are indexed, each one when it is needed.
+    """
+    live_links_built.add(harmony_node.name)
+    for mat_name in harmony_node.live_materials.splitlines():
+        mat = bpy.data.materials.get(mat_name)
+        if mat is None or not mat.use_nodes or not mat.node_tree:
+            continue
+        for i in range(1, NUM_HARMONY_COLORS + 1):
+            rgb_node = find_shader_node(mat, get_ccn_id(harmony_node.name, f"Color{i}"))
+            if rgb_node is not None:
+                register_live_link(harmony_node.name, i, mat.name, rgb_node.name)
+
+
+#----------------------
+def queue_live_link_update(harmony_node):
+    """Remembers the current output colors, they are written with the next flush."""
+    if harmony_node.name not in live_links_built:
+        build_live_links(harmony_node)
+    if not live_links.get(harmony_node.name):
+        return
+
+    pending_live_updates[harmony_node.name] = {i: tuple(harmony_node.outputs[f"Color {i}"].default_value)
+                                               for i in range(1, NUM_HARMONY_COLORS + 1)
+                                               if f"Color {i}" in harmony_node.outputs}
+    if not bpy.app.timers.is_registered(flush_live_links):
+        bpy.app.timers.register(flush_live_links, first_interval = 0.0)
+
+#----------------------
+def flush_live_links():
+    """Writes only the changed colors to the linked RGB nodes, without any search in the node trees."""
+    for harmony_node_name, colors in pending_live_updates.items():
+        links_by_output = live_links.get(harmony_node_name, {})
+        last_colors = live_link_colors.setdefault(harmony_node_name, {})
+        for output_number, color in colors.items():
+            if last_colors.get(output_number) == color:
+                continue
+            last_colors[output_number] = color
+
+            for mat_name, shader_node_name in list(links_by_output.get(output_number, ())):
+                mat = bpy.data.materials.get(mat_name)
+                rgb_node = mat.node_tree.nodes.get(shader_node_name) if mat and mat.node_tree else None
+                if rgb_node is None:
+                    links_by_output[output_number].discard((mat_name, shader_node_name))    # removed by the user
+                    continue
+                rgb_node.outputs[0].default_value = color
+    pending_live_updates.clear()
+    return None     # run only once until the next update queues new colors
+
 # ---------------------------------------------------------------------------------------
 class CCN_OT_GenerateHarmonyShader(bpy.types.Operator):
     """Creates four RGBA shader nodes which are usable as input for the shader editor color values.
@@ -726,36 +977,64 @@ class CCN_OT_GenerateHarmonyShader(bpy.types.Operator):
     bl_label = "Generate Harmony Shader Colors"
 
     node_name: bpy.props.StringProperty() # type: ignore
-    
+    all_selected: bpy.props.BoolProperty( # type: ignore
+                                         name = "All Selected",
+                                         description = "Generate the colors in all node materials of the selected objects " \
+                                                       "instead of only the active material",
+                                         default = False
+                                        )
+
+    def get_target_materials(self, context) -> List:
+        if not self.all_selected:
+            obj = context.object
+            mat = obj.active_material if obj else None
+            return [mat] if mat and mat.use_nodes else []
+
+        materials = {}
+        for obj in context.selected_objects:
+            for slot in obj.material_slots:
+                if slot.material and slot.material.use_nodes:
+                    materials[slot.material.name] = slot.material
+        return list(materials.values())
+
     def execute(self, context):
         node = context.space_data.edit_tree.nodes.get(self.node_name)
         if not node:
             self.report({'WARNING'}, f"Node '{self.node_name}' not found.")
             return {'CANCELLED'}
 
-        mat = bpy.context.object.active_material
-        if not mat or not mat.use_nodes:
-            self.report({'WARNING'}, "No active material with nodes.")
+        materials = self.get_target_materials(context)
+        if not materials:
+            self.report({'WARNING'}, "No active material with nodes." if not self.all_selected else \
+                                     "No materials with nodes on the selected objects.")
             return {'CANCELLED'}
 
-        nt = mat.node_tree
-        nodes = nt.nodes
+        num_colors = 0
+        for mat in materials:
+            if node.use_node_group:
+                color_sockets = self.generate_group_for_material(node, mat)
+            else:
+                color_sockets = self.generate_for_material(node, mat)
+            num_colors += len(color_sockets)
 
-        created_nodes = []
-        y_pos = 400
+            # Auto-Link if active
+            if getattr(node, "auto_link", False):
+                self.link_to_bsdf(mat, color_sockets)
 
-        frame = None
-        frame_name = f"Frame_{node.name}"
+        self.report({'INFO'}, f"{num_colors} Harmony Shader Colors generated in {len(materials)} material(s)!")
+        return {'FINISHED'}
 
-        for n in nodes:
-            if n.type == 'FRAME' and n.name == frame_name:
-                frame = n
-                break
+    def generate_for_material(self, node, mat) -> List:
+        """Creates or updates the RGB nodes of the harmony node in one material and returns their color outputs."""
+        created_nodes = []
+        y_pos = 400
 
+        frame = find_shader_node(mat, get_ccn_id(node.name, "Frame"))
         if not frame:
-            frame = nodes.new(type='NodeFrame')
+            frame = add_shader_node(mat, get_ccn_id(node.name, "Frame"), 'NodeFrame')
             frame.label = node.name
-            frame.name = frame_name
+            frame.name = f"Frame_{node.name}"
+            shader_node_index[mat.name][get_ccn_id(node.name, "Frame")] = frame.name  # index the name after renaming
             frame.location = (-400, y_pos + 100)
             frame.color = (0.2, 0.5, 1.0) # light blue
             frame.use_custom_color = True
@@ -764,45 +1043,53 @@ class CCN_OT_GenerateHarmonyShader(bpy.types.Operator):
             output_name = f"Color {i}"
             if output_name in node.outputs:
                 color = node.outputs[output_name].default_value
-                node_label = f"{node.name}_Color{i}"
-
-                existing_node = None
-                for n in nodes:
-                    if n.type == 'RGB' and n.label == node_label:
-                        existing_node = n
-                        break
+                ccn_id = get_ccn_id(node.name, f"Color{i}")
 
-                if existing_node:
-                    rgb_node = existing_node
+                rgb_node = find_shader_node(mat, ccn_id)
+                if rgb_node:
                     rgb_node.outputs[0].default_value = color
                 else:
-                    rgb_node = nodes.new(type="ShaderNodeRGB")
+                    rgb_node = add_shader_node(mat, ccn_id, "ShaderNodeRGB")
                     rgb_node.location = (-300, y_pos)
                     rgb_node.outputs[0].default_value = color
-                    rgb_node.label = node_label
+                    rgb_node.label = f"{node.name}_Color{i}"
                     rgb_node.width = 180
                     rgb_node.parent = frame
                     y_pos -= 180
 
                 created_nodes.append(rgb_node)                
+                register_live_link(node.name, i, mat.name, rgb_node.name)
+        remember_live_material(node, mat.name)
 
-        # Auto-Link if active
-        if getattr(node, "auto_link", False):
-            target_node = None
-            for n in nodes:
-                if n.type == 'BSDF_PRINCIPLED':
-                    target_node = n
-                    break
-
-            if target_node:
-                links = nt.links
-                input_names = ["Base Color", "Specular Tint", "Coat Tint", "Emission Color", ]
-                for rgb_node, input_name in zip(created_nodes, input_names):
-                    if input_name in target_node.inputs:
-                        links.new(rgb_node.outputs[0], target_node.inputs[input_name])
-
-        self.report({'INFO'}, f"{len(created_nodes)} Harmony Shader Colors generated!")        
-        return {'FINISHED'}
+        return [rgb_node.outputs[0] for rgb_node in created_nodes]
+
+    def generate_group_for_material(self, node, mat) -> List:
+        """Inserts an instance of the shared harmony node group into the material and returns its color outputs."""
+        group = get_or_create_harmony_group(node)
+        ccn_id = get_ccn_id(node.name, "Group")
+
+        group_node = find_shader_node(mat, ccn_id)
+        if not group_node:
+            group_node = add_shader_node(mat, ccn_id, "ShaderNodeGroup")
+            group_node.node_tree = group
+            group_node.label = node.name
+            group_node.location = (-300, 400)
+            group_node.width = 180
+        elif group_node.node_tree != group:
+            group_node.node_tree = group
+
+        return list(group_node.outputs)[:NUM_HARMONY_COLORS]
+
+    def link_to_bsdf(self, mat, color_sockets):
+        """Links the color outputs to the first Principled BSDF of the material."""
+        target_node = find_shader_node(mat, BSDF_INDEX_KEY)
+
+        if target_node:
+            links = mat.node_tree.links
+            input_names = ["Base Color", "Specular Tint", "Coat Tint", "Emission Color", ]
+            for color_socket, input_name in zip(color_sockets, input_names):
+                if input_name in target_node.inputs:
+                    links.new(color_socket, target_node.inputs[input_name])
 
 
 # ---------------------------------------------------------------------------------------
@@ -834,17 +1121,17 @@ class CCN_OT_GenerateMaterials(bpy.types.Operator):
             else:
                 color = socket.default_value
 
+            if node.use_palette_material:
+                mat = node.assign_palette_material(i, color)
+                generated_names.append(mat.name)
+                continue
+
             mat_name = f"CCNMat_{node.name}_{i+1}"
             mat = bpy.data.materials.get(mat_name)
             if not mat:
-                mat = bpy.data.materials.new(name = mat_name)
-                mat.use_nodes = True
+                mat = ccnm.new_material(mat_name)
 
-            bsdf = mat.node_tree.nodes.get("Principled BSDF")
-            if bsdf:
-                if len(color) == 3:
-                    color = (*color, 1.0)   # add alpha value if the color is RGB instead of RGBA
-                bsdf.inputs["Base Color"].default_value = color
+            ccnm.set_base_color(mat, color)
 
             generated_names.append(mat_name)
 
@@ -856,11 +1143,141 @@ class CCN_OT_GenerateMaterials(bpy.types.Operator):
                 target_obj.active_material = mat
 
         node.update_material_names(generated_names)
-        self.report({'INFO'}, f"{len(generated_names)} Materials generated and assigned.")
+        if node.use_palette_material:
+            ccnm.collect_palette_garbage()
+            users = [node.get_palette_user(i) for i, socket in enumerate(node.inputs) if isinstance(socket, CCNColorInputSocket)]
+            self.report({'INFO'}, f"{len(set(generated_names))} Materials generated and assigned, " \
+                                  f"{ccnm.get_saved_material_count(users)} Materials saved by palette sharing.")
+        else:
+            self.report({'INFO'}, f"{len(generated_names)} Materials generated and assigned.")
         return {'FINISHED'}
 
 
 
+# ---------------------------------------------------------------------------------------
+BULK_CHUNK_SECONDS      = 0.02      # time slice per timer call for the bulk material generation
+BULK_TIMER_INTERVAL     = 0.001     # pause between two time slices to keep the UI responsive
+BULK_POLL_INTERVAL      = 0.1       # interval to check progress and cancellation in the modal operator
+BULK_NAVIGATION_EVENTS  = {'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE', 'TRACKPADPAN', 'TRACKPADZOOM'}
+
+class CCN_OT_GenerateCollectionMaterials(bpy.types.Operator):
+    """Colors all objects of the target collection with the input colors of the Auto Shader Generator node.
+    Runs in time slices with progress in the status bar, ESC cancels and keeps the objects processed so far.
+    Other input except view navigation is blocked while it runs, so the whole run stays one undo step."""
+    bl_idname = "node.generate_collection_materials"
+    bl_label = "Generate Materials For Collection"
+    bl_options = {'REGISTER', 'UNDO'}       # one undo step for the whole run, also if cancelled
+
+    node_name: bpy.props.StringProperty() # type: ignore
+
+    @classmethod
+    def poll(cls, context):
+        return isinstance(context.active_node, CCNAutoShaderGeneratorNode)
+
+    def invoke(self, context, event):
+        node = context.space_data.edit_tree.nodes.get(self.node_name)
+        if not node:
+            self.report({'WARNING'}, f"Node '{self.node_name}' not found.")
+            return {'CANCELLED'}
+
+        if not node.target_collection:
+            self.report({'WARNING'}, "No target collection selected.")
+            return {'CANCELLED'}
+
+        # object names instead of references, objects could be removed while the job is running
+        self.object_names = [obj.name for obj in node.target_collection.all_objects
+                             if obj.data is not None and hasattr(obj.data, "materials")]
+        self.colors = node.get_input_colors()
+        self.use_palette_material = node.use_palette_material
+        self.palette_users = []     # user ids of this run, for the number of saved materials
+        self.index = 0
+        self.cancelled = False
+
+        # the timer function only processes the objects, progress and end are handled by the modal function
+        def process_chunk():
+            return self.process_chunk()
+        self.timer_function = process_chunk
+        bpy.app.timers.register(self.timer_function)
+
+        wm = context.window_manager
+        wm.progress_begin(0, max(1, len(self.object_names)))
+        self.poll_timer = wm.event_timer_add(BULK_POLL_INTERVAL, window = context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def process_chunk(self):
+        """Assigns colors to objects until the time slice is used up, each object is processed completely."""
+        if self.cancelled:
+            return None
+
+        end_time = time.perf_counter() + BULK_CHUNK_SECONDS
+        num_colors = len(self.colors)
+        while self.index < len(self.object_names) and time.perf_counter() < end_time:
+            obj = bpy.data.objects.get(self.object_names[self.index])
+            if obj:
+                color = self.colors[self.index % num_colors]
+                if self.use_palette_material:
+                    user = ccnm.get_user_id(obj)
+                    ccnm.assign_material(obj, ccnm.acquire_palette_material(color, user))
+                    self.palette_users.append(user)
+                else:
+                    ccnm.assign_shared_color(obj, color)
+            self.index += 1
+
+        if self.index >= len(self.object_names):
+            return None     # finished, unregisters the timer
+        return BULK_TIMER_INTERVAL
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.cancelled = True
+
+        if event.type == 'TIMER' or self.cancelled:
+            total = len(self.object_names)
+            context.window_manager.progress_update(self.index)
+            context.workspace.status_text_set(f"Generating materials: {self.index} / {total} objects (ESC to cancel)")
+
+            if self.cancelled or self.index >= total:
+                return self.finish(context)
+
+        if event.type in BULK_NAVIGATION_EVENTS:
+            return {'PASS_THROUGH'}     # the view can be moved, nothing can be edited or undone
+        return {'RUNNING_MODAL'}
+
+    def remove_timers(self, context):
+        """Stops the job, the timer function is released because it keeps a reference to the operator."""
+        self.cancelled = True
+        if self.timer_function is not None and bpy.app.timers.is_registered(self.timer_function):
+            bpy.app.timers.unregister(self.timer_function)
+        self.timer_function = None
+
+        wm = context.window_manager
+        wm.event_timer_remove(self.poll_timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+
+    def cancel(self, context):
+        # called by Blender if the operator is stopped from outside, e.g. when a file is loaded
+        self.remove_timers(context)
+
+    def finish(self, context):
+        cancelled = self.cancelled
+        self.remove_timers(context)
+        self.cancelled = cancelled
+
+        if self.use_palette_material:
+            ccnm.collect_palette_garbage()
+            saved = f", {ccnm.get_saved_material_count(self.palette_users)} Materials saved by palette sharing"
+        else:
+            saved = ""
+
+        if self.cancelled:
+            self.report({'WARNING'}, f"Cancelled after {self.index} of {len(self.object_names)} objects{saved}.")
+        else:
+            self.report({'INFO'}, f"{self.index} objects colored{saved}.")
+        return {'FINISHED'}     # also when cancelled to keep the consistent partial result as undo step
+
+
 # ---------------------------------------------------------------------------------------
 class CCNAutoShaderGeneratorNode(Node):
     '''Node to create up to four materials from the input colors and assign it to selected objects'''
@@ -880,11 +1297,63 @@ class CCNAutoShaderGeneratorNode(Node):
     obj3: bpy.props.PointerProperty(type=bpy.types.Object)     # type: ignore
     obj4: bpy.props.PointerProperty(type=bpy.types.Object)     # type: ignore
 
+    use_palette_material: bpy.props.BoolProperty( # type: ignore
+                                                 name = "Palette Material",
+                                                 description = "Inputs with the same color share one material instead of one material per input",
+                                                 default = False
+                                                )
+
+    target_collection: bpy.props.PointerProperty( # type: ignore
+                                                 name = "Collection",
+                                                 type = bpy.types.Collection,
+                                                 description = "All objects of this collection get the input colors in turn. " \
+                                                               "Uses the shared material or, if enabled, the palette materials"
+                                                )
+
     def init(self, context):
         for i in range(4):
             self.inputs.new("CCNColorInputSocket", f"Color {i+1}")
 
+    def get_input_colors(self) -> List:
+        """Returns the RGBA colors of all color inputs, linked or local."""
+        colors = []
+        for socket in self.inputs:
+            colors.append(ccna.get_input_color(socket))
+        return colors
+
+    def get_palette_user(self, index):
+        """Palette user id of an input: its target object or, without target, the input itself."""
+        target_obj = getattr(self, f"obj{index+1}", None)
+        return ccnm.get_user_id(target_obj) if target_obj else f"{self.id_data.name}:{self.name}_{index+1}"
+
+    def assign_palette_material(self, index, color):
+        """Gets the palette material for the color and assigns it to the target object of the input."""
+        mat = ccnm.acquire_palette_material(color, self.get_palette_user(index))
+        target_obj = getattr(self, f"obj{index+1}", None)
+
+        if target_obj and target_obj.type == 'MESH':
+            # replace the material in the active slot so that the previous palette material can be collected
+            if target_obj.data.materials:
+                if target_obj.active_material != mat:
+                    target_obj.active_material = mat
+            else:
+                target_obj.data.materials.append(mat)
+        return mat
+
     def update(self):
+        if self.use_palette_material:
+            names = []
+            for i, socket in enumerate(self.inputs):
+                if not getattr(self, f"mat{i+1}", ""):   # only update materials which were generated already
+                    names.append("")
+                    continue
+                color = ccna.get_input_color(socket)
+                names.append(self.assign_palette_material(i, color).name)
+            if any(names):
+                ccnm.run_or_defer(("material_names", self.as_pointer()), lambda: self.update_material_names(names))
+                ccnm.run_or_defer("palette_garbage", ccnm.collect_palette_garbage)
+            return
+
         for i, socket in enumerate(self.inputs):
             mat_name = f"CCNMat_{self.name}_{i+1}"
             mat = bpy.data.materials.get(mat_name)
@@ -899,11 +1368,7 @@ class CCNAutoShaderGeneratorNode(Node):
                 color = socket.default_value            
 
             if mat.use_nodes:  # Sicherstellen, dass Nodes aktiviert sind
-                bsdf = mat.node_tree.nodes.get("Principled BSDF")
-                if bsdf:
-                    if len(color) == 3:
-                        color = (*color, 1.0)   # Falls RGB, füge Alpha hinzu
-                    bsdf.inputs["Base Color"].default_value = color
+                ccnm.set_base_color(mat, color)
             
             # assign the material
             target_obj = getattr(self, f"obj{i+1}", None)
@@ -914,6 +1379,7 @@ class CCNAutoShaderGeneratorNode(Node):
 
     def draw_buttons(self, context, layout):
         layout.operator("node.generate_materials", text="Generate & Assign").node_name = self.name
+        layout.prop(self, "use_palette_material")
         
         col = layout.column(align=True)
         col.label(text="Assign To Objects:")
@@ -922,6 +1388,12 @@ class CCNAutoShaderGeneratorNode(Node):
         col.prop(self, "obj3", text="Object 3")
         col.prop(self, "obj4", text="Object 4")
 
+        col.separator()
+        col.prop(self, "target_collection", text="Collection")
+        row = col.row()
+        row.enabled = self.target_collection is not None
+        row.operator("node.generate_collection_materials", text="Color Collection").node_name = self.name
+
         col.separator()
         col.label(text="Materials:")
         for mat in [self.mat1, self.mat2, self.mat3, self.mat4]:
@@ -934,10 +1406,419 @@ class CCNAutoShaderGeneratorNode(Node):
     def update_material_names(self, names):
         self.mat1, self.mat2, self.mat3, self.mat4 = (names + [""] * 4)[:4]
         
+# ---------------------------------------------------------------------------------------
+class CCNShaderRowItem(bpy.types.PropertyGroup):
+    """One row of the Auto Shader Table node: color input, target and generated material"""
+    target_object: bpy.props.PointerProperty(type = bpy.types.Object, name = "Object")            # type: ignore
+    target_collection: bpy.props.PointerProperty(type = bpy.types.Collection, name = "Collection")  # type: ignore
+    material_name: bpy.props.StringProperty(name = "Material", description = "Name of the material, generated if empty")  # type: ignore
+
+    # state of the last update, rows without changes are skipped
+    last_color: bpy.props.FloatVectorProperty(size = 4, default = (-1.0, -1.0, -1.0, -1.0))      # type: ignore
+    last_target: bpy.props.StringProperty()                                                     # type: ignore
+
+    def get_target_key(self) -> str:
+        """
+        Changes with the target, the objects of a target collection and the material, the material is then
+        assigned again. Empty if the row has no target.
+        """
+        if self.target_collection:
+            objects = self.target_collection.all_objects
+            members = hash(tuple(obj.as_pointer() for obj in objects))
+            target = f"COLLECTION:{self.target_collection.name}:{len(objects)}:{members:x}"
+        elif self.target_object:
+            target = f"OBJECT:{self.target_object.name}"
+        else:
+            return ""
+        return f"{target}|{self.material_name}"
+
+    def get_target_objects(self) -> List:
+        if self.target_collection:
+            return [obj for obj in self.target_collection.all_objects if obj.data is not None and hasattr(obj.data, "materials")]
+        if self.target_object and self.target_object.data is not None and hasattr(self.target_object.data, "materials"):
+            return [self.target_object]
+        return []
+
+# ---------------------------------------------------------------------------------------
+class CCNAutoShaderTableNode(Node):
+    '''Node with a variable number of rows, each creates a material from its color input and assigns it to an object or collection'''
+    bl_idname = "CCNAutoShaderTableNodeType"
+    bl_label = "Auto Shader Table"
+    bl_icon = "MATERIAL"
+    bl_width_default = 300
+
+    rows: bpy.props.CollectionProperty(type = CCNShaderRowItem)  # type: ignore
+
+    def init(self, context):
+        self.add_row()
+
+    def add_row(self):
+        self.rows.add()
+        self.inputs.new("CCNColorInputSocket", f"Color {len(self.rows)}")
+
+    def remove_row(self, index: int):
+        if not 0 <= index < len(self.rows):
+            return
+        self.rows.remove(index)
+        self.inputs.remove(self.inputs[index])
+        for i, socket in enumerate(self.inputs):     # keep the socket names in the order of the rows
+            socket.name = f"Color {i + 1}"
+
+    def update(self):
+        for i, (row, socket) in enumerate(zip(self.rows, self.inputs)):
+            color = ccna.get_input_color(socket)
+
+            mat = bpy.data.materials.get(row.material_name) if row.material_name else None
+            if mat is None:
+                if not row.target_collection and not row.target_object:
+                    continue    # materials are only created for rows with a target
+                mat = ccnm.new_material(row.material_name or f"CCNMat_{self.name}_{i+1}")
+                row.material_name = mat.name
+
+            target_key = row.get_target_key()
+            color_changed = tuple(row.last_color) != color
+            target_changed = row.last_target != target_key
+            if not color_changed and not target_changed:
+                continue    # nothing to do for this row
+
+            # also for a changed target: another material gets the color of the row, too
+            ccnm.set_base_color(mat, color)
+            row.last_color = color
+
+            if target_changed:
+                for obj in row.get_target_objects():
+                    ccnm.assign_material(obj, mat)
+                row.last_target = target_key
+
+    def draw_buttons(self, context, layout):
+        col = layout.column(align = True)
+        for i, row in enumerate(self.rows):
+            box = col.box()
+            header = box.row()
+            header.label(text = f"Color {i + 1}", icon = "CHECKMARK" if row.material_name else "ERROR")
+            op = header.operator("node.remove_shader_row", text = "", icon = 'REMOVE')
+            op.node_name = self.name
+            op.index = i
+            box.prop(row, "target_object", text = "Object")
+            box.prop(row, "target_collection", text = "Collection")
+            box.prop(row, "material_name", text = "", icon = "MATERIAL")
+
+        layout.operator("node.add_shader_row", text = "Add Row", icon = 'ADD').node_name = self.name
+
+# ---------------------------------------------------------------------------------------
+class CCN_OT_AddShaderRow(bpy.types.Operator):
+    '''Add a row to the Auto Shader Table node'''
+    bl_idname = "node.add_shader_row"
+    bl_label = "Add Shader Row"
+
+    node_name: bpy.props.StringProperty() # type: ignore
+
+    def execute(self, context):
+        node = context.space_data.edit_tree.nodes.get(self.node_name)
+        if not isinstance(node, CCNAutoShaderTableNode):
+            self.report({'WARNING'}, f"Node '{self.node_name}' not found.")
+            return {'CANCELLED'}
+        node.add_row()
+        return {'FINISHED'}
+
+# ---------------------------------------------------------------------------------------
+class CCN_OT_RemoveShaderRow(bpy.types.Operator):
+    '''Remove a row from the Auto Shader Table node, the generated material is kept'''
+    bl_idname = "node.remove_shader_row"
+    bl_label = "Remove Shader Row"
+
+    node_name: bpy.props.StringProperty() # type: ignore
+    index: bpy.props.IntProperty() # type: ignore
+
+    def execute(self, context):
+        node = context.space_data.edit_tree.nodes.get(self.node_name)
+        if not isinstance(node, CCNAutoShaderTableNode):
+            self.report({'WARNING'}, f"Node '{self.node_name}' not found.")
+            return {'CANCELLED'}
+        node.remove_row(self.index)
+        return {'FINISHED'}
+
+# ---------------------------------------------------------------------------------------
+MAX_PALETTE_COLORS = 8
+
+# (path, mtime) of palette index files already loaded into the palette cache
+loaded_palette_indices = set()
+
+def load_palette_index(index_filepath: str):
+    """Loads the palette index one time, again only if the file was changed."""
+    if not os.path.isfile(index_filepath):
+        return
+    key = (index_filepath, os.stat(index_filepath).st_mtime_ns)
+    if key not in loaded_palette_indices:
+        ccnp.load_palette_index(index_filepath)
+        loaded_palette_indices.add(key)
+
+# ------------------------------------------------
+# image name -> number of depsgraph updates of the image, changes the palette cache key of images in memory
+image_versions = {}
+image_refresh_count = 0     # increased by the Refresh Tree operator, e.g. after painting an image without depsgraph update
+
+# ------------------------------------------------
+def get_image_signature(image) -> tuple:
+    """Cheap change signal of an image in memory, the pixels are only read when it changes."""
+    packed_size = image.packed_file.size if image.packed_file else 0
+    generated = (image.generated_type, image.generated_width, image.generated_height, tuple(image.generated_color)) \
+                if image.source == 'GENERATED' else None
+    return (image.name_full, tuple(image.size), image.channels, image.source, image.is_dirty, packed_size, generated,
+            image_versions.get(image.name_full, 0), image_refresh_count)
+
+# ------------------------------------------------
+@persistent
+def image_change_handler(scene, depsgraph):
+    if not depsgraph.id_type_updated('IMAGE'):
+        return
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Image):
+            image_versions[update.id.name_full] = image_versions.get(update.id.name_full, 0) + 1
+
+# ------------------------------------------------
+def register_image_change_handler():
+    ccnu.register_app_handlers((("depsgraph_update_post", image_change_handler),))
+
+# ------------------------------------------------
+def unregister_image_change_handler():
+    ccnu.unregister_app_handlers((("depsgraph_update_post", image_change_handler),))
+
+# ---------------------------------------------------------------------------------------
+class CCNPaletteExtractNode(Node):
+    '''Extracts the dominant colors of an image or image file, e.g. as Base Color for the Harmony Color node'''
+    bl_idname = 'CCNPaletteExtractNodeType'
+    bl_label = 'Palette Extract'
+    bl_icon = 'IMAGE_DATA'
+
+    image: bpy.props.PointerProperty( # type: ignore
+                                     name = "Image",
+                                     type = bpy.types.Image,
+                                     description = "Image to extract the colors from",
+                                     update = update_dynamic_color_wheel
+                                    )
+    filepath: bpy.props.StringProperty( # type: ignore
+                                       name = "File",
+                                       subtype = 'FILE_PATH',
+                                       description = "Image file to extract the colors from if no image is selected",
+                                       update = update_dynamic_color_wheel
+                                      )
+    index_filepath: bpy.props.StringProperty( # type: ignore
+                                             name = "Palette Index",
+                                             subtype = 'FILE_PATH',
+                                             description = "Optional palette index created by ccn_palette_batch.py, " \
+                                                           "indexed images are not decoded again",
+                                             update = update_dynamic_color_wheel
+                                            )
+    num_colors: bpy.props.IntProperty( # type: ignore
+                                      name = "Colors",
+                                      min = 1, max = MAX_PALETTE_COLORS, default = 4,
+                                      description = "Number of dominant colors, sorted by their share of the image",
+                                      update = update_dynamic_color_wheel
+                                     )
+
+    def init(self, context):
+        for i in range(1, MAX_PALETTE_COLORS + 1):
+            self.outputs.new("CCNColorOutputSocket", f"Color {i}")
+        self.update()
+
+    def get_palette(self):
+        """
+        Returns the (num_colors, 4) palette from the cache or calculates it and if it is sRGB encoded,
+        (None, False) if there is no image.
+        """
+        import numpy as np
+        if self.index_filepath:
+            load_palette_index(bpy.path.abspath(self.index_filepath))
+
+        if self.image:
+            image = self.image
+            filepath = bpy.path.abspath(image.filepath, library = image.library) if image.source == 'FILE' else ""
+            # unchanged images on disk are decoded with Pillow at reduced size, which is much faster than image.pixels
+            if filepath and not image.packed_file and not image.is_dirty and os.path.isfile(filepath):
+                return ccnp.get_file_palette(filepath, self.num_colors), True
+
+            width, height = image.size
+            if width * height == 0:
+                return None, False
+
+            def read_pixels():
+                pixels = np.empty(width * height * image.channels, dtype = np.float32)
+                image.pixels.foreach_get(pixels)
+                return pixels.reshape(-1, image.channels)
+
+            # byte buffers hold the encoded values, float buffers are linear
+            is_srgb = not image.is_float and image.colorspace_settings.name == 'sRGB'
+            return ccnp.get_pixel_palette(get_image_signature(image), read_pixels, self.num_colors), is_srgb
+
+        if self.filepath:
+            filepath = bpy.path.abspath(self.filepath)
+            if os.path.isfile(filepath):
+                return ccnp.get_file_palette(filepath, self.num_colors), True
+            print(f"Image file not found: {filepath}")
+        return None, False
+
+    def update(self):
+        import numpy as np
+        try:
+            palette, is_srgb = self.get_palette()
+        except Exception as e:
+            print(f"Error extracting palette: {e}")
+            palette, is_srgb = None, False
+        if palette is not None and is_srgb:
+            # the output sockets are scene linear
+            palette = np.concatenate((ccnc.srgb_to_linear_array(palette[:, :3]), palette[:, 3:]), axis = 1)
+
+        for i, socket in enumerate(self.outputs):
+            socket.enabled = i < self.num_colors
+            if palette is not None and i < self.num_colors:
+                color = tuple(float(c) for c in palette[i])
+                if tuple(socket.default_value) != color:
+                    socket.default_value = color
+
+    def draw_buttons(self, context, layout):
+        layout.template_ID(self, "image", open = "image.open")
+        if not self.image:
+            layout.prop(self, "filepath", text = "")
+        layout.prop(self, "num_colors")
+        layout.prop(self, "index_filepath", text = "Index")
+
+# ---------------------------------------------------------------------------------------
+MAX_RAMP_STOPS = 4
+
+# node name -> key of the colors last written to its collection, to skip unchanged updates
+ramp_assign_keys = {}
+ccnm.register_session_cache(ramp_assign_keys)
+
+class CCNColorRampNode(Node):
+    '''Interpolates any number of colors between the input colors and spreads them over the objects of a collection'''
+    bl_idname = 'CCNColorRampNodeType'
+    bl_label = 'Color Ramp'
+    bl_icon = 'NODE_TEXTURE'
+
+    num_stops: bpy.props.IntProperty( # type: ignore
+                                     name = "Stops",
+                                     min = 2, max = MAX_RAMP_STOPS, default = 2,
+                                     description = "Number of color inputs used as stops of the ramp",
+                                     update = update_dynamic_color_wheel
+                                    )
+    steps: bpy.props.IntProperty( # type: ignore
+                                 name = "Steps",
+                                 min = 2, soft_max = 256, max = 4096, default = 16,
+                                 description = "Number of colors calculated between the first and the last stop",
+                                 update = update_dynamic_color_wheel
+                                )
+    color_space: bpy.props.EnumProperty( # type: ignore
+                                        name = "Interpolation",
+                                        items = [('OKLAB', "OKLab", "Perceptually even steps"),
+                                                 ('HSV', "HSV", "Along the color wheel, the hue takes the shorter way")],
+                                        default = 'OKLAB',
+                                        update = update_dynamic_color_wheel
+                                       )
+    target_collection: bpy.props.PointerProperty( # type: ignore
+                                                 name = "Collection",
+                                                 type = bpy.types.Collection,
+                                                 description = "The ramp colors are spread evenly over all objects of this collection",
+                                                 update = update_dynamic_color_wheel
+                                                )
+    use_shared_material: bpy.props.BoolProperty( # type: ignore
+                                                name = "Shared Material",
+                                                description = "Assign the shared material which shows the object color. " \
+                                                              "Otherwise only the object color is set",
+                                                default = True,
+                                                update = update_dynamic_color_wheel
+                                               )
+
+    def init(self, context):
+        for i in range(1, MAX_RAMP_STOPS + 1):
+            self.inputs.new("CCNColorInputSocket", f"Color {i}")
+        self.outputs.new("CCNColorOutputSocket", "First")
+        self.outputs.new("CCNColorOutputSocket", "Last")
+        # all colors of the ramp, e.g. for the Object Color of an Object Target Node with a collection
+        self.outputs.new("CCNArraySocket", "Colors")
+        self.update()
+
+    def get_stop_colors(self) -> List:
+        """Returns the RGBA colors of the used inputs, linked or local."""
+        colors = []
+        for socket in self.inputs[:self.num_stops]:
+            colors.append(ccna.get_input_color(socket))
+        return colors
+
+    def get_ramp(self) -> np.ndarray:
+        """Returns the (steps, 4) RGBA colors of the ramp."""
+        return ccnc.ramp_colors(self.get_stop_colors(), self.steps, self.color_space)
+
+    def update(self):
+        import numpy as np
+        for i, socket in enumerate(self.inputs):
+            socket.enabled = i < self.num_stops
+
+        ramp = self.get_ramp()
+        self.outputs["First"].default_value = tuple(ramp[0])
+        self.outputs["Last"].default_value = tuple(ramp[-1])
+        if "Colors" in self.outputs:    # not in nodes created by older versions
+            ccna.set_output_value(self.outputs["Colors"], ramp.astype(np.float32))
+
+        collection = self.target_collection
+        if collection is None:
+            ramp_assign_keys.pop(self.name, None)
+            return
+        # the objects themselves, so also a change of the members with the same count is applied
+        members = tuple(ccnm.get_user_id(obj) for obj in collection.all_objects)
+        key = (collection.name, members, self.use_shared_material, ramp.tobytes())
+        if ramp_assign_keys.get(self.name) != key:
+            ccnm.set_collection_colors(collection, ramp, self.use_shared_material)
+            ramp_assign_keys[self.name] = key
+
+    def draw_buttons(self, context, layout):
+        layout.prop(self, "num_stops")
+        layout.prop(self, "steps")
+        layout.prop(self, "color_space", text = "")
+        layout.prop(self, "target_collection", text = "")
+        layout.prop(self, "use_shared_material")
+
+# ---------------------------------------------------------------------------------------
+class CCN_OT_BatchHarmony(bpy.types.Operator):
+    """Calculates a harmony palette for each selected object from its object color in one vectorized step.
+    The palette is stored in the custom property "ccn_palette" and one palette color is written to the object color."""
+    bl_idname = "object.ccn_batch_harmony"
+    bl_label = "Batch Harmony Palettes"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    harmony_type: bpy.props.EnumProperty( # type: ignore
+                                         name = "Harmony",
+                                         items = Harmony.get_enum_items,
+                                         default = 0     # Complementary
+                                        )
+    angle: bpy.props.FloatProperty(name = "Angle", min = 1.0, max = 180.0, default = 30.0)   # type: ignore
+    color_index: bpy.props.IntProperty( # type: ignore
+                                       name = "Object Color",
+                                       description = "Palette color written to the object color, 1 is the base color",
+                                       min = 1, max = 4, default = 2
+                                      )
+
+    @classmethod
+    def poll(cls, context):
+        return bool(context.selected_objects)
+
+    def execute(self, context):
+        objects = list(context.selected_objects)
+        palettes = ccnc.harmony_palette([tuple(obj.color) for obj in objects], self.harmony_type, self.angle)
+        index = min(self.color_index, palettes.shape[1]) - 1
+
+        for obj, palette in zip(objects, palettes):
+            obj["ccn_palette"] = palette.ravel().tolist()
+            obj.color = palette[index]
+
+        self.report({'INFO'}, f"{len(objects)} Harmony Palettes generated.")
+        return {'FINISHED'}
+
 # ---------------------------------------------------------------------------------------
 def cleanup_color_wheel_previews():
     global color_wheel_previews
     if color_wheel_previews is not None:
         bpy.utils.previews.remove(color_wheel_previews)
         color_wheel_previews = None
+    color_wheel_icon_keys.clear()
 
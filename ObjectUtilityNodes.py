@@ -1,10 +1,24 @@
 from __future__ import annotations
+import re
+import time
 import bpy                                          # type: ignore
+import blf                                          # type: ignore
+from bpy.app.handlers import persistent             # type: ignore
 from bpy.types import Node, NodeSocket, Operator    # type: ignore
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:                                   # NumPy is imported on first use, see the functions
+    import numpy as np
 
 from . import ccn_utils as ccnu
+from . import ccn_materials as ccnm
+from . import ccn_arrays as ccna
+from . import ccn_expression as ccnx
+from . import ccn_fusion as ccnf
 from . import ColorHarmonyNodes as chn
 
+# socket pointers are invalid after undo or loading a file
+ccnm.register_session_cache(ccna.array_store)
+
 tree_id = None              # used to assign the created editor to the "update_callback" function
 
 def update_tree_id(new_id):
@@ -15,6 +29,7 @@ def update_tree_id(new_id):
 # -------------------------------------------------------
 def update_callback(self, context):
     global tree_id
+    invalidate_tree_caches()    # a changed property can change the fused groups or the time-dependent nodes
     for tree in bpy.data.node_groups:
         if tree.bl_idname == tree_id:
             process_tree(tree)
@@ -28,14 +43,32 @@ def update_callback(self, context):
     bpy.context.view_layer.update()
 
 # -------------------------------------------------------
-def process_tree(node_tree):
+def process_tree(node_tree, nodes = None, deadline: float | None = None) -> list:
+    """
+    Updates the nodes of the tree in the order of their links. If nodes are given, only these are updated and
+    the others keep their values. Nodes not reached before the time.perf_counter() deadline are skipped.
+    Returns the skipped nodes.
+    """
     global icon_id
-    processed_nodes = set()
+    # nodes which are not updated count as processed
+    processed_nodes = set() if nodes is None else {node for node in node_tree.nodes if node not in nodes}
+    # linked arithmetic nodes are calculated together by one compiled kernel
+    fused_groups = get_cached_fused_groups(node_tree)
     
     # function to process the tree in the right order
     def process_node(node):
         if node in processed_nodes:
             return  # Node already processed
+        if deadline is not None and time.perf_counter() > deadline:
+            return  # out of time, the node keeps its values
+
+        group = fused_groups.get(node)
+        if group is not None:
+            processed_nodes.update(group.nodes)
+            for source_node in group.source_nodes:
+                process_node(source_node)
+            group.process()
+            return
         
         # first process the linked parent node
         for input_socket in node.inputs:
@@ -47,6 +80,8 @@ def process_tree(node_tree):
         #     node.load_color_wheel_icon()
         
         # no further or no links: now process the current node
+        if deadline is not None and time.perf_counter() > deadline:
+            return
         if hasattr(node, 'update'):
             node.update()  
         processed_nodes.add(node)
@@ -56,6 +91,7 @@ def process_tree(node_tree):
         process_node(node)
         # if all(not input_socket.is_linked for input_socket in node.inputs):
         #     process_node(node)
+    return [node for node in node_tree.nodes if node not in processed_nodes]
 
 # # -------------------------------------------------------
 # class CCNMessageOperator(bpy.types.Operator):
@@ -98,6 +134,18 @@ class CCNUpdateNode(Node):
     bl_label = 'Update Node'
     bl_icon = 'FILE_REFRESH'
 
+    use_frame_change: bpy.props.BoolProperty( # type: ignore
+                                             name = "Frame Change Evaluation",
+                                             description = "Evaluate the nodes which depend on the frame (animated values and objects) " \
+                                                           "on every frame change, e.g. during playback",
+                                             default = False)
+
+    frame_budget: bpy.props.FloatProperty( # type: ignore
+                                          name = "Budget (ms)",
+                                          description = "Time per frame for the evaluation. Nodes which are not reached in time keep " \
+                                                        "their values until the next frame, icons and material cleanup wait until later",
+                                          default = 10.0, min = 0.1, soft_max = 100.0)
+
     def init(self, context):
         self.use_custom_color = True  # activates user-defined colors
         self.color = (0.6, 0.6, 0.0)
@@ -105,6 +153,19 @@ class CCNUpdateNode(Node):
     def draw_buttons(self, context, layout):
         # add refresh button
         layout.operator("ccn.refresh_node_tree", text="Refresh Tree")
+        layout.operator("ccn.bake_animation", text="Bake Animation", icon='REC')
+        layout.prop(self, "use_frame_change")
+        if self.use_frame_change:
+            layout.prop(self, "frame_budget")
+            stats = frame_change_stats.get(self.id_data.as_pointer())
+            if stats is not None:
+                col = layout.column(align=True)
+                col.label(text=f"Last frame: {stats.last_time:.1f} ms, {stats.evaluated_nodes} nodes")
+                col.label(text=f"Over budget: {stats.over_budget_frames} of {stats.frames} frames")
+                col.label(text=f"Dropped node updates: {stats.dropped_nodes}")
+                col.label(text=f"Deferred tasks waiting: {stats.pending_tasks}")
+        if context.preferences.view.show_developer_ui:
+            layout.operator("ccn.reload_addon", text="Reload Add-on", icon='FILE_REFRESH')
 
 # -------------------------------------------------------
 class CCNRefreshOperator(Operator):
@@ -113,6 +174,7 @@ class CCNRefreshOperator(Operator):
     bl_label = "Refresh Node-Tree"
 
     def execute(self, context):
+        chn.image_refresh_count += 1     # images in memory are read again by the Palette Extract nodes
         update_callback(self, bpy.context)
         #self.report({'INFO'}, "Node-Tree refreshed")
         return {'FINISHED'}
@@ -130,6 +192,13 @@ class CCNObjectSelectorNode(Node):
                                                description="Select an object from the scene",
                                                update = update_callback)
 
+    target_collection: bpy.props.PointerProperty( # type: ignore
+                                                 name = "Collection",
+                                                 type = bpy.types.Collection,
+                                                 description = "If selected, the outputs are arrays with the values of all objects " \
+                                                               "of this collection instead of the values of one object",
+                                                 update = update_callback)
+
     def init(self, context):
         # Outputs for location (x, y, z)
         self.outputs.new('CCNCustomFloatSocket', "X Location")
@@ -141,30 +210,53 @@ class CCNObjectSelectorNode(Node):
         self.outputs.new('CCNCustomFloatSocket', "Y Dimension")
         self.outputs.new('CCNCustomFloatSocket', "Z Dimension")
 
+        # object colors, only filled for a collection
+        self.outputs.new('CCNArraySocket', "Colors")
+
+    def update_collection(self, collection):
+        """Reads the locations, dimensions and colors of all objects of the collection in bulk into arrays."""
+        import numpy as np
+        objects = collection.all_objects
+        count = len(objects)
+        for attribute, name in (("location", "Location"), ("dimensions", "Dimension")):
+            values = np.empty(count * 3, dtype = np.float32)
+            objects.foreach_get(attribute, values)
+            values = values.reshape(count, 3)
+            for i, axis in enumerate("XYZ"):
+                ccna.set_output_value(self.outputs[f"{axis} {name}"], values[:, i].copy())
+
+        if "Colors" in self.outputs:
+            colors = np.empty(count * 4, dtype = np.float32)
+            objects.foreach_get("color", colors)
+            ccna.set_output_value(self.outputs["Colors"], colors.reshape(count, 4))
+
     def update(self):
+        if self.target_collection:
+            self.update_collection(self.target_collection)
         # check if an object is selected
-        if self.selected_object:
+        elif self.selected_object:
             obj = self.selected_object
             if not obj or obj.name not in bpy.data.objects:
                 return
             # update location values
-            self.outputs["X Location"].default_value = obj.location.x
-            self.outputs["Y Location"].default_value = obj.location.y
-            self.outputs["Z Location"].default_value = obj.location.z
+            ccna.set_output_value(self.outputs["X Location"], obj.location.x)
+            ccna.set_output_value(self.outputs["Y Location"], obj.location.y)
+            ccna.set_output_value(self.outputs["Z Location"], obj.location.z)
 
             # update dimension values
-            self.outputs["X Dimension"].default_value = obj.dimensions.x
-            self.outputs["Y Dimension"].default_value = obj.dimensions.y
-            self.outputs["Z Dimension"].default_value = obj.dimensions.z
+            ccna.set_output_value(self.outputs["X Dimension"], obj.dimensions.x)
+            ccna.set_output_value(self.outputs["Y Dimension"], obj.dimensions.y)
+            ccna.set_output_value(self.outputs["Z Dimension"], obj.dimensions.z)
         else:
             # if no object is selected, set the default to 0
             for output in self.outputs:
-                output.default_value = 0.0
+                ccna.set_output_value(output, 0.0)
 
     def draw_buttons(self, context, layout):
         layout.prop(self, "selected_object", text="Select Object")
+        layout.prop(self, "target_collection", text="Collection")
         # show output values
-        if not self.selected_object:
+        if not self.selected_object and not self.target_collection:
             layout.label(text="No object selected")
 
 # -------------------------------------------------------
@@ -180,6 +272,27 @@ class CCNObjectTargetNode(Node):
                                                description = "Select an object from the scene which should be changed",
                                                update = update_callback)
 
+    use_shared_material: bpy.props.BoolProperty( # type: ignore
+                                                name = "Shared Material",
+                                                description = "Use one shared material for all objects and write the color into the object color " \
+                                                              "instead of creating a material per object",
+                                                default = False,
+                                                update = update_callback)
+
+    use_palette_material: bpy.props.BoolProperty( # type: ignore
+                                                 name = "Palette Material",
+                                                 description = "Share one material with all objects which get the same color " \
+                                                               "instead of creating a material per object",
+                                                 default = False,
+                                                 update = update_callback)
+
+    target_collection: bpy.props.PointerProperty( # type: ignore
+                                                 name = "Collection",
+                                                 type = bpy.types.Collection,
+                                                 description = "If selected, the linked inputs are written to all objects of this collection at once, " \
+                                                               "an array input gives each object its own value",
+                                                 update = update_callback)
+
     def init(self, context):
         # Inputs for location (x, y, z)
         self.inputs.new('CCNCustomFloatSocket', "X Location")
@@ -197,17 +310,12 @@ class CCNObjectTargetNode(Node):
     def assign_material_to_object(self, obj, color):
         # check if the material already exists
         mat_name = f"Material_{obj.name}"
-        if mat_name not in bpy.data.materials:
-            mat = bpy.data.materials.new(name=mat_name)
-            mat.use_nodes = True
-        else:
-            mat = bpy.data.materials[mat_name]
+        mat = bpy.data.materials.get(mat_name)
+        if mat is None:
+            mat = ccnm.new_material(mat_name)
 
         # set base color to the material
-        bsdf_node = mat.node_tree.nodes.get("Principled BSDF")
-        if bsdf_node:
-            bsdf_node.inputs["Base Color"].default_value = color
-        else:
+        if not ccnm.set_base_color(mat, color):
             print(f"No Principled BSDF found in material {mat.name}")
 
         # assign the material to the object
@@ -216,7 +324,53 @@ class CCNObjectTargetNode(Node):
         else:
             obj.data.materials.append(mat)
 
+    def update_collection(self, collection):
+        """
+        Writes the linked location, dimension and color inputs to all objects of the collection in bulk.
+        Single values are used for all objects, arrays give each object its own value.
+        """
+        import numpy as np
+        objects = collection.all_objects
+        count = len(objects)
+        if count == 0:
+            return
+
+        for attribute, name in (("location", "Location"), ("dimensions", "Dimension")):
+            linked_axes = [i for i, axis in enumerate("XYZ") if self.inputs[f"{axis} {name}"].is_linked]
+            if not linked_axes:
+                continue
+            values = np.empty(count * 3, dtype = np.float32)
+            objects.foreach_get(attribute, values)
+            values = values.reshape(count, 3)
+            for i in linked_axes:
+                values[:, i] = ccna.fit_length(ccna.get_input_value(self.inputs[f"{'XYZ'[i]} {name}"]), count)
+            objects.foreach_set(attribute, values.ravel())
+
+        if not self.inputs["Object Color"].is_linked:
+            return      # like the other inputs, the color is only written if it is linked
+        colors = ccna.fit_colors(ccna.get_input_value(self.inputs["Object Color"]), count)
+        if self.use_shared_material:
+            ccnm.set_collection_colors(collection, colors, use_shared_material = True)
+            return
+
+        # a material per object or per color like for a single object, the object color alone is not shown
+        for obj, color in zip(objects, colors):
+            if obj.data is None or not hasattr(obj.data, "materials"):
+                continue
+            color = tuple(float(c) for c in color)
+            if self.use_palette_material:
+                ccnm.assign_material(obj, ccnm.acquire_palette_material(color, ccnm.get_user_id(obj)))
+            else:
+                self.assign_material_to_object(obj, color)
+        if self.use_palette_material:
+            ccnm.run_or_defer("palette_garbage", ccnm.collect_palette_garbage)
+
     def update(self):
+        if self.target_collection:
+            if isinstance(bpy.data, bpy.types.BlendData): # during registration bpy.data is not accessible
+                self.update_collection(self.target_collection)
+            return
+
         if self.selected_object:
             obj = self.selected_object
 
@@ -231,42 +385,46 @@ class CCNObjectTargetNode(Node):
                 location_socket = self.inputs[f"{axis} Location"]
                 socket = self.inputs[f"{axis} Location"]
                 if socket.is_linked:
-                    linked_socket = socket.links[0].from_socket
-                    setattr(obj.location, axis.lower(), linked_socket.default_value)
+                    setattr(obj.location, axis.lower(), ccna.get_input_float(socket))
                 else:
                     location_socket.default_value = getattr(obj.location, axis.lower())
 
             # update dimension values
             socket = self.inputs["X Dimension"]
             if socket.is_linked:
-                linked_socket = socket.links[0].from_socket
-                obj.dimensions.x = linked_socket.default_value
+                obj.dimensions.x = ccna.get_input_float(socket)
             else:
                 self.inputs["X Dimension"].default_value = obj.dimensions.x
 
             socket = self.inputs["Y Dimension"]
             if socket.is_linked:
-                linked_socket = socket.links[0].from_socket
-                obj.dimensions.y = linked_socket.default_value
+                obj.dimensions.y = ccna.get_input_float(socket)
             else:
                 self.inputs["Y Dimension"].default_value = obj.dimensions.y
 
             socket = self.inputs["Z Dimension"]
             if socket.is_linked:
-                linked_socket = socket.links[0].from_socket
-                obj.dimensions.z = linked_socket.default_value
+                obj.dimensions.z = ccna.get_input_float(socket)
             else:
                 self.inputs["Z Dimension"].default_value = obj.dimensions.z
 
-            if self.inputs["Object Color"].is_linked:
-                self.value_color_property = self.inputs["Object Color"].links[0].from_socket.default_value
-            else:
-                self.value_color_property = self.inputs["Object Color"].default_value  # Manual input value
+            # linked or manual input value, the first color if an array (e.g. the Selector's Colors) is linked
+            color = ccna.get_input_color(self.inputs["Object Color"])
 
-            self.assign_material_to_object(obj, self.value_color_property)
+            if self.use_shared_material:
+                ccnm.assign_shared_color(obj, color)
+            elif self.use_palette_material:
+                ccnm.assign_material(obj, ccnm.acquire_palette_material(color, ccnm.get_user_id(obj)))
+                ccnm.run_or_defer("palette_garbage", ccnm.collect_palette_garbage)
+            else:
+                self.assign_material_to_object(obj, color)
 
     def draw_buttons(self, context, layout):
         layout.prop(self, "selected_object", text="Select Object")
+        layout.prop(self, "target_collection", text="Collection")
+        layout.prop(self, "use_shared_material")
+        if not self.use_shared_material:
+            layout.prop(self, "use_palette_material")
 
 # -------------------------------------------------------
 
@@ -302,14 +460,23 @@ class CCNCustomFloatSocket(NodeSocket):
             linked_value = None
             if is_input_socket:
                 from_socket = self.links[0].from_socket
+                linked_array = ccna.get_socket_array(from_socket)
+                if linked_array is not None:
+                    layout.label(text=f"{text}: {ccna.describe_array(linked_array)}")
+                    return
                 if hasattr(from_socket, "default_value"):
                     linked_value = from_socket.default_value
-            label_text = f"{text}: {linked_value:.2f}" if linked_value is not None else f"{text}"
+            array = ccna.get_socket_array(self) if is_output_socket else None
+            if array is not None:
+                label_text = f"{text}: {ccna.describe_array(array)}"
+            else:
+                label_text = f"{text}: {linked_value:.2f}" if isinstance(linked_value, float) else f"{text}"
             layout.label(text=label_text)
         else:
             if is_output_socket:
                 # outputs are read-only
-                layout.label(text=f"{text}: {self.default_value:.2f}")
+                array = ccna.get_socket_array(self)
+                layout.label(text=f"{text}: {ccna.describe_array(array)}" if array is not None else f"{text}: {self.default_value:.2f}")
             else:
                 # inputs without links are changeable
                 layout.prop(self, "default_value", text = text)
@@ -317,6 +484,21 @@ class CCNCustomFloatSocket(NodeSocket):
     def draw_color(self, context, node):
         return (0.5, 0.7, 1.0, 1.0)  # Farbcode für Float-Sockets
 
+# -------------------------------------------------------
+class CCNArraySocket(NodeSocket):
+    '''Socket for an array of values or colors, e.g. one per object of a collection (stored in ccn_arrays)'''
+    bl_idname = "CCNArraySocket"
+    bl_label = "Array Socket"
+
+    def draw(self, context, layout, node, text):
+        array = ccna.get_socket_array(self) if self.is_output else None
+        if not self.is_output and self.is_linked:
+            array = ccna.get_socket_array(self.links[0].from_socket)
+        layout.label(text=f"{text}: {ccna.describe_array(array)}" if array is not None else text)
+
+    def draw_color(self, context, node):
+        return (0.9, 0.6, 0.2, 1.0)
+
 # -------------------------------------------------------
 class CCNNumberNode(Node):
     '''To enter a number to be used as output'''
@@ -343,16 +525,25 @@ class CCNNumberNode(Node):
         layout.prop(self, "number")
 
 # -------------------------------------------------------
+# outputs of the Dynamic Input node, in the order of ccn_arrays.reduce_values()
+DYNAMIC_INPUT_OUTPUTS = ("Total Sum", "Total Product", "Minimum", "Maximum", "Mean", "Variance")
+
 class CCNDynamicInputNode(Node):
     '''Node with dynamically added inputs'''
     bl_idname = 'CCNDynamicInputNodeType'
     bl_label = "Dynamic Input"
 
+    add_count: bpy.props.IntProperty(# type: ignore
+                                     name = "Count"
+                                    ,min = 1, soft_max = 64, max = 1024
+                                    ,default = 1
+                                    ,description = "Number of inputs added with one click")
+
     def init(self, context):
         # Initial input and output
         self.inputs.new('CCNCustomFloatSocket', "Input 1")
-        self.outputs.new('CCNCustomFloatSocket', "Total Sum")
-        self.outputs.new('CCNCustomFloatSocket', "Total Product")
+        for name in DYNAMIC_INPUT_OUTPUTS:
+            self.outputs.new('CCNCustomFloatSocket', name)
 
     def call_node_update(self):
         if hasattr(self.node, "update"):
@@ -360,69 +551,87 @@ class CCNDynamicInputNode(Node):
         if self.node.id_data:
             self.node.id_data.update_tag()
 
-    def update(self):
-        # Update outputs based on inputs
-        total_sum = 0.0
-        total_product = 1.0
-        
-        for socket in self.inputs:            
-            if socket.is_linked:
-                # get value from source socket
-                link = socket.links[0]
-                source_socket = link.from_socket
-                if hasattr(source_socket, 'default_value'):
-                    total_sum += source_socket.default_value
-                    total_product *= source_socket.default_value
-            else:
-                # get value from local socket value
-                if hasattr(socket, 'default_value'):
-                    total_sum += socket.default_value
-                    total_product *= socket.default_value
+    def add_inputs(self, count: int = 1):
+        for _ in range(count):
+            self.inputs.new('CCNCustomFloatSocket', f"Input {len(self.inputs) + 1}")
 
-        self.outputs[0].default_value = total_sum
-        self.outputs[1].default_value = total_product
+    def remove_input(self, index: int = -1):
+        """Removes the input with the index (default the last one), the other inputs are numbered again."""
+        if not self.inputs:
+            return
+        self.inputs.remove(self.inputs[index])
+        for i, socket in enumerate(self.inputs):
+            socket.name = f"Input {i + 1}"
+
+    def update(self):
+        # Update outputs based on inputs with all reductions in one step, arrays are reduced element-wise.
+        # Nodes of older versions only have the first two outputs.
+        results = ccna.reduce_values(*(ccna.get_input_value(socket) for socket in self.inputs))
+        for socket, value in zip(self.outputs, results):
+            ccna.set_output_value(socket, value)
 
     def draw_buttons(self, context, layout):
-        # "+" Button to add a new input
-        op = layout.operator("node.add_dynamic_input", text="Add Input", icon='ADD')
+        # "+" Button to add new inputs, "-" to remove the last one
+        row = layout.row(align=True)
+        op = row.operator("node.add_dynamic_input", text="Add", icon='ADD')
+        op.node_name = self.name
+        op.count = self.add_count
+        row.prop(self, "add_count", text="")
+        op = row.operator("node.remove_dynamic_input", text="", icon='REMOVE')
         op.node_name = self.name
 
+# -------------------------------------------------------
+def get_edit_tree_node(context, node_name: str):
+    """Returns the node of the node tree open in the editor of the context, None if it is not found."""
+    node_tree = getattr(context.space_data, "edit_tree", None)
+    if node_tree is None:
+        return None
+    return node_tree.nodes.get(node_name)
+
 # -------------------------------------------------------
 class CCNAddDynamicInputOperator(Operator):
-    '''Add a new input to the dynamic node'''
+    '''Add new inputs to the dynamic node'''
     bl_idname = "node.add_dynamic_input"
     bl_label = "Add Dynamic Input"
 
     node_name: bpy.props.StringProperty() #type: ignore
+    count: bpy.props.IntProperty(default = 1, min = 1) #type: ignore
     
     @classmethod
     def poll(cls, context):
-        return context.active_node is not None
+        return getattr(context.space_data, "edit_tree", None) is not None
 
     def execute(self, context):
-        global tree_id
-
-        # Find the current node editor
-        node_tree = None
-        for tree in bpy.data.node_groups:
-            if tree.bl_idname == tree_id:
-                node_tree = tree
-                break
-        
-        if not node_tree:
+        # find the specific node which contains the button in the tree of this editor
+        node = get_edit_tree_node(context, self.node_name)
+        if not isinstance(node, CCNDynamicInputNode):
             return {'CANCELLED'}
 
-        # find the specific node which contains the button
-        node_name = getattr(self, 'node_name', None)
-        if node_name:
-            node = node_tree.nodes.get(node_name)
-            if node and hasattr(node, "inputs"):
-                input_count = len(node.inputs) + 1
-                node.inputs.new('CCNCustomFloatSocket', f"Input {input_count}")
-                node.update()
-            return {'FINISHED'}
+        node.add_inputs(self.count)
+        node.update()
+        return {'FINISHED'}
+
+# -------------------------------------------------------
+class CCNRemoveDynamicInputOperator(Operator):
+    '''Remove the last input of the dynamic node'''
+    bl_idname = "node.remove_dynamic_input"
+    bl_label = "Remove Dynamic Input"
 
-        return {'CANCELLED'}
+    node_name: bpy.props.StringProperty() #type: ignore
+    index: bpy.props.IntProperty(default = -1) #type: ignore
+
+    @classmethod
+    def poll(cls, context):
+        return getattr(context.space_data, "edit_tree", None) is not None
+
+    def execute(self, context):
+        node = get_edit_tree_node(context, self.node_name)
+        if not isinstance(node, CCNDynamicInputNode) or len(node.inputs) <= 1:
+            return {'CANCELLED'}
+
+        node.remove_input(self.index)
+        node.update()
+        return {'FINISHED'}
 
 
 # -------------------------------------------------------
@@ -452,20 +661,14 @@ class CCNNumberOperatorNode(Node):
         return True
     
     def process(self):
-        if self.inputs[0].is_linked:
-            input_a = self.inputs[0].links[0].from_socket.default_value
-        else:
-            input_a = self.inputs[0].default_value
-        
-        # Check Input B
-        if self.inputs[1].is_linked:
-            input_b = self.inputs[1].links[0].from_socket.default_value
-        else:
-            input_b = self.inputs[1].default_value
-        
+        # single values or arrays (calculated element-wise)
+        input_a, input_b = ccna.broadcast_values(ccna.get_input_value(self.inputs[0]), ccna.get_input_value(self.inputs[1]))
+
         result = 0.0
 
-        if self.operation == 'ADD':
+        if ccna.is_array(input_a) or ccna.is_array(input_b):
+            result = self.process_arrays(input_a, input_b)
+        elif self.operation == 'ADD':
             result = input_a + input_b
         elif self.operation == 'SUB':
             result = input_a - input_b
@@ -474,17 +677,752 @@ class CCNNumberOperatorNode(Node):
         elif self.operation == 'DIV':
             result = input_a / input_b if input_b != 0 else 0.0
 
-        self.outputs[0].default_value = result
+        ccna.set_output_value(self.outputs[0], result)
         return result
 
+    def process_arrays(self, input_a, input_b):
+        import numpy as np
+        if self.operation == 'ADD':
+            return np.add(input_a, input_b)
+        elif self.operation == 'SUB':
+            return np.subtract(input_a, input_b)
+        elif self.operation == 'MUL':
+            return np.multiply(input_a, input_b)
+        # division by zero gives 0.0 like for single values
+        return ccna.safe_divide(input_a, input_b)
+
     def update(self):
-        result = self.process()
-        output_socket = self.outputs[0]
-        output_socket.default_value = result
+        self.process()
 
     def draw_buttons(self, context, layout):
         layout.prop(self, "operation", text="Operation")
 
+# -------------------------------------------------------
+def update_expression(self, context):
+    """Creates an input socket for each variable of the new expression, then updates the tree."""
+    self.sync_inputs()
+    update_callback(self, context)
+
+class CCNExpressionNode(Node):
+    '''Calculates a formula with named inputs, e.g. "a*sin(b)+c", for single values or arrays'''
+    bl_idname = 'CCNExpressionNodeType'
+    bl_label = "Expression"
+    bl_width_default = 220
+
+    expression: bpy.props.StringProperty(# type: ignore
+                                         name = "Expression"
+                                        ,default = "a*sin(b)+c"
+                                        ,description = "Formula with +, -, *, /, //, %, **, comparisons, numbers, pi, e, tau and functions like "
+                                                       "sin, cos, sqrt, exp, log, abs, min, max, clamp, lerp and where. "
+                                                       "Every other name becomes an input"
+                                        ,update = update_expression)
+
+    error_message: bpy.props.StringProperty(default = "") # type: ignore
+
+    def init(self, context):
+        self.outputs.new('CCNCustomFloatSocket', "Result")
+        self.sync_inputs()
+
+    def sync_inputs(self):
+        """Keeps the sockets (and links) of variables which are still used, removes the others and adds new ones."""
+        try:
+            names = ccnx.get_variable_names(self.expression)
+        except ValueError as e:
+            self.error_message = str(e)
+            return
+        self.error_message = ""
+
+        for socket in [s for s in self.inputs if s.name not in names]:
+            self.inputs.remove(socket)
+        existing = {socket.name for socket in self.inputs}
+        for name in names:
+            if name not in existing:
+                self.inputs.new('CCNCustomFloatSocket', name)
+        for index, name in enumerate(names):      # same order as in the expression
+            current = next(i for i, socket in enumerate(self.inputs) if socket.name == name)
+            if current != index:
+                self.inputs.move(current, index)
+
+    def update(self):
+        names = [socket.name for socket in self.inputs]
+        values = ccna.broadcast_values(*(ccna.get_input_value(socket) for socket in self.inputs))
+        try:
+            result = ccnx.evaluate_expression(self.expression, dict(zip(names, values)))
+        except (ValueError, TypeError) as e:
+            if self.error_message != str(e):
+                self.error_message = str(e)
+            return
+        if self.error_message:
+            self.error_message = ""
+        ccna.set_output_value(self.outputs[0], result)
+
+    def draw_buttons(self, context, layout):
+        layout.prop(self, "expression", text="")
+        if self.error_message:
+            layout.label(text=self.error_message, icon='ERROR')
+
+# -------------------------------------------------------
+# Fused evaluation of linked arithmetic nodes for process_tree (see ccn_fusion)
+
+class FusedNodeGroup:
+    '''Linked Number Operator, Dynamic Input and Expression nodes which are calculated by one generated kernel'''
+    def __init__(self, nodes):
+        self.nodes = self.sort_nodes(nodes)
+        node_index = {node: j for j, node in enumerate(self.nodes)}
+        self.external_sockets = []  # inputs which are not linked from a node of the group
+        self.source_nodes = []      # nodes linked to the external inputs, processed before the group
+        self.output_sockets = []    # all outputs, also the internal ones are read e.g. by socket updates and drawing
+
+        operations = []
+        outputs = []
+        for j, node in enumerate(self.nodes):
+            arguments = []
+            for socket in node.inputs:
+                from_node = socket.links[0].from_node if socket.is_linked else None
+                if from_node in node_index:
+                    from_socket = socket.links[0].from_socket
+                    output_index = [s.identifier for s in from_node.outputs].index(from_socket.identifier)
+                    arguments.append(('n', node_index[from_node], output_index))
+                else:
+                    if from_node is not None:
+                        self.source_nodes.append(from_node)
+                    arguments.append(('x', len(self.external_sockets)))
+                    self.external_sockets.append(socket)
+            operations.append(self.get_operation(node, tuple(arguments)))
+
+            for k, socket in enumerate(node.outputs):
+                self.output_sockets.append(socket)
+                outputs.append(('n', j, k))
+
+        self.structure = (tuple(operations), len(self.external_sockets), tuple(outputs))
+
+    @staticmethod
+    def sort_nodes(nodes) -> list:
+        """Returns the nodes in the order of their links, raises ValueError if the links have a cycle."""
+        members = set(nodes)
+        dependencies = {node: {socket.links[0].from_node for socket in node.inputs
+                               if socket.is_linked and socket.links[0].from_node in members} for node in nodes}
+        ordered = []
+        while dependencies:
+            ready = [node for node, depends in dependencies.items() if not depends]
+            if not ready:
+                raise ValueError("The nodes are linked in a cycle")
+            for node in ready:
+                del dependencies[node]
+                ordered.append(node)
+            for depends in dependencies.values():
+                depends.difference_update(ready)
+        return ordered
+
+    @staticmethod
+    def get_operation(node, arguments: tuple) -> tuple:
+        if isinstance(node, CCNNumberOperatorNode):
+            return ('OPERATOR', node.operation, arguments)
+        if isinstance(node, CCNExpressionNode):
+            return ('EXPRESSION', (node.expression, tuple(socket.name for socket in node.inputs)), arguments)
+        return ('DYNAMIC', None, arguments)
+
+    def process(self):
+        """Calculates the group with its kernel and writes the outputs of all its nodes."""
+        try:
+            kernel = ccnf.get_kernel(self.structure)
+            results = kernel(*(ccna.get_input_value(socket) for socket in self.external_sockets))
+        except Exception as e:
+            # e.g. an invalid expression: the nodes are updated one by one and show their own errors
+            print(f"Fused calculation failed, updating the nodes one by one: {e}")
+            for node in self.nodes:
+                node.update()
+            return
+        for socket, value in zip(self.output_sockets, results):
+            ccna.set_output_value(socket, value)
+        # the expressions are valid now, remove the errors of earlier calculations of the members
+        for node in self.nodes:
+            if isinstance(node, CCNExpressionNode) and node.error_message:
+                node.error_message = ""
+
+# ------------------------------------------------
+def get_linked_components(nodes) -> list:
+    """Returns the lists of nodes which are connected by links between them (union-find)."""
+    index = {node: i for i, node in enumerate(nodes)}
+    parent = list(range(len(nodes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for node, b in index.items():
+        for socket in node.inputs:
+            a = index.get(socket.links[0].from_node) if socket.is_linked else None
+            if a is not None:
+                parent[find(a)] = find(b)
+
+    components = {}
+    for node, i in index.items():
+        components.setdefault(find(i), []).append(node)
+    return list(components.values())
+
+# ------------------------------------------------
+def get_reentering_nodes(members) -> set:
+    """
+    Returns the members with an input linked from a node outside of the group which depends on a member,
+    e.g. A -> Output -> B. The outside node would read the old results of the group, as it is processed before.
+    """
+    member_set = set(members)
+    depends = {}    # outside node -> if it depends on a member
+
+    def depends_on_members(node) -> bool:
+        if node not in depends:
+            depends[node] = False   # against cycles
+            depends[node] = any(socket.links[0].from_node in member_set or depends_on_members(socket.links[0].from_node)
+                                for socket in node.inputs if socket.is_linked)
+        return depends[node]
+
+    return {node for node in members for socket in node.inputs
+            if socket.is_linked and socket.links[0].from_node not in member_set
+            and depends_on_members(socket.links[0].from_node)}
+
+# ------------------------------------------------
+def get_fused_groups(node_tree) -> dict:
+    """
+    Returns node -> FusedNodeGroup for all groups of at least two linked arithmetic nodes of the tree.
+    Nodes reached again by a path leaving the group are not fused, the rest of the group is split at them.
+    """
+    fusible_types = (CCNNumberOperatorNode, CCNDynamicInputNode, CCNExpressionNode)
+    fusible = [node for node in node_tree.nodes if isinstance(node, fusible_types)]
+    if len(fusible) < 2:
+        return {}
+
+    groups = {}
+    pending = get_linked_components(fusible)
+    while pending:
+        members = pending.pop()
+        if len(members) < 2:
+            continue
+        reentering = get_reentering_nodes(members)
+        if reentering:
+            pending.extend(get_linked_components([node for node in members if node not in reentering]))
+            continue
+        try:
+            group = FusedNodeGroup(members)
+        except ValueError as e:
+            print(f"Nodes are not fused: {e}")
+            continue
+        for node in members:
+            groups[node] = group
+    return groups
+
+# node tree pointer -> node -> FusedNodeGroup, rebuilt after changes of the tree (see invalidate_tree_caches)
+fused_group_cache = {}
+ccnm.register_session_cache(fused_group_cache)
+
+# ------------------------------------------------
+def get_cached_fused_groups(node_tree) -> dict:
+    key = node_tree.as_pointer()
+    groups = fused_group_cache.get(key)
+    if groups is None:
+        groups = get_fused_groups(node_tree)
+        fused_group_cache[key] = groups
+    return groups
+
+# -------------------------------------------------------
+# Animation bake: evaluates a tree frame by frame and writes the results as keyframes
+
+# F-Curve interpolation enum value of 'LINEAR' for keyframe_points.foreach_set
+KEYFRAME_INTERPOLATION_LINEAR = 1
+
+def get_fcurves(id_data):
+    """Returns the F-Curve collection of the action of the ID and creates the action if needed."""
+    animation_data = id_data.animation_data or id_data.animation_data_create()
+    if animation_data.action is None:
+        animation_data.action = bpy.data.actions.new(name = f"{id_data.name}Action")
+    action = animation_data.action
+    if hasattr(action, "fcurves"):      # before Blender 5.0
+        return action.fcurves
+
+    # layered actions: the F-Curves are in the channelbag of the slot of the ID
+    from bpy_extras import anim_utils   # type: ignore
+    if animation_data.action_slot is None:
+        animation_data.action_slot = action.slots.new(id_type = id_data.id_type, name = id_data.name)
+    return anim_utils.action_ensure_channelbag_for_slot(action, animation_data.action_slot).fcurves
+
+def find_fcurves(id_data):
+    """Returns the F-Curve collection of the action of the ID or None, without creating an action, slot or channelbag."""
+    animation_data = id_data.animation_data
+    if animation_data is None or animation_data.action is None:
+        return None
+    action = animation_data.action
+    if hasattr(action, "fcurves"):      # before Blender 5.0
+        return action.fcurves
+    if animation_data.action_slot is None:
+        return None
+    from bpy_extras import anim_utils   # type: ignore
+    channelbag = anim_utils.action_get_channelbag_for_slot(action, animation_data.action_slot)
+    return channelbag.fcurves if channelbag is not None else None
+
+def write_fcurve(id_data, data_path: str, index: int, frames: np.ndarray, values: np.ndarray):
+    """Replaces the F-Curve with linear keyframes, written with one foreach_set per attribute."""
+    import numpy as np
+    fcurves = get_fcurves(id_data)
+    fcurve = fcurves.find(data_path, index = index)
+    if fcurve is not None:
+        fcurves.remove(fcurve)
+    fcurve = fcurves.new(data_path, index = index)
+
+    count = len(frames)
+    fcurve.keyframe_points.add(count)
+    coordinates = np.empty(count * 2, dtype = np.float32)
+    coordinates[0::2] = frames
+    coordinates[1::2] = values
+    fcurve.keyframe_points.foreach_set("co", coordinates)
+    fcurve.keyframe_points.foreach_set("interpolation", np.full(count, KEYFRAME_INTERPOLATION_LINEAR, dtype = np.int32))
+    fcurve.update()
+
+def remove_fcurve(id_data, data_path: str, index: int) -> bool:
+    """Removes the F-Curve if the ID has one, e.g. from an earlier bake. Returns True if it was removed."""
+    fcurves = find_fcurves(id_data)
+    if fcurves is None:
+        return False
+    fcurve = fcurves.find(data_path, index = index)
+    if fcurve is None:
+        return False
+    fcurves.remove(fcurve)
+    return True
+
+class BakeChannel:
+    '''One property (e.g. "location") of one or more objects, recorded for every baked frame'''
+    def __init__(self, objects, data_path: str, size: int, indices):
+        self.objects = objects          # list of objects or the all_objects collection of a collection
+        self.data_path = data_path
+        self.size = size
+        self.indices = indices          # only the linked axes are baked, other animation stays untouched
+        self.values = []                # one (objects, size) array per frame
+
+    def record(self):
+        import numpy as np
+        if hasattr(self.objects, "foreach_get"):
+            values = np.empty(len(self.objects) * self.size, dtype = np.float32)
+            self.objects.foreach_get(self.data_path, values)
+        else:
+            values = np.array([value for obj in self.objects for value in getattr(obj, self.data_path)], dtype = np.float32)
+        self.values.append(values.reshape(-1, self.size))
+
+    def write(self, frames: np.ndarray) -> int:
+        """
+        Writes the F-Curves of the baked axes. An axis without changes gets none and loses the F-Curve
+        of an earlier bake, which would still animate it. Returns the number of written F-Curves.
+        """
+        import numpy as np
+        if not self.values:
+            return 0                    # no frame recorded
+        values = np.stack(self.values)  # (frames, objects, size)
+        written = 0
+        for i, obj in enumerate(self.objects):
+            for index in self.indices:
+                channel = values[:, i, index]
+                if channel.min() == channel.max():
+                    remove_fcurve(obj, self.data_path, index)
+                    continue
+                write_fcurve(obj, self.data_path, index, frames, channel)
+                written += 1
+        return written
+
+def get_bake_channels(node_tree) -> tuple:
+    """
+    Channels of the objects changed by the Object Target nodes of the tree and the number of nodes whose
+    colors can't be baked: colors are baked as object color, per-object and palette materials have no keyframes.
+    """
+    channels = []
+    unbaked_color_nodes = 0
+    for node in node_tree.nodes:
+        if not isinstance(node, CCNObjectTargetNode):
+            continue
+        if node.target_collection:
+            objects = node.target_collection.all_objects
+        elif node.selected_object:
+            objects = [node.selected_object]
+        else:
+            continue
+
+        for data_path, name in (("location", "Location"), ("scale", "Dimension")):   # dimensions are set through the scale
+            indices = [i for i, axis in enumerate("XYZ") if node.inputs[f"{axis} {name}"].is_linked]
+            if indices:
+                channels.append(BakeChannel(objects, data_path, 3, indices))
+        if node.inputs["Object Color"].is_linked:
+            if node.use_shared_material:
+                channels.append(BakeChannel(objects, "color", 4, range(4)))
+            else:
+                unbaked_color_nodes += 1
+    return channels, unbaked_color_nodes
+
+# -------------------------------------------------------
+class CCNBakeAnimationOperator(Operator):
+    '''Evaluate the node tree for every frame of a range and write the changed object values as keyframes'''
+    bl_idname = "ccn.bake_animation"
+    bl_label = "Bake Animation"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    frame_start: bpy.props.IntProperty(name = "Start Frame", default = 1) # type: ignore
+    frame_end: bpy.props.IntProperty(name = "End Frame", default = 250) # type: ignore
+    frame_step: bpy.props.IntProperty(name = "Step", default = 1, min = 1) # type: ignore
+
+    @classmethod
+    def poll(cls, context):
+        return getattr(context.space_data, "edit_tree", None) is not None
+
+    def invoke(self, context, event):
+        self.frame_start = context.scene.frame_start
+        self.frame_end = context.scene.frame_end
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        import numpy as np
+        global baking
+        node_tree = context.space_data.edit_tree
+        scene = context.scene
+        if self.frame_end < self.frame_start:
+            self.report({'ERROR'}, f"The end frame {self.frame_end} is before the start frame {self.frame_start}.")
+            return {'CANCELLED'}
+        channels, unbaked_color_nodes = get_bake_channels(node_tree)
+        if unbaked_color_nodes:
+            self.report({'WARNING'}, f"Colors of {unbaked_color_nodes} Object Target node(s) are not baked, "
+                                     "only the object color of the Shared Material mode can be keyframed.")
+        if not channels:
+            self.report({'WARNING'}, "No Object Target node with linked inputs to bake.")
+            return {'CANCELLED'}
+
+        frames = np.arange(self.frame_start, self.frame_end + 1, self.frame_step)
+        original_frame = scene.frame_current
+        baking = True
+        try:
+            for frame in frames:
+                scene.frame_set(int(frame))     # evaluates animated inputs, e.g. keyframed node values
+                process_tree(node_tree)         # only this tree, without a view layer update per frame
+                for channel in channels:
+                    channel.record()
+        finally:
+            scene.frame_set(original_frame)
+            baking = False
+            process_tree(node_tree)
+
+        written = sum(channel.write(frames) for channel in channels)
+        self.report({'INFO'}, f"{len(frames)} frames baked into {written} F-Curves.")
+        return {'FINISHED'}
+
+# -------------------------------------------------------
+# Frame-change evaluation: on every frame change only the nodes which depend on the frame are evaluated,
+# within a time budget. Icon redraws and material bookkeeping are deferred meanwhile (see ccnm.run_or_defer).
+
+baking = False      # the bake operator evaluates the tree itself, the handler is skipped while it sets the frames
+
+# data path of an animated node property or socket value, e.g. nodes["Number"].inputs[0].default_value
+ANIMATED_NODE_PATH = re.compile(r'^nodes\["((?:[^"\\]|\\.)*)"\]')
+
+class FrameChangeStats:
+    '''Counters of the frame-change evaluation of one node tree, shown in the Update Node'''
+    def __init__(self):
+        self.frames = 0
+        self.over_budget_frames = 0     # frames in which not all time-dependent nodes were evaluated
+        self.dropped_nodes = 0          # node updates skipped because the budget was used up
+        self.pending_tasks = 0          # deferred tasks still waiting after the last frame
+        self.evaluated_nodes = 0        # nodes updated in the last frame
+        self.last_time = 0.0            # milliseconds of the last frame
+        self.carried_nodes = []         # names of the nodes dropped in the last frame, updated first in the next one
+
+frame_change_stats = {}     # node tree pointer -> FrameChangeStats, like the other per-tree caches
+ccnm.register_session_cache(frame_change_stats)
+
+# node tree pointer -> set of time-dependent nodes, rebuilt after changes of the tree or of animations
+time_dependent_cache = {}
+ccnm.register_session_cache(time_dependent_cache)
+
+# ------------------------------------------------
+def invalidate_tree_caches(node_tree = None):
+    """
+    Removes the fused groups and time-dependent nodes of the tree, of all trees if None.
+    The arrays of removed sockets of the tree and the frame-change counters of removed trees are evicted as well.
+    """
+    if isinstance(bpy.data, bpy.types.BlendData):   # during registration bpy.data is not accessible
+        tree_pointers = {tree.as_pointer() for tree in bpy.data.node_groups}
+        for key in [key for key in frame_change_stats if key not in tree_pointers]:
+            del frame_change_stats[key]
+    if node_tree is None:
+        fused_group_cache.clear()
+        time_dependent_cache.clear()
+        return
+    key = node_tree.as_pointer()
+    fused_group_cache.pop(key, None)
+    time_dependent_cache.pop(key, None)
+    ccna.evict_tree_arrays(node_tree)
+
+# ------------------------------------------------
+def get_animated_node_names(node_tree) -> set:
+    """Names of the nodes with keyframed or driven properties or socket values."""
+    animation_data = node_tree.animation_data
+    if animation_data is None:
+        return set()
+
+    fcurves = list(animation_data.drivers)
+    action = animation_data.action
+    if action is not None:
+        if hasattr(action, "fcurves"):      # before Blender 5.0
+            fcurves.extend(action.fcurves)
+        else:
+            for layer in action.layers:
+                for strip in layer.strips:
+                    for channelbag in strip.channelbags:
+                        fcurves.extend(channelbag.fcurves)
+
+    names = set()
+    for fcurve in fcurves:
+        match = ANIMATED_NODE_PATH.match(fcurve.data_path)
+        if match:
+            names.add(match.group(1).replace('\\"', '"'))
+    return names
+
+# ------------------------------------------------
+def is_object_animated(obj) -> bool:
+    """True if the object or one of its parents has keyframes, drivers or constraints."""
+    while obj is not None:
+        animation_data = obj.animation_data
+        if obj.constraints or (animation_data and (animation_data.action or animation_data.drivers)):
+            return True
+        obj = obj.parent
+    return False
+
+# ------------------------------------------------
+def get_time_dependent_nodes(node_tree) -> set:
+    """Nodes with animated values, Object Selectors of animated objects and all nodes linked after them."""
+    animated_names = get_animated_node_names(node_tree)
+    sources = []
+    for node in node_tree.nodes:
+        if node.name in animated_names:
+            sources.append(node)
+        elif isinstance(node, CCNObjectSelectorNode):
+            objects = node.target_collection.all_objects if node.target_collection else [node.selected_object]
+            if any(obj is not None and is_object_animated(obj) for obj in objects):
+                sources.append(node)
+
+    linked_nodes = {}
+    for link in node_tree.links:
+        linked_nodes.setdefault(link.from_node, []).append(link.to_node)
+
+    dependent = set()
+    while sources:
+        node = sources.pop()
+        if node not in dependent:
+            dependent.add(node)
+            sources.extend(linked_nodes.get(node, ()))
+    return dependent
+
+# ------------------------------------------------
+def get_cached_time_dependent_nodes(node_tree) -> set:
+    key = node_tree.as_pointer()
+    nodes = time_dependent_cache.get(key)
+    if nodes is None:
+        nodes = get_time_dependent_nodes(node_tree)
+        time_dependent_cache[key] = nodes
+    return nodes
+
+# ------------------------------------------------
+def get_frame_change_node(node_tree):
+    """Returns the first Update Node of the tree with enabled frame-change evaluation or None."""
+    for node in node_tree.nodes:
+        if isinstance(node, CCNUpdateNode) and node.use_frame_change:
+            return node
+    return None
+
+# ------------------------------------------------
+def evaluate_frame(node_tree, budget: float):
+    """
+    Updates the time-dependent nodes of the tree within the budget (milliseconds), then runs deferred tasks in
+    the time left. The nodes dropped in the previous frame are updated first, with the values of their inputs
+    from that frame, so a tree over budget still updates all nodes, one frame late, instead of never
+    reaching the last ones.
+    """
+    stats = frame_change_stats.setdefault(node_tree.as_pointer(), FrameChangeStats())
+    start = time.perf_counter()
+    deadline = start + budget / 1000.0
+
+    nodes = get_cached_time_dependent_nodes(node_tree)
+    carried = {node for node in map(node_tree.nodes.get, stats.carried_nodes) if node is not None}
+    ccnm.defer_work = True
+    try:
+        if carried:
+            process_tree(node_tree, carried, deadline)
+        dropped = process_tree(node_tree, nodes, deadline)
+    finally:
+        ccnm.defer_work = False
+    ccnm.run_deferred_tasks(deadline)
+
+    stats.frames += 1
+    if dropped:
+        stats.over_budget_frames += 1
+        stats.dropped_nodes += len(dropped)
+    stats.carried_nodes = [node.name for node in dropped]
+    stats.evaluated_nodes = len(nodes) - len(dropped)
+    stats.pending_tasks = len(ccnm.deferred_tasks)
+    stats.last_time = (time.perf_counter() - start) * 1000.0
+
+    if ccnm.deferred_tasks and not bpy.app.timers.is_registered(flush_deferred_work):
+        bpy.app.timers.register(flush_deferred_work, first_interval = 0.5)
+
+# ------------------------------------------------
+def flush_deferred_work():
+    """Runs all deferred tasks once the playback stopped, checks again every half second while it runs."""
+    windows = bpy.context.window_manager.windows
+    if any(window.screen and window.screen.is_animation_playing for window in windows):
+        return 0.5
+    ccnm.run_deferred_tasks()
+    return None
+
+# ------------------------------------------------
+@persistent
+def frame_change_handler(scene, depsgraph = None):
+    if baking:
+        return
+    for node_tree in bpy.data.node_groups:
+        if node_tree.bl_idname != tree_id:
+            continue
+        update_node = get_frame_change_node(node_tree)
+        if update_node is not None:
+            evaluate_frame(node_tree, update_node.frame_budget)
+
+# ------------------------------------------------
+@persistent
+def animation_change_handler(scene, depsgraph):
+    """Added or removed keyframes can change which nodes depend on the frame."""
+    if depsgraph.id_type_updated('ACTION'):
+        time_dependent_cache.clear()
+
+# (handler list, handler) of this module
+FRAME_CHANGE_HANDLERS = (("frame_change_post", frame_change_handler), ("depsgraph_update_post", animation_change_handler))
+
+# ------------------------------------------------
+def register_frame_change_handler():
+    ccnu.register_app_handlers(FRAME_CHANGE_HANDLERS)
+
+# ------------------------------------------------
+def unregister_frame_change_handler():
+    ccnu.unregister_app_handlers(FRAME_CHANGE_HANDLERS)
+    if bpy.app.timers.is_registered(flush_deferred_work):
+        bpy.app.timers.unregister(flush_deferred_work)
+    frame_change_stats.clear()
+    invalidate_tree_caches()
+
+# -------------------------------------------------------
+# Object pool and font metrics for the 3D View Output node
+
+OUTPUT_EMPTY_SIZE   = 0.01
+OUTPUT_VALUE_GAP    = 0.5           # space between label and value text
+
+# object type -> names of released objects of removed output nodes, reused before new datablocks are created.
+# Unlinked objects have no users and are not saved, so the pool only lives until undo or loading a file.
+output_object_pool = {}
+ccnm.register_session_cache(output_object_pool)
+
+FONT_MEASURE_SIZE    = 100          # font size for blf.dimensions, the widths are divided by it
+# approximate advance width (in units of the text size), only used if the font can't be loaded by blf
+FONT_ADVANCE_DEFAULT = 0.60
+
+# font file path -> blf font id, "<builtin>" is the default font with id 0
+blf_font_ids = {"<builtin>": 0}
+# cache for text widths by (font file path, text), filled on first use
+font_metrics_cache = {}
+
+def get_blf_font_id(filepath: str) -> int:
+    """Returns the blf font id of a font file, loaded one time. -1 if it can't be loaded."""
+    font_id = blf_font_ids.get(filepath)
+    if font_id is None:
+        font_id = blf.load(bpy.path.abspath(filepath))
+        blf_font_ids[filepath] = font_id
+    return font_id
+
+def get_text_width(text: str, size: float = 1.0, font = None) -> float:
+    """
+    Returns the width of a text of a text object, measured with blf for the font of the text object
+    (None for the default font) and cached, instead of reading the bound box.
+    """
+    filepath = font.filepath if font is not None else "<builtin>"
+    key = (filepath, text)
+    width = font_metrics_cache.get(key)
+    if width is None:
+        font_id = get_blf_font_id(filepath)
+        if font_id == -1:
+            width = FONT_ADVANCE_DEFAULT * len(text)
+        else:
+            blf.size(font_id, FONT_MEASURE_SIZE)
+            width = blf.dimensions(font_id, text)[0] / FONT_MEASURE_SIZE
+        font_metrics_cache[key] = width
+    return width * size
+
+def get_target_collection():
+    """Returns the collection new objects are linked to, also usable in background mode."""
+    collection = getattr(bpy.context, "collection", None)
+    if collection is None:
+        collection = bpy.context.scene.collection
+    return collection
+
+def acquire_output_object(name: str, obj_type: str):
+    """
+    Returns the object with the given name or creates it without using operators.
+    Released objects from the pool are reused before new datablocks are created.
+
+    Parameters:
+    - name: name of the object
+    - obj_type: 'EMPTY' or 'FONT'
+    """
+    obj = bpy.data.objects.get(name)
+    if obj:
+        return obj
+
+    pool = output_object_pool.setdefault(obj_type, [])
+    while pool:
+        pooled_name = pool.pop()
+        obj = bpy.data.objects.get(pooled_name)
+        # only objects which are still released, not e.g. an object of the same name which was created later
+        if obj and obj.type == obj_type and not obj.users_collection:
+            obj.name = name
+            if obj.data:
+                obj.data.name = name
+            break
+    else:
+        if obj_type == 'FONT':
+            obj = bpy.data.objects.new(name, bpy.data.curves.new(name = name, type = 'FONT'))
+        else:
+            obj = bpy.data.objects.new(name, None)
+            obj.empty_display_type = 'PLAIN_AXES'
+            obj.empty_display_size = OUTPUT_EMPTY_SIZE
+
+    if not obj.users_collection:
+        get_target_collection().objects.link(obj)
+    return obj
+
+def release_output_object(name: str, obj_type: str):
+    """
+    Unlinks an object from all collections and puts it into the pool for later reuse. Its materials are
+    removed from it, and deleted if nothing else uses them, so the next node starts without them.
+    """
+    obj = bpy.data.objects.get(name)
+    if not obj:
+        return
+    for collection in obj.users_collection:
+        collection.objects.unlink(obj)
+    obj.parent = None
+    if obj.data is not None and hasattr(obj.data, "materials"):
+        materials = [mat for mat in obj.data.materials if mat is not None]
+        obj.data.materials.clear()
+        for mat in materials:
+            if mat.users == 0 and not mat.use_fake_user:
+                bpy.data.materials.remove(mat)
+    output_object_pool.setdefault(obj_type, []).append(obj.name)
+
+def set_if_changed(data, attribute, value):
+    """Writes an RNA property only if the value differs, to avoid needless re-tessellation of text objects."""
+    if getattr(data, attribute) != value:
+        setattr(data, attribute, value)
+
 # -------------------------------------------------------
 class CCNOutputNode(Node):
     '''3D Scene Output for a result value with a custom label text'''
@@ -499,6 +1437,13 @@ class CCNOutputNode(Node):
                                     update = update_callback
                                    )
 
+    use_shared_material: bpy.props.BoolProperty( # type: ignore
+                                                name = "Shared Material",
+                                                description = "Use one shared material for the texts and write the colors into the object colors " \
+                                                              "instead of creating a material per text object",
+                                                default = False,
+                                                update = update_callback)
+
     def init(self, context):
         self.use_custom_color = True  # activates user-defined colors
         self.color = (0.2, 0.6, 1.0)
@@ -516,15 +1461,12 @@ class CCNOutputNode(Node):
     def assign_material_to_text(self, obj, color):
         # check if the material already exists
         mat_name = f"{self.name}_{obj.name}_Material"
-
-        if mat_name not in bpy.data.materials:
-            mat = bpy.data.materials.new(name=mat_name)
-            mat.use_nodes = True
-        else:
-            mat = bpy.data.materials[mat_name]
+        mat = bpy.data.materials.get(mat_name)
+        if mat is None:
+            mat = ccnm.new_material(mat_name)
 
         # set base color to the material
-        mat.node_tree.nodes["Principled BSDF"].inputs["Base Color"].default_value = color
+        ccnm.set_base_color(mat, color)
 
         # assign the material to the object
         if obj.data.materials:
@@ -535,82 +1477,66 @@ class CCNOutputNode(Node):
         mat.node_tree.update_tag()
 
     def get_input_value(self, name):
-        if name in self.inputs and self.inputs[name].is_linked:
-            return self.inputs[name].links[0].from_socket.default_value
-        elif name in self.inputs:
-            return self.inputs[name].default_value
+        if name in self.inputs:
+            return ccna.get_input_float(self.inputs[name])
         return 0.0
 
     def update(self):
         label_text = self.label.strip() or "Result"
 
         # get the color values and the value to display either from local or linked socket
-        label_color  = self.inputs[0].links[0].from_socket.default_value if self.inputs[0].is_linked else self.inputs[0].default_value
-        value_color  = self.inputs[1].links[0].from_socket.default_value if self.inputs[1].is_linked else self.inputs[1].default_value
-        result_value = self.inputs[2].links[0].from_socket.default_value if self.inputs[2].is_linked else self.inputs[2].default_value
+        # arrays (e.g. of a collection) show their first value or color
+        label_color  = ccna.get_input_color(self.inputs[0])
+        value_color  = ccna.get_input_color(self.inputs[1])
+        result_value = ccna.get_input_float(self.inputs[2])
 
         x_pos = self.get_input_value("X Pos") + self.get_input_value("X Offset")
         y_pos = self.get_input_value("Y Pos") + self.get_input_value("Y Offset")
         z_pos = self.get_input_value("Z Pos") + self.get_input_value("Z Offset")
 
         # === PARENT-EMPTY (Container for both texts)
-        parent_name = f"OutputGroup_{self.name}"
-        if parent_name not in bpy.data.objects:
-            bpy.ops.object.empty_add(type='PLAIN_AXES', location=(0, 0, 0))
-            empty = bpy.context.object
-            empty.empty_display_size = 0.01
-            parent_obj = bpy.context.object
-            parent_obj.name = parent_name
-        else:
-            parent_obj = bpy.data.objects[parent_name]
-
-        if parent_obj:
-            parent_obj.location = (x_pos, y_pos, z_pos)
+        parent_obj = acquire_output_object(f"OutputGroup_{self.name}", 'EMPTY')
+        parent_obj.location = (x_pos, y_pos, z_pos)
 
         # === LABEL-TEXT
-        label_name = f"LabelText_{self.name}"
-        if label_name not in bpy.data.objects:
-            bpy.ops.object.text_add(location=(0, 0, 0))
-            label_obj = bpy.context.object
-            label_obj.name = label_name
+        label_obj = acquire_output_object(f"LabelText_{self.name}", 'FONT')
+        if label_obj.parent != parent_obj:
             label_obj.parent = parent_obj
-        else:
-            label_obj = bpy.data.objects[label_name]
-        
-        label_obj.data.body = label_text
-        label_obj.data.align_x = 'LEFT'
-        label_obj.data.align_y = 'BOTTOM'
+
+        set_if_changed(label_obj.data, "body", label_text)
+        set_if_changed(label_obj.data, "align_x", 'LEFT')
+        set_if_changed(label_obj.data, "align_y", 'BOTTOM')
         label_obj.location = (0, 0, 0)
 
-        bb = label_obj.bound_box
-        min_x = min([v[0] for v in bb])
-        max_x = max([v[0] for v in bb])
-        label_width_local = max_x - min_x
+        # width from the cached font metrics, reading bound_box would need an evaluated depsgraph
+        label_width_local = get_text_width(label_text, label_obj.data.size, label_obj.data.font)
 
         # === RESULT-TEXT
-        result_name = f"ResultText_{self.name}"
-        if result_name not in bpy.data.objects:
-            bpy.ops.object.text_add(location=(0, 0, 0))
-            result_obj = bpy.context.object
-            result_obj.name = result_name
+        result_obj = acquire_output_object(f"ResultText_{self.name}", 'FONT')
+        if result_obj.parent != parent_obj:
             result_obj.parent = parent_obj
-        else:
-            result_obj = bpy.data.objects[result_name]
         
-        result_obj.data.body = f"{result_value:.2f}"
-        result_obj.data.align_x = 'LEFT'
-        result_obj.data.align_y = 'BOTTOM'
-        #result_obj.location = (label_obj.dimensions.x + 0.7, 0, 0)
-        result_obj.location = (label_width_local + 0.5, 0, 0)
-
-        self.assign_material_to_text(label_obj, label_color)
-        self.assign_material_to_text(result_obj, value_color)
-
-        bpy.context.view_layer.update()
+        set_if_changed(result_obj.data, "body", f"{result_value:.2f}")
+        set_if_changed(result_obj.data, "align_x", 'LEFT')
+        set_if_changed(result_obj.data, "align_y", 'BOTTOM')
+        result_obj.location = (label_width_local + OUTPUT_VALUE_GAP, 0, 0)
+
+        if self.use_shared_material:
+            ccnm.assign_shared_color(label_obj, label_color)
+            ccnm.assign_shared_color(result_obj, value_color)
+        else:
+            self.assign_material_to_text(label_obj, label_color)
+            self.assign_material_to_text(result_obj, value_color)
 
+    def free(self):
+        # put the text objects into the pool so that a new output node can reuse them
+        release_output_object(f"LabelText_{self.name}", 'FONT')
+        release_output_object(f"ResultText_{self.name}", 'FONT')
+        release_output_object(f"OutputGroup_{self.name}", 'EMPTY')
 
     def draw_buttons(self, context, layout):
         layout.prop(self, "label", text="Label")
+        layout.prop(self, "use_shared_material")
 
 class CCNColorGeneratorNode(Node):
     '''Generates harmonic colors based on a base color'''
@@ -627,6 +1553,21 @@ class CCNColorGeneratorNode(Node):
                                              ,update = update_callback
                                              )
 
+    snap_to_palette: bpy.props.BoolProperty(# type: ignore
+                                            name = ""
+                                           ,description = "If enabled, the output colors are replaced by the nearest colors of the palette library"
+                                           ,default = False
+                                           ,update = update_callback
+                                           )
+
+    palette_filepath: bpy.props.StringProperty(# type: ignore
+                                               name = "Palette Library"
+                                              ,description = "Palette file with the allowed colors (.gpl, .json or one hex color per line)"
+                                              ,subtype = 'FILE_PATH'
+                                              ,default = ""
+                                              ,update = update_callback
+                                              )
+
     def init(self, context):
         self.outputs.new('CCNColorOutputSocket', "Color 1")
         self.outputs.new('CCNColorOutputSocket', "Color 2")
@@ -647,9 +1588,16 @@ class CCNColorGeneratorNode(Node):
         # Color 2: Calculate complementary color
         complementary_color = self.calculate_complementary(base_color)
 
+        if self.snap_to_palette:
+            base_color = chn.snap_to_palette_library(base_color, self.palette_filepath)
+            complementary_color = chn.snap_to_palette_library(complementary_color, self.palette_filepath)
+
         # Set outputs
         self.outputs[0].default_value = base_color  # Set Color 1 to base_color
         self.outputs[1].default_value = complementary_color  # Set Color 2 to complementary color
 
     def draw_buttons(self, context, layout):
         layout.prop(self, "base_color", text="Base Color")
+        layout.prop(self, "snap_to_palette", text="Snap To Palette")
+        if self.snap_to_palette:
+            layout.prop(self, "palette_filepath", text="")
@@ -3,12 +3,28 @@ import bpy                                          # type: ignore
 from bpy.utils import register_class                # type: ignore
 from bpy.utils import unregister_class              # type: ignore
 import nodeitems_utils                              # type: ignore
+import inspect
+import re
+
+# Reload the modules if the add-on package is reloaded, dependencies first (see reload_addon())
+if "ccnu" in locals():
+    import importlib
+    from . import ccn_color, ccn_palette, ccn_arrays, ccn_expression, ccn_fusion
+    for module in (ccnu, ccnm, ccn_color, ccn_palette, ccn_arrays, ccn_expression, ccn_fusion, chn, oun):
+        importlib.reload(module)
 
 # Import modules
 from . import ccn_utils           as ccnu \
+             ,ccn_materials       as ccnm \
              ,ColorHarmonyNodes   as chn \
              ,ObjectUtilityNodes  as oun
 
+# The registration state survives a reload of the package, so register() only registers what was changed
+registered_classes      = globals().get("registered_classes", {})   # class key -> (registered class, signature)
+node_editor             = globals().get("node_editor")
+registered_category_key = globals().get("registered_category_key")
+previous_menu_function  = globals().get("add_harmony_node_menu")     # menu function of the previous module version
+
 class CCN_MT_geometry_add_harmony_menu(bpy.types.Menu):
     bl_idname = "CCN_MT_geometry_add_harmony_menu"
     bl_label  = "Harmony Color Nodes"
@@ -21,14 +37,29 @@ class CCN_MT_geometry_add_harmony_menu(bpy.types.Menu):
         layout = self.layout
         layout.operator("node.add_node", text="Harmony Color Node").type = "CCNHarmonyColorNodeType"
 # ---------------------------------------------------------------------------------------
-classes = [oun.CCNDynamicInputNode, oun.CCNAddDynamicInputOperator, oun.CCNCustomFloatSocket,
-           oun.CCNNumberNode, oun.CCNNumberOperatorNode, oun.CCNOutputNode,
+class CCN_OT_ReloadAddon(bpy.types.Operator):
+    '''Reload the changed modules of the add-on and register again only the changed classes and categories'''
+    bl_idname = "ccn.reload_addon"
+    bl_label = "Reload Add-on"
+
+    def execute(self, context):
+        # reload after the operator has finished, its own class could be registered again
+        bpy.app.timers.register(reload_addon, first_interval = 0.0)
+        return {'FINISHED'}
+
+# ---------------------------------------------------------------------------------------
+classes = [oun.CCNDynamicInputNode, oun.CCNAddDynamicInputOperator, oun.CCNRemoveDynamicInputOperator, oun.CCNCustomFloatSocket, oun.CCNArraySocket,
+           oun.CCNNumberNode, oun.CCNNumberOperatorNode, oun.CCNExpressionNode, oun.CCNOutputNode,
            oun.CCNColorGeneratorNode, oun.CCNObjectSelectorNode, oun.CCNUpdateNode,
-           oun.CCNRefreshOperator, oun.CCNObjectTargetNode,
+           oun.CCNRefreshOperator, oun.CCNBakeAnimationOperator, oun.CCNObjectTargetNode,
            chn.CCNColorOutputSocket, chn.CCNColorInputSocket, chn.CCNAngleInputSocket,
            chn.CCNColorRGBOutputSocket, chn.CCNHarmonyColorNode, chn.CCN_OT_GenerateHarmonyShader,
            CCN_MT_geometry_add_harmony_menu,
-           chn.CCNAutoShaderGeneratorNode, chn.CCN_OT_GenerateMaterials]
+           chn.CCNAutoShaderGeneratorNode, chn.CCN_OT_GenerateMaterials,
+           chn.CCN_OT_GenerateCollectionMaterials,
+           chn.CCNShaderRowItem, chn.CCNAutoShaderTableNode, chn.CCN_OT_AddShaderRow, chn.CCN_OT_RemoveShaderRow,
+           chn.CCN_OT_BatchHarmony, chn.CCNPaletteExtractNode, chn.CCNColorRampNode,
+           CCN_OT_ReloadAddon]
            #oun.CCNMessageOperator, oun.CCNSimplePopupOperator]
 
 # ---------------------------------------------------------------------------------------
@@ -37,37 +68,188 @@ def add_harmony_node_menu(self, context):
     layout.menu("CCN_MT_geometry_add_harmony_menu", text="Color Tools")
 
 # ------------------------------------------------
-def register():
-    # Register all classes
-    for cls in classes:
+def get_class_key(cls) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+# upper case constant names in the class source, also of other modules, e.g. MAX_RAMP_STOPS or ccnc.HARMONIES
+NAME_PATTERN    = re.compile(r"\b(?:[A-Za-z_]\w*\.)?[A-Z][A-Z0-9_]*\b")
+CONSTANT_TYPES  = (bool, int, float, str, tuple, frozenset)
+# names given to the callback arguments of the property definitions, e.g. update = update_callback or items = operations
+CALLBACK_PATTERN = re.compile(r"\b(?:update|items|get|set|poll|search)\s*=\s*([A-Za-z_]\w*(?:\.[A-Za-z_]\w*)?)")
+
+# ------------------------------------------------
+def get_class_constants(cls, source: str) -> tuple:
+    """
+    Returns the values of the module constants used in the class source, also of other modules (e.g. ccnc.NAME).
+    The property definitions are created with these values, so a changed constant needs a new registration.
+    """
+    namespace = vars(inspect.getmodule(cls))
+    constants = []
+    for name in sorted(set(NAME_PATTERN.findall(source))):
+        module_name, _, attribute = name.partition(".")
+        value = namespace.get(module_name)
+        if attribute:
+            value = getattr(value, attribute, None) if inspect.ismodule(value) else None
+        if isinstance(value, CONSTANT_TYPES):
+            constants.append((name, repr(value)))
+    return tuple(constants)
+
+# ------------------------------------------------
+def get_property_callbacks(cls, source: str) -> tuple:
+    """
+    Returns the source of the module functions (or the value of the items lists) given as callbacks to the
+    properties of the class. The registered properties keep calling the functions they were created with,
+    so a changed callback needs a new registration.
+    """
+    namespace = vars(inspect.getmodule(cls))
+    callbacks = []
+    for name in sorted(set(CALLBACK_PATTERN.findall(source))):
+        module_name, _, attribute = name.partition(".")
+        value = namespace.get(module_name)
+        if attribute:
+            value = getattr(value, attribute, None) if inspect.ismodule(value) else None
+        if inspect.isfunction(value):
+            try:
+                callbacks.append((name, inspect.getsource(value)))
+            except (OSError, TypeError):
+                callbacks.append((name, None))
+        elif isinstance(value, CONSTANT_TYPES + (list,)):
+            callbacks.append((name, repr(value)))
+    return tuple(callbacks)
+
+# ------------------------------------------------
+def get_class_source(cls):
+    """
+    Returns the source code of the class with the values of the module constants it uses and the source of its
+    property callbacks, None if the source is not available (then it is always registered again).
+    """
+    try:
+        source = inspect.getsource(cls)
+    except (OSError, TypeError):
+        return None
+    return (source, get_class_constants(cls, source), get_property_callbacks(cls, source))
+
+# ------------------------------------------------
+def get_changed_class_keys() -> set:
+    """
+    Returns the keys of the registered classes which are removed or whose source, used constants or property
+    callbacks were changed, and of the classes using one of them as type of a property (e.g. a PropertyGroup in a
+    CollectionProperty).
+    """
+    current = {get_class_key(cls): cls for cls in classes}
+    changed = {key for key, (registered, source) in registered_classes.items()
+               if key not in current or source is None or get_class_source(current[key]) != source}
+    for cls in classes:     # the classes are listed after the classes they use
+        for prop in getattr(cls, "__annotations__", {}).values():
+            prop_type = getattr(prop, "keywords", {}).get("type")
+            if prop_type is not None and get_class_key(prop_type) in changed:
+                changed.add(get_class_key(cls))
+    return changed
+
+# ------------------------------------------------
+def register_classes():
+    """
+    Registers the classes which are not registered yet. After a reload, unchanged classes keep their registered
+    class which runs the reloaded code as it uses the same module namespace, changed ones are registered again.
+    """
+    changed = get_changed_class_keys()
+    for key, (registered, source) in reversed(list(registered_classes.items())):
+        if key in changed:
+            try:
+                unregister_class(registered)
+            except RuntimeError:
+                pass
+            del registered_classes[key]
+
+    for i, cls in enumerate(classes):
+        key = get_class_key(cls)
+        if key in registered_classes:
+            # keep the registered class, so isinstance() checks of existing nodes still work
+            registered = registered_classes[key][0]
+            setattr(inspect.getmodule(cls), cls.__name__, registered)
+            classes[i] = registered
+            continue
         try:
             register_class(cls)
         except ValueError:
             print(f"{cls.__name__} is already registered, skipping...")
+        registered_classes[key] = (cls, get_class_source(cls))
+
+# ------------------------------------------------
+def tree_update(node_tree):
+    """Called by Blender when nodes or links of an Object Utility tree were changed."""
+    oun.invalidate_tree_caches(node_tree)   # looked up on call, the editor class outlives a reload
+
+# ------------------------------------------------
+def register():
+    global node_editor, registered_category_key
+
+    # Register all classes
+    register_classes()
 
-    node_manager = ccnu.CCNNodeEditorManager()
-    node_editor  = node_manager.add_editor("Object Utility Nodes", icon="NODETREE", force_overwrite=True)
-    tree_id = node_editor.bl_idname
-    oun.update_tree_id(tree_id)
-    
     # create dictionary
     category_dict = {
-        "Math"      : [oun.CCNNumberNode, oun.CCNDynamicInputNode, oun.CCNNumberOperatorNode],
+        "Math"      : [oun.CCNNumberNode, oun.CCNDynamicInputNode, oun.CCNNumberOperatorNode, oun.CCNExpressionNode],
         "Object"    : [oun.CCNObjectSelectorNode, oun.CCNObjectTargetNode],
-        "Color"     : [oun.CCNColorGeneratorNode, chn.CCNHarmonyColorNode],
-        "Material"  : [chn.CCNAutoShaderGeneratorNode],
+        "Color"     : [oun.CCNColorGeneratorNode, chn.CCNHarmonyColorNode, chn.CCNPaletteExtractNode, chn.CCNColorRampNode],
+        "Material"  : [chn.CCNAutoShaderGeneratorNode, chn.CCNAutoShaderTableNode],
         "Output"    : [oun.CCNOutputNode],
         "Tools"     : [oun.CCNUpdateNode]
     }
 
-    # create categories and nodes
-    node_editor.create_categories_from_dict(category_dict, force_overwrite=True)   
+    # create the editor with its categories and nodes, all categories are registered in one step
+    category_key = tuple((label, tuple(cls.bl_idname for cls in node_classes)) for label, node_classes in category_dict.items())
+    if node_editor is None:
+        builder = ccnu.CCNNodeEditorBuilder()
+        builder.add_editor("Object Utility Nodes", icon="NODETREE", force_overwrite=True, tree_update=tree_update)
+        builder.add_categories_from_dict("Object Utility Nodes", category_dict)
+        editors = builder.commit()
+        node_editor = editors[0] if editors else None
+    elif category_key != registered_category_key:
+        node_editor.register_categories(category_dict, force_overwrite=True)
+    if node_editor is not None:
+        registered_category_key = category_key
+        oun.update_tree_id(node_editor.bl_idname)
+    else:
+        print("Error: the Object Utility Nodes editor could not be registered.")
+
     # adds the harmony color node to the standard Shader Editor
+    if previous_menu_function is not None and previous_menu_function is not add_harmony_node_menu:
+        bpy.types.NODE_MT_add.remove(previous_menu_function)
+    bpy.types.NODE_MT_add.remove(add_harmony_node_menu)     # no second entry if it was registered already
     bpy.types.NODE_MT_add.append(add_harmony_node_menu) 
+    ccnm.register_handlers()
+    oun.register_frame_change_handler()
+    chn.register_image_change_handler()
+
+# ------------------------------------------------
+def reload_addon():
+    """
+    Reloads the add-on modules and registers only the changed classes and categories. Unlike disabling and
+    enabling the add-on the color wheel icons and the base color wheel are kept if they are still valid.
+    """
+    import importlib
+    import sys
+
+    package = importlib.reload(sys.modules[__name__])
+    package.register()
+    print("Add-on reloaded.")
+    return None     # used as timer, do not repeat
 
 # ------------------------------------------------
 def unregister():
     chn.cleanup_color_wheel_previews()
+    ccnm.unregister_handlers()
+    oun.unregister_frame_change_handler()
+    chn.unregister_image_change_handler()
+
+    global node_editor, registered_category_key
+
+    if node_editor is not None:
+        node_editor.unregister_all()
+        node_editor.unregister()
+        node_editor = None
+    registered_category_key = None
 
     # Unregister all classes
     for cls in reversed(classes):
@@ -75,6 +257,7 @@ def unregister():
             unregister_class(cls)
         except RuntimeError:
             print(f"Class {cls.__name__} was not registered.")
+    registered_classes.clear()
 
     bpy.types.NODE_MT_add.remove(add_harmony_node_menu)
 
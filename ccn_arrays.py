@@ -0,0 +1,214 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:                                   # NumPy is imported on first use, see the functions
+    import numpy as np
+
+# ---------------------------------------------------------------------------------------
+# Array values of sockets: a socket can carry a contiguous NumPy buffer (float32/float64 values or Nx4 colors)
+# instead of one value. The buffers are not RNA properties but live in this side store, keyed by the socket
+# pointer. The "default_value" of the socket keeps the first value for nodes which only read single values.
+
+ARRAY_DTYPES = ("float32", "float64")   # names, so NumPy is only imported when the first array is used
+
+# socket pointer -> (socket owner, array), the owner (see get_socket_owner) detects a reused pointer of a new socket
+array_store = {}
+
+# (array length, target length) pairs which were already reported by fit_length
+reported_length_mismatches = set()
+
+# ------------------------------------------------
+def as_array(values, dtype = None) -> np.ndarray:
+    """Returns the values as contiguous float32 or float64 array, other types are converted to float64."""
+    import numpy as np
+    values = np.asarray(values)
+    if dtype is None:
+        dtype = values.dtype if values.dtype in ARRAY_DTYPES else np.float64
+    return np.ascontiguousarray(values, dtype = dtype)
+
+# ------------------------------------------------
+def get_socket_owner(socket) -> tuple:
+    """Node tree pointer, node name, direction and identifier of the socket, unique inside the session."""
+    return (socket.id_data.as_pointer(), socket.node.name, socket.is_output, socket.identifier)
+
+# ------------------------------------------------
+def get_socket_array(socket):
+    """Returns the array of the socket or None if it carries a single value."""
+    entry = array_store.get(socket.as_pointer())
+    if entry is None or entry[0] != get_socket_owner(socket):
+        return None
+    return entry[1]
+
+# ------------------------------------------------
+def set_socket_array(socket, values, dtype = None) -> np.ndarray:
+    array = as_array(values, dtype)
+    array_store[socket.as_pointer()] = (get_socket_owner(socket), array)
+    return array
+
+# ------------------------------------------------
+def clear_socket_array(socket):
+    array_store.pop(socket.as_pointer(), None)
+
+# ------------------------------------------------
+def evict_tree_arrays(node_tree):
+    """Removes the arrays of sockets of the tree whose node or socket was removed."""
+    tree_pointer = node_tree.as_pointer()
+    for pointer, ((owner_pointer, node_name, is_output, identifier), _) in list(array_store.items()):
+        if owner_pointer != tree_pointer:
+            continue
+        node = node_tree.nodes.get(node_name)
+        sockets = None if node is None else (node.outputs if is_output else node.inputs)
+        if sockets is None or not any(s.identifier == identifier for s in sockets):
+            del array_store[pointer]
+
+# ------------------------------------------------
+def get_socket_value(socket):
+    """Returns the array or, if the socket has none, the default_value of the socket."""
+    array = get_socket_array(socket)
+    if array is not None:
+        return array
+    return getattr(socket, "default_value", 0.0)
+
+# ------------------------------------------------
+def get_input_value(socket):
+    """Returns the value of an input socket: the array or value of the linked output, else its own value."""
+    if socket.is_linked:
+        return get_socket_value(socket.links[0].from_socket)
+    return get_socket_value(socket)
+
+# ------------------------------------------------
+def to_float(value) -> float:
+    """
+    Returns one float of a single value, a color or an array (its first element), so nodes which show or write
+    one value can be linked to array outputs. Colors give their grey value (mean of RGB).
+    """
+    if is_array(value):
+        if value.size == 0:
+            return 0.0
+        value = value[0]
+    if not hasattr(value, "__len__"):
+        return float(value)
+    channels = [float(c) for c in value][:3]
+    return sum(channels) / len(channels) if channels else 0.0
+
+# ------------------------------------------------
+def to_color(value) -> tuple:
+    """Returns an RGBA tuple of a color, a single value (grey) or an array (its first value or color)."""
+    if is_array(value):
+        if value.size == 0:
+            return (0.0, 0.0, 0.0, 1.0)
+        value = value[0]
+    if not hasattr(value, "__len__"):
+        return (float(value),) * 3 + (1.0,)
+    channels = tuple(float(c) for c in value)
+    if len(channels) < 3:
+        return (channels[0] if channels else 0.0,) * 3 + (1.0,)
+    return (channels + (1.0,))[:4]
+
+# ------------------------------------------------
+def get_input_float(socket) -> float:
+    return to_float(get_input_value(socket))
+
+# ------------------------------------------------
+def get_input_color(socket) -> tuple:
+    return to_color(get_input_value(socket))
+
+# ------------------------------------------------
+def fit_colors(value, length: int) -> np.ndarray:
+    """
+    Returns (length, 4) float32 RGBA colors of a color array (repeated/cut), an array of values (grey colors)
+    or a single color or value (used for all).
+    """
+    import numpy as np
+    if is_array(value) and value.ndim == 2:
+        colors = np.ones((value.shape[0], 4), dtype = np.float32)
+        colors[:, :min(4, value.shape[1])] = value[:, :4]
+        return fit_length(colors, length)
+    if is_array(value):
+        grey = fit_length(np.asarray(value, dtype = np.float32), length)
+        return np.column_stack((grey, grey, grey, np.ones(length, dtype = np.float32)))
+    return np.tile(np.asarray(to_color(value), dtype = np.float32), (length, 1))
+
+# ------------------------------------------------
+def set_output_value(socket, value):
+    """
+    Writes a single value or an array into an output socket. For arrays the first value is also written into
+    "default_value" (if the socket has one), so nodes reading single values still get a value.
+    """
+    import numpy as np
+    if isinstance(value, np.ndarray) and value.ndim > 0:
+        array = set_socket_array(socket, value)
+        if hasattr(socket, "default_value") and array.size:
+            if isinstance(socket.default_value, float):
+                socket.default_value = float(array.flat[0])
+            elif array.ndim == 2:
+                socket.default_value = tuple(array[0])[:len(socket.default_value)]
+        return
+
+    clear_socket_array(socket)
+    if hasattr(socket, "default_value"):
+        socket.default_value = value
+
+# ------------------------------------------------
+def is_array(value) -> bool:
+    import numpy as np
+    return isinstance(value, np.ndarray) and value.ndim > 0
+
+# ------------------------------------------------
+def fit_length(values, length: int) -> np.ndarray:
+    """
+    Broadcasts a single value or repeats/cuts an array along its first axis to the given length.
+    A length mismatch of an array with more than one value is reported one time per pair of lengths.
+    """
+    import numpy as np
+    values = np.asarray(values)
+    if values.ndim == 0:
+        return np.full(length, values)
+    if values.shape[0] == length:
+        return values
+    if values.shape[0] > 1 and (values.shape[0], length) not in reported_length_mismatches:
+        reported_length_mismatches.add((values.shape[0], length))
+        print(f"Warning: an array of {values.shape[0]} values is repeated/cut to {length} values")
+    return np.resize(values, (length,) + values.shape[1:])
+
+# ------------------------------------------------
+def broadcast_values(*values) -> list:
+    """Fits all arrays to the length of the longest one for element-wise operations, single values are kept."""
+    lengths = [len(v) for v in values if is_array(v)]
+    if not lengths:
+        return list(values)
+    length = max(lengths)
+    return [fit_length(v, length) if is_array(v) else v for v in values]
+
+# ------------------------------------------------
+def reduce_values(*values) -> tuple:
+    """
+    Returns sum, product, minimum, maximum, mean and variance of the values, element-wise if there are arrays.
+    The values are stacked into one array, so every reduction is one vectorized operation.
+    """
+    import numpy as np
+    if not values:
+        return (0.0, 1.0, 0.0, 0.0, 0.0, 0.0)
+    stacked = np.stack(np.broadcast_arrays(*(np.asarray(v, dtype = np.float64) for v in broadcast_values(*values))))
+    total = stacked.sum(axis = 0)
+    mean = total / stacked.shape[0]
+    variance = np.square(stacked - mean).mean(axis = 0)
+    results = (total, stacked.prod(axis = 0), stacked.min(axis = 0), stacked.max(axis = 0), mean, variance)
+    if stacked.ndim == 1:
+        return tuple(float(r) for r in results)
+    return results
+
+# ------------------------------------------------
+def safe_divide(a, b):
+    """Division of single values or arrays (element-wise), division by zero gives 0.0."""
+    import numpy as np
+    if is_array(a) or is_array(b):
+        a, b = np.broadcast_arrays(a, b)
+        return np.divide(a, b, out = np.zeros(a.shape, dtype = np.result_type(a, b, np.float32)), where = b != 0)
+    return a / b if b != 0 else 0.0
+
+# ------------------------------------------------
+def describe_array(array: np.ndarray) -> str:
+    """Short text for the socket draw functions, e.g. "1000 values" or "250 colors"."""
+    if array.ndim == 2 and array.shape[1] == 4:
+        return f"{array.shape[0]} colors"
+    return f"{array.shape[0]} values"
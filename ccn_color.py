@@ -0,0 +1,412 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:                                   # NumPy is imported on first use, see the functions
+    import numpy as np
+
+# ---------------------------------------------------------------------------------------
+# Vectorized color harmony kernels (no bpy), usable from nodes, operators and Python scripts:
+#
+#   from bl_ext.user_default.ccustomnodes import ccn_color
+#   palettes = ccn_color.harmony_palette(base_colors, "TRIADIC", 120.0)   # (N,4) -> (N,3,4)
+#
+# Harmony types are the identifiers of the harmony registry below, the built-in ones are the
+# values of ColorHarmonyNodes.Harmony. Custom harmonies can be added with register_harmony().
+
+MAX_HARMONY_COLORS  = 3             # colors besides the base color, the Harmony Color node has 4 color outputs
+MONOCHROMATIC_STEPS = (0.2, 0.4)    # reduction of saturation (or value for grey colors) of the monochromatic colors
+
+# angle fractions at which the hue offsets of a harmony are compared with a straight line: 0, 1 and a golden
+# ratio sequence, which is irregular enough that no periodic offset is zero at all of them
+LINEARITY_SAMPLES = (0.0, 1.0) + tuple((i * 0.6180339887498949) % 1.0 for i in range(1, 127))
+
+# ------------------------------------------------
+def rgb_to_hsv_array(rgb: np.ndarray) -> np.ndarray:
+    """Converts an (..., 3) RGB array (0.0-1.0) to HSV like colorsys.rgb_to_hsv, for all colors at once."""
+    import numpy as np
+    rgb = np.asarray(rgb, dtype = np.float64)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = rgb.max(axis = -1)
+    minc = rgb.min(axis = -1)
+    rangec = maxc - minc
+    grey = rangec == 0.0
+
+    safe_max = np.where(maxc == 0.0, 1.0, maxc)
+    safe_range = np.where(grey, 1.0, rangec)
+    s = np.where(grey, 0.0, rangec / safe_max)
+
+    rc = (maxc - r) / safe_range
+    gc = (maxc - g) / safe_range
+    bc = (maxc - b) / safe_range
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = np.where(grey, 0.0, (h / 6.0) % 1.0)
+    return np.stack((h, s, maxc), axis = -1)
+
+# ------------------------------------------------
+def hsv_to_rgb_array(hsv: np.ndarray) -> np.ndarray:
+    """Converts an (..., 3) HSV array (0.0-1.0) to RGB like colorsys.hsv_to_rgb, for all colors at once."""
+    import numpy as np
+    hsv = np.asarray(hsv, dtype = np.float64)
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    i = np.floor(h * 6.0)
+    f = h * 6.0 - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i.astype(np.int64) % 6
+
+    r = np.choose(i, (v, q, p, p, t, v))
+    g = np.choose(i, (t, v, v, q, p, p))
+    b = np.choose(i, (p, p, t, v, v, q))
+    return np.stack((r, g, b), axis = -1)
+
+# ---------------------------------------------------------------------------------------
+# Harmony registry: each harmony is described by data and compiled once into lookup tables
+
+class HarmonyDefinition:
+    """
+    Describes one color harmony.
+
+    Parameters:
+    - identifier: unique id, used as enum value in the nodes
+    - label: display name
+    - hue_offsets: function of the angle fraction (angle / 360) returning the hue offset of each harmony color
+    - preset_angle: angle in degrees used when the harmony is selected
+    - line_indices: lines drawn on the color wheel, index 0 is the center and 1 the base color
+    - uses_angle: if the angle setting changes the result
+    - sv_transform: optional vectorized function (hue, saturation, value) -> (hue, saturation, value) for (N,k) arrays
+    """
+    def __init__(self, identifier: str, label: str, hue_offsets, preset_angle: float = 30.0, line_indices = (),
+                 uses_angle: bool = True, sv_transform = None):
+        self.identifier = identifier
+        self.label = label
+        self.hue_offsets = hue_offsets
+        self.preset_angle = preset_angle
+        self.line_indices = [tuple(line) for line in line_indices]
+        self.uses_angle = uses_angle
+        self.sv_transform = sv_transform
+        self.num_harmony_colors = len(hue_offsets(0.0))
+        self.num_colors = self.num_harmony_colors + 1      # including the base color
+        self.is_linear = None                               # set by compile() on the first calculation
+
+    # ------------------------------------------------
+    def compile(self):
+        """
+        Converts the hue offsets into the tables offset = constant + slope * angle_fraction if the offsets
+        are linear at all LINEARITY_SAMPLES. Non linear offset functions keep being called for each angle.
+        """
+        import numpy as np
+        fractions = np.asarray(LINEARITY_SAMPLES, dtype = np.float64)
+        samples = np.array([self.hue_offsets(f) for f in fractions], dtype = np.float64)
+        constant = samples[0]
+        slope = samples[1] - constant
+        self.is_linear = np.allclose(constant + fractions[:, None] * slope, samples, rtol = 0.0, atol = 1e-9)
+        self.offset_constant = constant[None, :]
+        self.offset_slope = slope[None, :]
+
+    # ------------------------------------------------
+    def get_hue_offsets(self, angle_fraction: np.ndarray) -> np.ndarray:
+        """Returns the (N,k) hue offsets for N angle fractions."""
+        import numpy as np
+        if self.is_linear is None:
+            self.compile()
+        if self.is_linear:
+            return self.offset_constant + self.offset_slope * angle_fraction[:, None]
+        return np.stack([np.asarray(self.hue_offsets(f), dtype = np.float64) for f in angle_fraction])
+
+# identifier -> HarmonyDefinition, in the order of the enum items
+harmony_registry = {}
+
+# ------------------------------------------------
+def register_harmony(definition: HarmonyDefinition, force_overwrite: bool = False):
+    """
+    Adds a harmony to the registry, e.g. a custom harmony from a Python script.
+    Raises ValueError if it has more colors than the Harmony Color node can output.
+    """
+    if not 1 <= definition.num_harmony_colors <= MAX_HARMONY_COLORS:
+        raise ValueError(f"Harmony '{definition.identifier}' has {definition.num_harmony_colors} colors besides the base color, "
+                         f"1 to {MAX_HARMONY_COLORS} are supported.")
+    if definition.identifier in harmony_registry and not force_overwrite:
+        raise ValueError(f"Harmony '{definition.identifier}' is already registered.")
+    harmony_registry[definition.identifier] = definition
+
+# ------------------------------------------------
+def get_harmony(identifier: str) -> HarmonyDefinition:
+    """Returns the harmony definition, raises ValueError for unknown types."""
+    definition = harmony_registry.get(identifier)
+    if definition is None:
+        raise ValueError(f"Unknown harmony type: {identifier}")
+    return definition
+
+# ------------------------------------------------
+def monochromatic_transform(hue, saturation, value):
+    """Reduces the saturation of colored bases and the value of grey bases."""
+    import numpy as np
+    steps = np.asarray(MONOCHROMATIC_STEPS)[None, :]
+    colored = saturation > 0.0
+    return (np.where(colored, hue, 0.0),
+            np.where(colored, np.maximum(0.0, saturation - steps), 0.0),
+            np.where(colored, value, np.maximum(0.0, value - steps)))
+
+for _definition in (
+    HarmonyDefinition("COMPLEMENTARY",       "Complementary",       lambda f: (0.5,),
+                      preset_angle = 180.0, line_indices = [(1, 2)], uses_angle = False),
+    HarmonyDefinition("SPLIT_COMPLEMENTARY", "Split Complementary", lambda f: (0.5 - f, 0.5 + f),
+                      preset_angle = 30.0,  line_indices = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]),
+    HarmonyDefinition("ANALOGOUS",           "Analogous",           lambda f: (-f, f),
+                      preset_angle = 30.0,  line_indices = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]),
+    HarmonyDefinition("TRIADIC",             "Triadic",             lambda f: (-f, f),
+                      preset_angle = 120.0, line_indices = [(0, 1), (0, 2), (0, 3), (1, 2), (2, 3), (3, 1)]),
+    HarmonyDefinition("TETRADIC_SQUARE",     "Tetradic Square",     lambda f: (0.25, 0.5, 0.75),
+                      preset_angle = 90.0,  line_indices = [(1, 2), (2, 3), (3, 4), (4, 1)], uses_angle = False),
+    HarmonyDefinition("TETRADIC_ANGLE",      "Tetradic Angle",      lambda f: (-f, f, -2.0 * f),
+                      preset_angle = 90.0,  line_indices = [(1, 2), (2, 3), (3, 4), (4, 1)]),
+    HarmonyDefinition("MONOCHROMATIC",       "Monochromatic",       lambda f: (0.0,) * len(MONOCHROMATIC_STEPS),
+                      preset_angle = 0.0,   line_indices = [(0, 1), (0, 2), (0, 3)], uses_angle = False,
+                      sv_transform = monochromatic_transform),
+):
+    register_harmony(_definition)
+
+# ------------------------------------------------
+def harmony_hsv(base_hsva: np.ndarray, harmony_type: str, angles = 30.0) -> np.ndarray:
+    """
+    Calculates the harmony colors (without the base color) for many base colors at once.
+
+    Parameters:
+    - base_hsva: (N,4) array of HSV colors with alpha
+    - harmony_type: identifier of a registered harmony
+    - angles: angle in degrees, scalar or one per base color
+
+    Returns an (N,k,4) HSVA array, k depends on the harmony type. Raises ValueError for unknown types.
+    """
+    import numpy as np
+    definition = get_harmony(harmony_type)
+    base_hsva = np.asarray(base_hsva, dtype = np.float64).reshape(-1, 4)
+    num_bases = base_hsva.shape[0]
+    angle_fraction = np.broadcast_to(np.asarray(angles, dtype = np.float64) / 360.0, (num_bases,))
+
+    shape = (num_bases, definition.num_harmony_colors)
+    hue = (base_hsva[:, 0:1] + definition.get_hue_offsets(angle_fraction)) % 1.0
+    saturation = np.broadcast_to(base_hsva[:, 1:2], shape)
+    value = np.broadcast_to(base_hsva[:, 2:3], shape)
+    if definition.sv_transform is not None:
+        hue, saturation, value = definition.sv_transform(hue, saturation, value)
+
+    return np.stack((hue, saturation, value, np.broadcast_to(base_hsva[:, 3:4], shape)), axis = -1)
+
+# ------------------------------------------------
+def harmony_palette(base_rgba: np.ndarray, harmony_type: str, angles = 30.0) -> np.ndarray:
+    """
+    Returns the complete palettes for many base colors at once.
+
+    Parameters:
+    - base_rgba: (N,4) or (N,3) array of RGB(A) colors in the range 0.0-1.0
+    - harmony_type: identifier of a registered harmony
+    - angles: angle in degrees, scalar or one per base color
+
+    Returns an (N,k,4) RGBA array, index 0 of each palette is the base color itself.
+    """
+    import numpy as np
+    base_rgba = np.asarray(base_rgba, dtype = np.float64)
+    if base_rgba.ndim == 1:
+        base_rgba = base_rgba[None, :]
+    if base_rgba.shape[-1] == 3:
+        base_rgba = np.concatenate((base_rgba, np.ones((base_rgba.shape[0], 1))), axis = -1)
+
+    base_hsva = np.concatenate((rgb_to_hsv_array(base_rgba[:, :3]), base_rgba[:, 3:4]), axis = -1)
+    harmony = harmony_hsv(base_hsva, harmony_type, angles)
+    harmony_rgba = np.concatenate((hsv_to_rgb_array(harmony[..., :3]), harmony[..., 3:4]), axis = -1)
+    return np.concatenate((base_rgba[:, None, :], harmony_rgba), axis = 1)
+
+# ---------------------------------------------------------------------------------------
+# OKLab (Björn Ottosson) for perceptual color distances. Socket and material colors in Blender are
+# scene linear, colors of palette files and hex codes are sRGB encoded.
+
+# ------------------------------------------------
+def srgb_to_linear_array(rgb: np.ndarray) -> np.ndarray:
+    import numpy as np
+    rgb = np.asarray(rgb, dtype = np.float64)
+    return np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+# ------------------------------------------------
+def linear_to_oklab_array(linear: np.ndarray) -> np.ndarray:
+    """Converts an (..., 3) linear RGB array to OKLab (L, a, b)."""
+    import numpy as np
+    lms = np.asarray(linear, dtype = np.float64) @ np.array([[0.4122214708, 0.2119034982, 0.0883024619],
+                             [0.5363325363, 0.6806995451, 0.2817188376],
+                             [0.0514459929, 0.1073969566, 0.6299787005]])
+    lms = np.cbrt(lms)
+    return lms @ np.array([[0.2104542553,  1.9779984951,  0.0259040371],
+                           [0.7936177850, -2.4285922050,  0.7827717662],
+                           [-0.0040720468, 0.4505937099, -0.8086757660]])
+
+# ------------------------------------------------
+def rgb_to_oklab_array(rgb: np.ndarray) -> np.ndarray:
+    """Converts an (..., 3) sRGB array to OKLab (L, a, b)."""
+    return linear_to_oklab_array(srgb_to_linear_array(rgb))
+
+# ------------------------------------------------
+def linear_to_srgb_array(linear: np.ndarray) -> np.ndarray:
+    import numpy as np
+    linear = np.clip(np.asarray(linear, dtype = np.float64), 0.0, None)
+    return np.where(linear <= 0.0031308, linear * 12.92, 1.055 * linear ** (1.0 / 2.4) - 0.055)
+
+# ------------------------------------------------
+def oklab_to_linear_array(oklab: np.ndarray) -> np.ndarray:
+    """Converts an (..., 3) OKLab array back to linear RGB, clipped to 0.0-1.0."""
+    import numpy as np
+    lms = np.asarray(oklab, dtype = np.float64) @ np.array([[1.0,           1.0,           1.0],
+                                                            [0.3963377774, -0.1055613458, -0.0894841775],
+                                                            [0.2158037573, -0.0638541728, -1.2914855480]])
+    linear = (lms ** 3) @ np.array([[ 4.0767416621, -1.2684380046, -0.0041960863],
+                                    [-3.3077115913,  2.6097574011, -0.7034186147],
+                                    [ 0.2309699292, -0.3413193965,  1.7076147010]])
+    return np.clip(linear, 0.0, 1.0)
+
+# ------------------------------------------------
+def oklab_to_rgb_array(oklab: np.ndarray) -> np.ndarray:
+    """Converts an (..., 3) OKLab array back to sRGB, clipped to 0.0-1.0."""
+    return linear_to_srgb_array(oklab_to_linear_array(oklab))
+
+# ---------------------------------------------------------------------------------------
+# Color ramps: N colors interpolated between color stops
+
+RAMP_COLOR_SPACES = ('HSV', 'OKLAB')
+
+# ------------------------------------------------
+def ramp_colors(stops_rgba: np.ndarray, steps: int, color_space: str = 'OKLAB') -> np.ndarray:
+    """
+    Interpolates (steps, 4) RGBA colors between the evenly spaced (k, 4) linear color stops (socket colors).
+    In HSV the hue takes the shorter way around the color wheel, alpha is always interpolated linearly.
+    """
+    import numpy as np
+    stops = np.asarray(stops_rgba, dtype = np.float64).reshape(-1, 4)
+    if color_space not in RAMP_COLOR_SPACES:
+        raise ValueError(f"Unknown ramp color space: {color_space}")
+    if stops.shape[0] == 1 or steps < 2:
+        return np.repeat(stops[:1], max(steps, 1), axis = 0)
+
+    # position of every step between its two stops
+    position = np.linspace(0.0, stops.shape[0] - 1, steps)
+    lower = np.minimum(position.astype(np.int64), stops.shape[0] - 2)
+    t = (position - lower)[:, None]
+
+    if color_space == 'HSV':
+        hsv = rgb_to_hsv_array(stops[:, :3])
+        hue_delta = (hsv[lower + 1, 0] - hsv[lower, 0] + 0.5) % 1.0 - 0.5     # shortest way, -0.5..0.5
+        result_hsv = hsv[lower] + t * (hsv[lower + 1] - hsv[lower])
+        result_hsv[:, 0] = (hsv[lower, 0] + t[:, 0] * hue_delta) % 1.0
+        rgb = hsv_to_rgb_array(result_hsv)
+    else:
+        oklab = linear_to_oklab_array(stops[:, :3])
+        rgb = oklab_to_linear_array(oklab[lower] + t * (oklab[lower + 1] - oklab[lower]))
+
+    alpha = stops[lower, 3:] + t * (stops[lower + 1, 3:] - stops[lower, 3:])
+    return np.concatenate((rgb, alpha), axis = 1)
+
+# ---------------------------------------------------------------------------------------
+# Palette library: snaps colors to the nearest color of a large swatch library
+
+QUERY_QUANTIZATION = 1024       # steps per channel of the query cache keys
+
+class PaletteLibrary:
+    """
+    Swatch library with a nearest neighbour index in OKLab space.
+    Uses mathutils.kdtree inside Blender (O(log n) per query) and a vectorized NumPy search otherwise.
+    The swatches are given sRGB encoded like in palette files, queries and results are linear socket colors.
+    Query results are cached.
+    """
+    def __init__(self, colors):
+        import numpy as np
+        colors = np.asarray(colors, dtype = np.float64)
+        if colors.ndim != 2 or colors.shape[0] == 0 or colors.shape[1] < 3:
+            raise ValueError("A palette library needs at least one RGB color.")
+        self.colors = srgb_to_linear_array(colors[:, :3])
+        self.oklab = linear_to_oklab_array(self.colors)
+        self.query_cache = {}
+        self.kdtree = None
+        try:
+            from mathutils.kdtree import KDTree     # type: ignore
+        except ImportError:
+            return
+
+        self.kdtree = KDTree(len(self.oklab))
+        for index, co in enumerate(self.oklab):
+            self.kdtree.insert(co, index)
+        self.kdtree.balance()
+
+    # ------------------------------------------------
+    def find_indices(self, rgb: np.ndarray) -> np.ndarray:
+        """Returns the library index of the nearest swatch for each (N,3) linear color, without cache."""
+        import numpy as np
+        query = linear_to_oklab_array(np.asarray(rgb, dtype = np.float64).reshape(-1, 3))
+        if self.kdtree is not None:
+            return np.array([self.kdtree.find(co)[1] for co in query], dtype = np.int64)
+
+        indices = np.empty(query.shape[0], dtype = np.int64)
+        chunk_size = max(1, 2_000_000 // len(self.oklab))   # limits the size of the distance matrix
+        for start in range(0, query.shape[0], chunk_size):
+            chunk = query[start:start + chunk_size]
+            distances = ((chunk[:, None, :] - self.oklab[None, :, :]) ** 2).sum(axis = 2)
+            indices[start:start + chunk_size] = distances.argmin(axis = 1)
+        return indices
+
+    # ------------------------------------------------
+    def snap(self, color) -> tuple:
+        """Returns the nearest swatch of a linear RGB(A) color as linear RGBA tuple, the alpha value is kept."""
+        alpha = color[3] if len(color) > 3 else 1.0
+        key = tuple(int(round(c * QUERY_QUANTIZATION)) for c in color[:3])
+        index = self.query_cache.get(key)
+        if index is None:
+            index = int(self.find_indices(color[:3])[0])
+            self.query_cache[key] = index
+        return (*(float(c) for c in self.colors[index]), alpha)
+
+# ------------------------------------------------
+def parse_palette_colors(filepath: str) -> list:
+    """
+    Reads the swatches of a palette file as list of sRGB encoded RGB tuples (0.0-1.0):
+    - GIMP palettes (.gpl)
+    - JSON: list of hex strings or RGB(A) lists (0.0-1.0), or an object with the list as "colors"
+    - any other text file: one hex color per line (#RRGGBB or RRGGBB)
+    """
+    import json
+
+    def from_hex(text: str):
+        text = text.strip().lstrip("#")
+        return tuple(int(text[i:i + 2], 16) / 255.0 for i in (0, 2, 4))
+
+    colors = []
+    with open(filepath, encoding = "utf-8") as palette_file:
+        if filepath.lower().endswith(".json"):
+            data = json.load(palette_file)
+            if isinstance(data, dict):
+                data = data.get("colors", [])
+            for item in data:
+                colors.append(from_hex(item) if isinstance(item, str) else tuple(float(c) for c in item[:3]))
+        elif filepath.lower().endswith(".gpl"):
+            for line in palette_file:
+                parts = line.split()
+                if len(parts) >= 3 and all(p.isdigit() for p in parts[:3]):
+                    colors.append(tuple(int(p) / 255.0 for p in parts[:3]))
+        else:
+            for line in palette_file:
+                line = line.strip()
+                if line and not line.startswith(("//", ";")):
+                    colors.append(from_hex(line.split()[0]))
+    return colors
+
+# absolute path -> (mtime, library), a library is loaded and indexed only once per version of the file
+palette_libraries = {}
+
+# ------------------------------------------------
+def get_palette_library(filepath: str) -> PaletteLibrary:
+    """Returns the library of a palette file, loaded again only if the file was changed."""
+    import os
+
+    path = os.path.abspath(filepath)
+    mtime = os.stat(path).st_mtime_ns
+    entry = palette_libraries.get(path)
+    if entry is None or entry[0] != mtime:
+        entry = (mtime, PaletteLibrary(parse_palette_colors(path)))
+        palette_libraries[path] = entry     # replaces only an older version of the same file
+    return entry[1]
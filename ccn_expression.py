@@ -0,0 +1,155 @@
+from __future__ import annotations
+import ast
+
+# ---------------------------------------------------------------------------------------
+# Safe math expressions (no bpy): a formula like "a*sin(b)+c" is checked against a whitelist of syntax
+# elements and names, compiled once and evaluated with single values or NumPy arrays.
+
+# ------------------------------------------------
+def clamp(value, minimum = 0.0, maximum = 1.0):
+    import numpy as np
+    return np.clip(value, minimum, maximum)
+
+# ------------------------------------------------
+def lerp(a, b, factor):
+    return a + (b - a) * factor
+
+# ------------------------------------------------
+def get_expression_namespace() -> dict:
+    """Returns the functions and constants usable in expressions by name, created on first use."""
+    if not expression_namespace:
+        import numpy as np
+        expression_namespace.update({
+            "sin": np.sin, "cos": np.cos, "tan": np.tan,
+            "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan, "atan2": np.arctan2,
+            "sinh": np.sinh, "cosh": np.cosh, "tanh": np.tanh,
+            "sqrt": np.sqrt, "exp": np.exp, "log": np.log, "log10": np.log10, "pow": np.power,
+            "abs": np.abs, "sign": np.sign, "floor": np.floor, "ceil": np.ceil, "round": np.round,
+            "min": np.minimum, "max": np.maximum, "clamp": clamp, "lerp": lerp, "where": np.where,
+            "radians": np.radians, "degrees": np.degrees,
+            "pi": np.pi, "e": np.e, "tau": 2.0 * np.pi,
+        })
+    return expression_namespace
+
+FUNCTION_NAMES = ("sin", "cos", "tan", "asin", "acos", "atan", "atan2", "sinh", "cosh", "tanh",
+                  "sqrt", "exp", "log", "log10", "pow", "abs", "sign", "floor", "ceil", "round",
+                  "min", "max", "clamp", "lerp", "where", "radians", "degrees")
+CONSTANT_NAMES = ("pi", "e", "tau")
+
+# name -> NumPy function or constant, filled on the first evaluation so NumPy is not imported with the add-on
+expression_namespace = {}
+
+# (minimum, maximum) number of arguments, NumPy ufuncs take one more positional argument as "out" array
+# which would overwrite the array of another node
+ARGUMENT_COUNTS = {name: (1, 1) for name in FUNCTION_NAMES}
+ARGUMENT_COUNTS.update({"atan2": (2, 2), "pow": (2, 2), "min": (2, 2), "max": (2, 2), "round": (1, 2),
+                        "clamp": (1, 3), "lerp": (3, 3), "where": (3, 3)})
+
+ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Constant, ast.Load,
+                 ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub,
+                 ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+
+# expression text -> (code object, variable names in order of appearance, constants by name)
+expression_cache = {}
+
+# ------------------------------------------------
+def check_expression(tree: ast.Expression) -> list:
+    """Raises ValueError for syntax elements or names which are not allowed, returns the variable names."""
+    variables = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"'{type(node).__name__}' is not allowed in an expression")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"Only numbers are allowed as constants, not {node.value!r}")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTION_NAMES:
+                raise ValueError(f"Unknown function '{ast.unparse(node.func)}'")
+            if node.keywords:
+                raise ValueError(f"Keyword arguments are not allowed ('{node.func.id}')")
+            minimum, maximum = ARGUMENT_COUNTS[node.func.id]
+            if not minimum <= len(node.args) <= maximum:
+                expected = minimum if minimum == maximum else f"{minimum} to {maximum}"
+                raise ValueError(f"'{node.func.id}' takes {expected} argument{'s' if maximum > 1 else ''}, not {len(node.args)}")
+            if node.func.id == "round" and len(node.args) == 2:
+                digits = node.args[1]
+                if not isinstance(digits, ast.Constant) or not isinstance(digits.value, int):
+                    raise ValueError("The second argument of 'round' must be a whole number")
+
+    # names which are not called functions or constants are the variables, in order of their position
+    names = sorted((node for node in ast.walk(tree) if isinstance(node, ast.Name)),
+                   key = lambda node: (node.lineno, node.col_offset))
+    for node in names:
+        if node.id in FUNCTION_NAMES:
+            continue
+        if node.id.startswith("_"):
+            raise ValueError(f"Names starting with '_' are not allowed ('{node.id}')")
+        if node.id not in CONSTANT_NAMES and node.id not in variables:
+            variables.append(node.id)
+    return variables
+
+# ------------------------------------------------
+class ConstantTransformer(ast.NodeTransformer):
+    """
+    Replaces the number constants by names of NumPy float64 values, so constant parts like 1/0 or 9**9**9
+    behave like the variables (inf, then 0.0) instead of raising Python exceptions or calculating huge integers.
+    """
+    def transform(self, tree: ast.Expression) -> tuple:
+        self.constants = {}
+        tree = ast.fix_missing_locations(self.visit(tree))
+        return tree, self.constants
+
+    def visit_Call(self, node):
+        if node.func.id == "round" and len(node.args) == 2:
+            node.args[0] = self.visit(node.args[0])     # the number of digits stays an integer
+            return node
+        return self.generic_visit(node)
+
+    def visit_Constant(self, node):
+        import numpy as np
+        name = f"_c{len(self.constants)}"     # user names must not start with "_"
+        try:
+            self.constants[name] = np.float64(node.value)
+        except OverflowError:
+            raise ValueError(f"The number {str(node.value)[:12]}... is too large") from None
+        return ast.copy_location(ast.Name(id = name, ctx = ast.Load()), node)
+
+# ------------------------------------------------
+def compile_expression(text: str) -> tuple:
+    """
+    Returns the cached (code object, variable names, constants) of the expression,
+    raises ValueError if it is invalid.
+    """
+    entry = expression_cache.get(text)
+    if entry is None:
+        try:
+            tree = ast.parse(text.strip(), mode = "eval")
+        except SyntaxError as e:
+            raise ValueError(f"Syntax error: {e.msg}") from None
+        variables = check_expression(tree)
+        tree, constants = ConstantTransformer().transform(tree)
+        entry = (compile(tree, "<ccn expression>", "eval"), variables, constants)
+        expression_cache[text] = entry
+    return entry
+
+# ------------------------------------------------
+def get_variable_names(text: str) -> list:
+    return compile_expression(text)[1]
+
+# ------------------------------------------------
+def evaluate_expression(text: str, values: dict):
+    """
+    Evaluates the expression with the values of its variables (single values or arrays, calculated element-wise).
+    Division by zero and invalid values give 0.0 like in the Number Operator node.
+    Returns a float or an array.
+    """
+    import numpy as np
+    code, variables, constants = compile_expression(text)
+    missing = [name for name in variables if name not in values]
+    if missing:
+        raise ValueError(f"No value for {', '.join(missing)}")
+
+    namespace = {"__builtins__": {}, **get_expression_namespace(), **constants}
+    namespace.update((name, np.asarray(values[name], dtype = np.float64)) for name in variables)
+    with np.errstate(divide = "ignore", invalid = "ignore", over = "ignore"):
+        result = np.nan_to_num(np.asarray(eval(code, namespace), dtype = np.float64), nan = 0.0, posinf = 0.0, neginf = 0.0)
+    return float(result) if result.ndim == 0 else result
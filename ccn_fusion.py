@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from . import ccn_arrays as ccna
+from . import ccn_expression as ccnx
+
+# ---------------------------------------------------------------------------------------
+# Fusion of pure arithmetic node chains: the structure of a linked group of Number Operator, Dynamic Input and
+# Expression nodes is turned into one generated Python function. Intermediate results stay local variables
+# (single values or NumPy arrays) instead of being written to and read from sockets.
+#
+# A structure is (operations, number of external inputs, outputs):
+# - operation: (kind, parameter, arguments) with kind 'OPERATOR' (parameter 'ADD', 'SUB', 'MUL' or 'DIV'),
+#   'DYNAMIC' (outputs sum, product, minimum, maximum, mean and variance)
+#   or 'EXPRESSION' (parameter (expression, variable names))
+# - argument / output reference: ('x', external input index) or ('n', operation index, output index)
+
+OPERATOR_SYMBOLS = {'ADD': "+", 'SUB': "-", 'MUL': "*"}
+
+# structure -> generated kernel function
+kernel_cache = {}
+
+# ------------------------------------------------
+def get_reference_code(reference: tuple) -> str:
+    if reference[0] == 'x':
+        return f"x[{reference[1]}]"
+    return f"n{reference[1]}_{reference[2]}"
+
+# ------------------------------------------------
+def generate_kernel_source(structure: tuple) -> str:
+    operations, _num_inputs, outputs = structure
+    lines = ["def kernel(*inputs):",
+             "    x = broadcast_values(*inputs)"]
+    for j, (kind, parameter, arguments) in enumerate(operations):
+        args = [get_reference_code(argument) for argument in arguments]
+        if kind == 'OPERATOR':
+            if parameter == 'DIV':
+                lines.append(f"    n{j}_0 = safe_divide({args[0]}, {args[1]})")
+            else:
+                lines.append(f"    n{j}_0 = {args[0]} {OPERATOR_SYMBOLS[parameter]} {args[1]}")
+        elif kind == 'DYNAMIC':
+            lines.append(f"    n{j}_0, n{j}_1, n{j}_2, n{j}_3, n{j}_4, n{j}_5 = reduce_values({', '.join(args)})")
+        elif kind == 'EXPRESSION':
+            expression, names = parameter
+            values = ", ".join(f"{name!r}: {arg}" for name, arg in zip(names, args))
+            lines.append(f"    n{j}_0 = evaluate_expression({expression!r}, {{{values}}})")
+        else:
+            raise ValueError(f"Unknown operation '{kind}'")
+    lines.append(f"    return ({''.join(get_reference_code(output) + ', ' for output in outputs)})")
+    return "\n".join(lines)
+
+# ------------------------------------------------
+def get_kernel(structure: tuple):
+    """Returns the kernel of the structure, generated and compiled only once per structure."""
+    kernel = kernel_cache.get(structure)
+    if kernel is None:
+        namespace = {"broadcast_values": ccna.broadcast_values,
+                     "safe_divide": ccna.safe_divide,
+                     "reduce_values": ccna.reduce_values,
+                     "evaluate_expression": ccnx.evaluate_expression}
+        exec(compile(generate_kernel_source(structure), "<ccn fused kernel>", "exec"), namespace)
+        kernel = namespace["kernel"]
+        kernel_cache[structure] = kernel
+    return kernel
@@ -0,0 +1,309 @@
+from __future__ import annotations
+import time
+import bpy                                          # type: ignore
+from bpy.app.handlers import persistent             # type: ignore
+
+from . import ccn_utils as ccnu
+
+# ---------------------------------------------------------------------------------------
+# Material helpers shared by the Object Utility and the Color Harmony nodes
+
+SHARED_MATERIAL_NAME = "CCN_SharedObjectColor"
+
+# ------------------------------------------------
+def get_shared_material():
+    """
+    Returns the one material used by all nodes in shared material mode and creates it if needed.
+    Its Principled BSDF reads the Base Color from the Object Info node, so every object shows its own
+    "obj.color" and a color change never needs a new material or a shader recompilation.
+    """
+    mat = bpy.data.materials.get(SHARED_MATERIAL_NAME)
+    if mat is None:
+        mat = bpy.data.materials.new(name = SHARED_MATERIAL_NAME)
+        mat.use_nodes = True
+
+    nt = mat.node_tree
+    bsdf = nt.nodes.get("Principled BSDF")
+    if bsdf and not bsdf.inputs["Base Color"].is_linked:
+        object_info = nt.nodes.new(type = "ShaderNodeObjectInfo")
+        object_info.location = (bsdf.location.x - 250, bsdf.location.y)
+        nt.links.new(object_info.outputs["Color"], bsdf.inputs["Base Color"])
+    return mat
+
+TEMPLATE_MATERIAL_NAME = ".CCN_MaterialTemplate"     # the leading dot hides it in the material lists
+
+# material pointer -> (node tree pointer, BSDF node name, BSDF node pointer, Base Color socket).
+# Keyed by pointer and not by name: a material which is removed and created again with the same name
+# must not get the socket of the removed one. The socket is only used while the node tree still has the same
+# BSDF node, a deleted or replaced node would leave a socket reference to freed memory.
+base_color_socket_cache = {}
+
+# ------------------------------------------------
+def get_template_material():
+    """Returns the template material which is built once per session and copied for new materials."""
+    mat = bpy.data.materials.get(TEMPLATE_MATERIAL_NAME)
+    if mat is None:
+        mat = bpy.data.materials.new(name = TEMPLATE_MATERIAL_NAME)
+        mat.use_nodes = True
+    return mat
+
+# ------------------------------------------------
+def new_material(name: str):
+    """Creates a new node material as copy of the template, much faster than building a new node tree."""
+    mat = get_template_material().copy()
+    mat.name = name
+    return mat
+
+# ------------------------------------------------
+def get_base_color_socket(mat):
+    """Returns the Base Color input of the Principled BSDF of the material (cached) or None."""
+    node_tree = mat.node_tree
+    if node_tree is None:
+        return None
+    key = mat.as_pointer()
+    entry = base_color_socket_cache.get(key)
+    if entry is not None:
+        tree_pointer, node_name, node_pointer, socket = entry
+        node = node_tree.nodes.get(node_name) if tree_pointer == node_tree.as_pointer() else None
+        if node is not None and node.as_pointer() == node_pointer:
+            return socket
+        del base_color_socket_cache[key]
+
+    bsdf = node_tree.nodes.get("Principled BSDF")
+    if bsdf is None:
+        return None
+    socket = bsdf.inputs["Base Color"]
+    base_color_socket_cache[key] = (node_tree.as_pointer(), bsdf.name, bsdf.as_pointer(), socket)
+    return socket
+
+# ------------------------------------------------
+def set_base_color(mat, color) -> bool:
+    """Sets the Base Color of the material, returns False if it has no Principled BSDF."""
+    socket = get_base_color_socket(mat)
+    if socket is None:
+        return False
+    if len(color) == 3:
+        color = (*color, 1.0)   # add alpha value if the color is RGB instead of RGBA
+    socket.default_value = color
+    return True
+
+# caches with references or names of data which can change with undo or loading a file
+session_caches = [base_color_socket_cache]
+
+# ------------------------------------------------
+def register_session_cache(cache):
+    """Adds a cache (dict or set) which is cleared after undo, redo and loading a file."""
+    if not any(c is cache for c in session_caches):
+        session_caches.append(cache)
+
+# ------------------------------------------------
+@persistent
+def clear_session_caches(*args):
+    """Socket references and node names are invalid after undo or loading a file."""
+    for cache in session_caches:
+        cache.clear()
+
+# ------------------------------------------------
+# Deferred work: while the frame-change evaluation runs, non-critical tasks like color wheel icon redraws and
+# material bookkeeping are queued and run later in the time left of a frame or when the playback stopped
+
+defer_work = False
+deferred_tasks = {}     # key -> function, a task queued again replaces the waiting one
+
+# the functions are bound to nodes which are invalid after undo or loading a file
+register_session_cache(deferred_tasks)
+
+# ------------------------------------------------
+def run_or_defer(key, function):
+    """Runs the function now or, while defer_work is set, queues it under the key."""
+    if defer_work:
+        deferred_tasks[key] = function
+        return
+    function()
+
+# ------------------------------------------------
+def run_deferred_tasks(deadline: float | None = None) -> int:
+    """Runs the queued tasks in their order until the time.perf_counter() deadline, returns the number of run tasks."""
+    count = 0
+    while deferred_tasks:
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        function = deferred_tasks.pop(next(iter(deferred_tasks)))
+        try:
+            function()
+        except ReferenceError:
+            pass    # the node was removed in the meantime
+        count += 1
+    return count
+
+# ------------------------------------------------
+def get_module_handlers() -> tuple:
+    """(handler list name, function) of all handlers of this module."""
+    return (("load_post", clear_session_caches), ("undo_post", clear_session_caches), ("redo_post", clear_session_caches),
+            ("load_post", clear_palette_registry))
+
+# ------------------------------------------------
+def register_handlers():
+    ccnu.register_app_handlers(get_module_handlers())
+
+# ------------------------------------------------
+def unregister_handlers():
+    ccnu.unregister_app_handlers(get_module_handlers())
+    clear_session_caches()
+
+# ------------------------------------------------
+def assign_material(obj, mat):
+    """Sets the material into the first material slot of the object, only written if it is another one."""
+    materials = obj.data.materials
+    if materials:
+        if materials[0] != mat:
+            materials[0] = mat
+    else:
+        materials.append(mat)
+
+# ------------------------------------------------
+def set_object_color(obj, color):
+    """Writes the color as RGBA into "obj.color" if it was changed."""
+    if len(color) == 3:
+        color = (*color, 1.0)   # add alpha value if the color is RGB instead of RGBA
+    if tuple(obj.color) != tuple(color):
+        obj.color = color
+
+# ------------------------------------------------
+def assign_shared_color(obj, color):
+    """Assigns the shared material to the object and stores the color in the object itself."""
+    assign_material(obj, get_shared_material())
+    set_object_color(obj, color)
+
+# ------------------------------------------------
+def set_collection_colors(collection, colors, use_shared_material: bool = True) -> int:
+    """
+    Spreads the (N, 4) colors evenly over all objects of the collection and writes them into "obj.color"
+    with one foreach_set call. With use_shared_material the objects also get the shared material, which is
+    looked up only once. Returns the number of colored objects.
+    """
+    import numpy as np
+
+    objects = collection.all_objects
+    count = len(objects)
+    if count == 0 or len(colors) == 0:
+        return 0
+
+    colors = np.asarray(colors, dtype = np.float32).reshape(-1, 4)
+    indices = np.round(np.linspace(0, colors.shape[0] - 1, count)).astype(np.int64)
+    objects.foreach_set("color", colors[indices].ravel())
+
+    if use_shared_material:
+        mat = get_shared_material()
+        for obj in objects:
+            if obj.data is not None and hasattr(obj.data, "materials"):
+                assign_material(obj, mat)
+    return count
+
+# ---------------------------------------------------------------------------------------
+# Palette material registry: objects with the same (quantized) color share one material
+
+PALETTE_MATERIAL_PREFIX = "CCNPalette_"
+# number of steps per channel (buckets of 1/255): colors which round to the same 8-bit values, so which differ
+# by less than one 8-bit step per channel, share a material
+COLOR_QUANTIZATION      = 255
+
+palette_users        = {}   # quantized color key -> set of user ids (see get_user_id)
+palette_user_keys    = {}   # user id -> quantized color key currently used by this user
+palette_unused_keys  = set()    # keys which lost their last user, removed by collect_palette_garbage()
+
+# ------------------------------------------------
+def get_user_id(obj) -> int:
+    """Palette user id of an object, unlike the name it stays the same when the object is renamed."""
+    return obj.session_uid
+
+# ------------------------------------------------
+@persistent
+def clear_palette_registry(*args):
+    """The users registered for the previous file are not valid for a loaded file."""
+    palette_users.clear()
+    palette_user_keys.clear()
+    palette_unused_keys.clear()
+
+# ------------------------------------------------
+def quantize_color(color) -> tuple:
+    """Returns the RGBA color as tuple of integers which is used as key in the palette registry."""
+    if len(color) == 3:
+        color = (*color, 1.0)
+    return tuple(int(round(max(0.0, min(1.0, c)) * COLOR_QUANTIZATION)) for c in color[:4])
+
+# ------------------------------------------------
+def get_palette_material_name(key: tuple) -> str:
+    return PALETTE_MATERIAL_PREFIX + "".join(f"{c:02X}" for c in key)
+
+# ------------------------------------------------
+def acquire_palette_material(color, user):
+    """
+    Returns the palette material for the color and registers the user for it.
+    If the user had another palette color before, that one loses a reference.
+
+    Parameters:
+    - color: RGB or RGBA color
+    - user: unique id of the user of the material, get_user_id() of an object or a string for other users
+    """
+    key = quantize_color(color)
+    mat_name = get_palette_material_name(key)
+    mat = bpy.data.materials.get(mat_name)
+    if mat is None:
+        mat = new_material(mat_name)
+        set_base_color(mat, tuple(c / COLOR_QUANTIZATION for c in key))
+
+    previous_key = palette_user_keys.get(user)
+    if previous_key != key:
+        if previous_key is not None:
+            release_palette_user(user)
+        palette_users.setdefault(key, set()).add(user)
+        palette_user_keys[user] = key
+        palette_unused_keys.discard(key)
+    return mat
+
+# ------------------------------------------------
+def release_palette_user(user):
+    """Removes the reference of the user, the material is removed with the next garbage collection."""
+    key = palette_user_keys.pop(user, None)
+    if key is None:
+        return
+    users = palette_users.get(key)
+    if users is not None:
+        users.discard(user)
+        if not users:
+            del palette_users[key]
+            palette_unused_keys.add(key)
+
+# ------------------------------------------------
+def collect_palette_garbage() -> int:
+    """
+    Removes palette materials without registered users which are also not used anywhere else in the file.
+    Materials which are still used (e.g. assigned by hand) stay candidates for the next collection.
+    Returns the number of removed materials.
+    """
+    removed = 0
+    for key in list(palette_unused_keys):
+        if key in palette_users:
+            palette_unused_keys.discard(key)
+            continue
+        mat = bpy.data.materials.get(get_palette_material_name(key))
+        if mat is None:
+            palette_unused_keys.discard(key)
+        elif mat.users == 0:
+            base_color_socket_cache.pop(mat.as_pointer(), None)
+            bpy.data.materials.remove(mat)
+            palette_unused_keys.discard(key)
+            removed += 1
+    return removed
+
+# ------------------------------------------------
+def get_saved_material_count(users = None) -> int:
+    """
+    Returns how many materials are saved because users share a palette material,
+    for the given user ids (e.g. the objects of one operator run) or for all users.
+    """
+    if users is None:
+        return len(palette_user_keys) - len(palette_users)
+    keys = [palette_user_keys[user] for user in set(users) if user in palette_user_keys]
+    return len(keys) - len(set(keys))
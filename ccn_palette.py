@@ -0,0 +1,170 @@
+from __future__ import annotations
+import os
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:                                   # NumPy is imported on first use, see the functions
+    import numpy as np
+
+# ---------------------------------------------------------------------------------------
+# Palette extraction (no bpy): dominant colors of an image with mini-batch k-means over sampled pixels
+
+MAX_SAMPLES         = 20000     # pixels used for the k-means, independent of the image size
+KMEANS_BATCH_SIZE   = 1024
+KMEANS_ITERATIONS   = 60
+MIN_ALPHA           = 0.5       # pixels more transparent than this are ignored
+
+# cache key -> (num_colors, 4) palette array, see get_file_key() and get_pixel_key()
+palette_cache = {}
+
+# ------------------------------------------------
+def get_file_key(filepath: str, num_colors: int, max_samples: int = MAX_SAMPLES) -> tuple:
+    """Cache key of an image file, changes when the file is written again."""
+    stat = os.stat(filepath)
+    return (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size, num_colors, max_samples)
+
+# ------------------------------------------------
+def get_pixel_key(signature: tuple, num_colors: int, max_samples: int = MAX_SAMPLES) -> tuple:
+    """
+    Cache key of an image in memory. The signature (name, size, change counters, ...) is given by the caller
+    and must change with the pixels, checksums of the pixel buffers would cost as much as the extraction.
+    """
+    return ("PIXELS", signature, num_colors, max_samples)
+
+# ------------------------------------------------
+def sample_pixels(pixels: np.ndarray, max_samples: int = MAX_SAMPLES) -> np.ndarray:
+    """
+    Returns at most max_samples RGB pixels of an (M,3) or (M,4) array using stride sampling.
+    Transparent pixels are removed.
+    """
+    import numpy as np
+    pixels = np.asarray(pixels).reshape(-1, pixels.shape[-1])
+    stride = max(1, pixels.shape[0] // max_samples)
+    samples = pixels[::stride][:max_samples]
+    if samples.shape[1] == 4:
+        opaque = samples[samples[:, 3] >= MIN_ALPHA]
+        if opaque.shape[0]:
+            samples = opaque
+    return np.ascontiguousarray(samples[:, :3], dtype = np.float32)
+
+# ------------------------------------------------
+def mini_batch_kmeans(samples: np.ndarray, num_colors: int, batch_size: int = KMEANS_BATCH_SIZE,
+                      iterations: int = KMEANS_ITERATIONS, seed: int = 0):
+    """
+    Mini-batch k-means (Sculley 2010) with k-means++ initialization.
+    Returns the (k,3) centers sorted by the number of samples of each cluster (largest first) and the counts.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    samples = np.asarray(samples, dtype = np.float32)
+    num_colors = max(1, min(num_colors, samples.shape[0]))
+
+    # k-means++ initialization on a subset
+    subset = samples[rng.choice(samples.shape[0], size = min(samples.shape[0], 4 * batch_size), replace = False)]
+    centers = [subset[rng.integers(subset.shape[0])]]
+    distances = ((subset - centers[0]) ** 2).sum(axis = 1)
+    for _ in range(1, num_colors):
+        total = distances.sum()
+        index = rng.choice(subset.shape[0], p = distances / total) if total > 0 else rng.integers(subset.shape[0])
+        centers.append(subset[index])
+        distances = np.minimum(distances, ((subset - subset[index]) ** 2).sum(axis = 1))
+    centers = np.array(centers, dtype = np.float32)
+
+    counts = np.zeros(num_colors, dtype = np.float64)
+    for _ in range(iterations):
+        batch = samples[rng.integers(0, samples.shape[0], size = min(batch_size, samples.shape[0]))]
+        labels = ((batch[:, None, :] - centers[None, :, :]) ** 2).sum(axis = 2).argmin(axis = 1)
+        batch_counts = np.bincount(labels, minlength = num_colors)
+        batch_sums = np.zeros_like(centers)
+        np.add.at(batch_sums, labels, batch)
+
+        counts += batch_counts
+        updated = batch_counts > 0
+        # per-center learning rate 1/count, moves the center towards the mean of its batch members
+        rate = (batch_counts[updated] / counts[updated])[:, None].astype(np.float32)
+        centers[updated] += rate * (batch_sums[updated] / batch_counts[updated][:, None] - centers[updated])
+
+    # final assignment of all samples for the dominance order
+    labels = np.concatenate([((chunk[:, None, :] - centers[None, :, :]) ** 2).sum(axis = 2).argmin(axis = 1)
+                             for chunk in np.array_split(samples, max(1, samples.shape[0] // 8192))])
+    cluster_sizes = np.bincount(labels, minlength = num_colors)
+    order = np.argsort(-cluster_sizes, kind = "stable")
+    return centers[order], cluster_sizes[order]
+
+# ------------------------------------------------
+def extract_palette(pixels: np.ndarray, num_colors: int, max_samples: int = MAX_SAMPLES) -> np.ndarray:
+    """Returns the (num_colors, 4) RGBA palette of the dominant colors of an (M,3) or (M,4) pixel array."""
+    import numpy as np
+    samples = sample_pixels(pixels, max_samples)
+    if samples.shape[0] == 0:
+        return np.zeros((num_colors, 4), dtype = np.float32)
+
+    centers, _ = mini_batch_kmeans(samples, num_colors)
+    palette = np.ones((num_colors, 4), dtype = np.float32)
+    palette[:centers.shape[0], :3] = np.clip(centers, 0.0, 1.0)
+    palette[centers.shape[0]:, :3] = palette[max(0, centers.shape[0] - 1), :3]  # fewer distinct colors than requested
+    return palette
+
+# ------------------------------------------------
+def load_image_pixels(filepath: str, max_samples: int = MAX_SAMPLES) -> np.ndarray:
+    """
+    Decodes an image file with Pillow at a reduced size (JPEG draft mode / stride) which is still larger than
+    needed for max_samples, so also 8K textures are read fast. Returns an (M,4) float32 RGBA array,
+    sRGB encoded like the 8 bit values of the file.
+    """
+    import numpy as np
+    from PIL import Image                           # type: ignore
+
+    with Image.open(filepath) as image:
+        # enough pixels for the stride sampling, but not more
+        target_pixels = 4 * max_samples
+        scale = int((image.width * image.height / target_pixels) ** 0.5)
+        if scale > 1:
+            image.draft("RGB", (image.width // scale, image.height // scale))   # only has an effect for JPEG
+        factor = int((image.width * image.height / target_pixels) ** 0.5)
+        if factor > 1:
+            # nearest neighbour is a stride sampling, averaging would create mixed colors not in the image
+            image = image.resize((image.width // factor, image.height // factor), Image.Resampling.NEAREST)
+        pixels = np.asarray(image.convert("RGBA"), dtype = np.float32) / 255.0
+    return pixels.reshape(-1, 4)
+
+# ------------------------------------------------
+def get_file_palette(filepath: str, num_colors: int, max_samples: int = MAX_SAMPLES) -> np.ndarray:
+    """Palette of an image file, cached until the file changes."""
+    key = get_file_key(filepath, num_colors, max_samples)
+    palette = palette_cache.get(key)
+    if palette is None:
+        palette = extract_palette(load_image_pixels(filepath, max_samples), num_colors, max_samples)
+        palette_cache[key] = palette
+    return palette
+
+# ------------------------------------------------
+def get_pixel_palette(signature: tuple, read_pixels, num_colors: int, max_samples: int = MAX_SAMPLES) -> np.ndarray:
+    """
+    Palette of a pixel buffer (e.g. a Blender image in memory), cached until the signature changes.
+    read_pixels() returns the (M,3) or (M,4) pixels and is only called if the palette is not cached.
+    """
+    key = get_pixel_key(signature, num_colors, max_samples)
+    palette = palette_cache.get(key)
+    if palette is None:
+        palette = extract_palette(read_pixels(), num_colors, max_samples)
+        palette_cache[key] = palette
+    return palette
+
+# ------------------------------------------------
+def load_palette_index(index_filepath: str) -> int:
+    """
+    Loads a palette index written by ccn_palette_batch into the cache. Entries of files which were changed
+    after indexing get other cache keys and are calculated again when used. Returns the number of entries.
+    """
+    import json
+    import numpy as np
+
+    count = 0
+    with open(index_filepath, encoding = "utf-8") as index_file:
+        for line in index_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            key = (entry["file"], entry["mtime_ns"], entry["size"], entry["num_colors"], entry["max_samples"])
+            palette_cache[key] = np.asarray(entry["colors"], dtype = np.float32)
+            count += 1
+    return count
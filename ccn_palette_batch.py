@@ -0,0 +1,120 @@
+"""
+Headless batch palette extraction for a texture library.
+
+Decodes the image files in a process pool, extracts the dominant colors and their harmony palettes and
+streams the results into a palette index file (JSON Lines, one image per line). The Palette Extract node
+loads such an index into its cache, so indexed images are not decoded again.
+
+Usage:
+    python ccn_palette_batch.py <folder or files> [--output palettes.jsonl] [--colors 4] [--harmony TRIADIC]
+    blender -b --python ccn_palette_batch.py -- <folder or files> [options]
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+if __package__:
+    from . import ccn_palette as ccnp
+    from . import ccn_color as ccnc
+else:
+    # started as script: load the sibling modules without the add-on package, which would need bpy
+    import importlib.util
+
+    def _load_sibling(module_name: str):
+        module_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{module_name}.py")
+        spec = importlib.util.spec_from_file_location(module_name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    ccnp = _load_sibling("ccn_palette")
+    ccnc = _load_sibling("ccn_color")
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tga", ".tif", ".tiff", ".bmp", ".webp"}
+
+# ------------------------------------------------
+def find_image_files(paths) -> list:
+    """Returns all image files of the given files and folders (recursive), sorted."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names
+                             if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        elif os.path.isfile(path):
+            files.append(path)
+    return sorted(os.path.abspath(f) for f in files)
+
+# ------------------------------------------------
+def process_file(filepath: str, num_colors: int, max_samples: int, harmony_types: list, angle: float) -> dict:
+    """
+    Worker: decodes one image and returns its index entry (runs in a separate process). The colors are sRGB
+    encoded like the image, the harmonies are calculated from the linear base color like in the Harmony Color
+    node and are linear.
+    """
+    import numpy as np
+    key = ccnp.get_file_key(filepath, num_colors, max_samples)
+    colors = ccnp.extract_palette(ccnp.load_image_pixels(filepath, max_samples), num_colors, max_samples)
+    base_color = np.concatenate((ccnc.srgb_to_linear_array(colors[:1, :3]), colors[:1, 3:]), axis = 1)
+    return {
+        "file":         key[0],
+        "mtime_ns":     key[1],
+        "size":         key[2],
+        "num_colors":   num_colors,
+        "max_samples":  max_samples,
+        "colors":       [[round(float(c), 6) for c in color] for color in colors],
+        "harmonies":    {harmony_type: [[round(float(c), 6) for c in color]
+                                        for color in ccnc.harmony_palette(base_color, harmony_type, angle)[0]]
+                         for harmony_type in harmony_types},
+    }
+
+# ------------------------------------------------
+def build_palette_index(paths, output: str, num_colors: int = 4, max_samples: int = ccnp.MAX_SAMPLES,
+                        harmony_types = None, angle: float = 30.0, workers = None) -> int:
+    """
+    Extracts the palettes of all image files in a process pool and writes each result as soon as it is ready.
+    Returns the number of indexed images, files which cannot be decoded are reported and skipped.
+    """
+    files = find_image_files(paths)
+    harmony_types = list(harmony_types or ccnc.harmony_registry.keys())
+    written = 0
+
+    with open(output, "w", encoding = "utf-8") as index_file, ProcessPoolExecutor(max_workers = workers) as pool:
+        futures = {pool.submit(process_file, f, num_colors, max_samples, harmony_types, angle): f for f in files}
+        for future in as_completed(futures):
+            try:
+                entry = future.result()
+            except Exception as e:
+                print(f"Error extracting palette of '{futures[future]}': {e}")
+                continue
+            index_file.write(json.dumps(entry) + "\n")
+            index_file.flush()
+            written += 1
+            print(f"[{written}/{len(files)}] {entry['file']}")
+    return written
+
+# ------------------------------------------------
+def main(argv = None):
+    if argv is None:
+        argv = sys.argv[1:]
+        if "--" in argv:        # started with blender -b --python ... -- <arguments>
+            argv = argv[argv.index("--") + 1:]
+
+    parser = argparse.ArgumentParser(description = "Extract dominant colors and harmony palettes of image files.")
+    parser.add_argument("paths", nargs = "+", help = "image files or folders")
+    parser.add_argument("--output", default = "palettes.jsonl", help = "palette index file (JSON Lines)")
+    parser.add_argument("--colors", type = int, default = 4, help = "number of dominant colors per image")
+    parser.add_argument("--samples", type = int, default = ccnp.MAX_SAMPLES, help = "pixels sampled per image")
+    parser.add_argument("--harmony", action = "append", help = "harmony type of the palettes, default all")
+    parser.add_argument("--angle", type = float, default = 30.0, help = "harmony angle in degrees")
+    parser.add_argument("--workers", type = int, default = None, help = "number of processes, default all cores")
+    args = parser.parse_args(argv)
+
+    count = build_palette_index(args.paths, args.output, args.colors, args.samples, args.harmony, args.angle, args.workers)
+    print(f"{count} palettes written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Measures the startup cost of the add-on: the import time of every module which is loaded by importing the
+add-on package and the time of register() and unregister(). Also reports if Pillow or the preview collection
+were created during startup, both should only happen when the first Harmony Color node draws its color wheel.
+
+Usage:
+    blender -b --factory-startup --python ccn_startup_timing.py [-- --top 20]
+"""
+from __future__ import annotations
+import argparse
+import importlib
+import importlib.abc
+import os
+import sys
+import time
+
+# ------------------------------------------------
+class TimingFinder(importlib.abc.MetaPathFinder):
+    """Meta path finder which wraps the loader of each imported module to measure its execution time."""
+    def __init__(self):
+        self.timings = []   # (module name, nesting depth, cumulative seconds, own seconds)
+        self.stack = []     # time of the nested imports of the modules currently executed
+
+    def find_spec(self, fullname, path, target = None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = TimingLoader(spec.loader, self)
+                return spec
+        return None
+
+class TimingLoader(importlib.abc.Loader):
+    def __init__(self, loader, finder: TimingFinder):
+        self.loader = loader
+        self.finder = finder
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        depth = len(self.finder.stack)
+        self.finder.stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self.finder.stack.pop()
+            if self.finder.stack:
+                self.finder.stack[-1] += elapsed
+            self.finder.timings.append((module.__name__, depth, elapsed, elapsed - nested))
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+# ------------------------------------------------
+def measure(top: int = 15):
+    addon_dir = os.path.dirname(os.path.abspath(__file__))
+    parent_dir, package_name = os.path.split(addon_dir)
+    if parent_dir not in sys.path:
+        sys.path.insert(0, parent_dir)
+
+    finder = TimingFinder()
+    sys.meta_path.insert(0, finder)
+    start = time.perf_counter()
+    try:
+        package = importlib.import_module(package_name)
+    finally:
+        sys.meta_path.remove(finder)
+    import_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    package.register()
+    register_time = time.perf_counter() - start
+
+    harmony_nodes = sys.modules.get(f"{package_name}.ColorHarmonyNodes")
+    pil_loaded = "PIL" in sys.modules
+    previews_created = harmony_nodes is not None and harmony_nodes.color_wheel_previews is not None
+
+    start = time.perf_counter()
+    package.unregister()
+    unregister_time = time.perf_counter() - start
+
+    print(f"\nImport of '{package_name}': {import_time * 1000:8.1f} ms ({len(finder.timings)} modules)")
+    print(f"register():              {register_time * 1000:8.1f} ms")
+    print(f"unregister():            {unregister_time * 1000:8.1f} ms")
+    print(f"Pillow imported:         {'yes' if pil_loaded else 'no'}")
+    print(f"Preview collection:      {'created' if previews_created else 'not created'}")
+
+    print(f"\nSlowest modules (own time, cumulative time including their imports):")
+    for name, depth, cumulative, own in sorted(finder.timings, key = lambda t: t[3], reverse = True)[:top]:
+        print(f"  {own * 1000:8.1f} ms  {cumulative * 1000:8.1f} ms  {'  ' * depth}{name}")
+
+# ------------------------------------------------
+def main(argv = None):
+    if argv is None:
+        argv = sys.argv[1:]
+        argv = argv[argv.index("--") + 1:] if "--" in argv else []    # Blender's own arguments are ignored
+
+    parser = argparse.ArgumentParser(description = "Measure the import and registration time of the add-on.")
+    parser.add_argument("--top", type = int, default = 15, help = "number of modules listed")
+    args = parser.parse_args(argv)
+    measure(args.top)
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,8 @@ class CCNNodeCategory:
         self.identifier = self.get_idname_from_label(name)
         self.tree_type = node_editor.bl_idname
         self.force_overwrite = force_overwrite
+        self.node_items = None          # list of the NodeItems, created with the first append_nodes()
+        self.node_idnames = set()       # bl_idnames of the node items, for the membership test
 
         self.create_items_list(items)
         self.create_dynamic_category_class()
@@ -61,22 +63,31 @@ class CCNNodeCategory:
         Add one or more nodes to the current category and reregisters the category
         """
         self.unregister()
+        self.append_nodes(*node_classes)
+        self.register()
 
-        if callable(self.items):
-            current_items = list(self.items(None))  # get the current items list
-        else:
-            current_items = self.items
+    # ------------------------------------------------
+    def append_nodes(self, *node_classes):
+        """
+        Add one or more nodes to the current category without registering it again,
+        used if all categories of an editor are registered together
+        """
+        if self.node_items is None:
+            # take over the items the category was created with
+            self.node_items = list(self.items(None)) if callable(self.items) else list(self.items)
+            self.node_idnames = {item.nodetype for item in self.node_items}
 
         for node_class in node_classes:
             # check if the node is already in the list
-            if not any(item.nodetype == node_class.bl_idname for item in current_items):
-                current_items.append(NodeItem(node_class.bl_idname))
+            if node_class.bl_idname not in self.node_idnames:
+                self.node_idnames.add(node_class.bl_idname)
+                self.node_items.append(NodeItem(node_class.bl_idname))
 
         # update the items list as new callable
+        current_items = self.node_items
         self.items = lambda context: current_items
 
         self.create_dynamic_category_class()
-        self.register()
 
     # ------------------------------------------------
     @classmethod
@@ -111,7 +122,7 @@ class CCNNodeCategory:
 # ---------------------------------------------------------------------------------------
 class CCNNodeEditor:
     # ------------------------------------------------
-    def __init__(self, name: str, icon: str = 'NODETREE', force_overwrite:bool = False):
+    def __init__(self, name: str, icon: str = 'NODETREE', force_overwrite:bool = False, tree_update = None):
         """
         Initializes a new node editor manager.
 
@@ -119,22 +130,29 @@ class CCNNodeEditor:
         - name: The display name of the node tree editor.
         - icon: The icon to use for the node tree in Blender.
         - force_overwrite: If True, any registered class with the same bl_idname will be overwritten (unregistered)
+        - tree_update: Optional function(node_tree) called by Blender when nodes or links of a tree were changed
         """
         self.name = name
         self.bl_icon = icon
         self.bl_idname = self.get_idname_from_label(self.name)
         self.bl_label = self.name
         self.force_overwrite = force_overwrite
-        self.categories = []    # List to track all registered category classes
+        self.categories = []        # List to track all registered category classes
+        self.category_labels = {}   # category label -> CCNNodeCategory, index of self.categories
+        self.categories_identifier = f"{self.bl_idname}_CATEGORIES"    # used by register_categories()
+        self.categories_registered = False
         # Dynamically generate a NodeTree class
+        class_dict = {
+            'bl_idname': self.bl_idname,  # Unique identifier for the node tree
+            'bl_label':  self.bl_label,   # Display label in Blender
+            'bl_icon':   self.bl_icon,    # Icon for the node tree
+        }
+        if tree_update is not None:
+            class_dict['update'] = lambda node_tree: tree_update(node_tree)
         self.editor_class = type(
             f"{self.name.replace(' ', '')}NodeTree",  # Dynamic class name
             (NodeTree,),  # Base class is NodeTree
-            {
-                'bl_idname': self.bl_idname,  # Unique identifier for the node tree
-                'bl_label':  self.bl_label,   # Display label in Blender
-                'bl_icon':   self.bl_icon,    # Icon for the node tree
-            }
+            class_dict
         )
     
     # ------------------------------------------------
@@ -142,18 +160,31 @@ class CCNNodeEditor:
     def get_idname_from_label(cls, label: str) -> str:
         return f"CCN_NodeEditor{label.replace(' ', '')}NodeTreeType"
     
+    # ------------------------------------------------
+    def add_category_to_index(self, category: CCNNodeCategory):
+        """Appends the category to the list, a category with the same label is replaced."""
+        self.remove_category_from_index(category.label)
+        self.categories.append(category)
+        self.category_labels[category.label] = category
+
+    # ------------------------------------------------
+    def remove_category_from_index(self, label: str):
+        category = self.category_labels.pop(label, None)
+        if category is not None:
+            self.categories.remove(category)
+
     # ------------------------------------------------
     def get_or_create_category(self, category_name):
         """
         Retrieves an existing category or creates a new one.
         """
-        for category in self.categories:
-            if category.label == category_name and category.tree_type == self.bl_idname:
-                return category
+        category = self.category_labels.get(category_name)
+        if category is not None:
+            return category
 
         # create a new category if it was not found above
         new_category = CCNNodeCategory(name = category_name,node_editor = self)
-        self.categories.append(new_category)
+        self.add_category_to_index(new_category)
         new_category.register()
         return new_category
         
@@ -165,11 +196,11 @@ class CCNNodeEditor:
             category_names = category_names[0]  # unpack the list
 
         for category_name in category_names:
-            existing_category = next((c for c in self.categories if c.label == category_name), None)
+            existing_category = self.category_labels.get(category_name)
             if existing_category:
                 if force_overwrite:
                     existing_category.unregister()
-                    self.categories.remove(existing_category)
+                    self.remove_category_from_index(category_name)
                 else:
                     print(f"Warning: Category '{category_name}' already exists.")
             category_list.append(self.get_or_create_category(category_name))                
@@ -195,6 +226,57 @@ class CCNNodeEditor:
                 category.add_nodes(*node_classes)
     
     
+    # ------------------------------------------------
+    def register_categories(self, category_dict: dict[str, list[type[Node]]], force_overwrite: bool = False):
+        """
+        Creates the categories of the dictionary with their nodes and registers all categories of the editor
+        in one single registration, instead of one (or more) per category like create_categories_from_dict().
+        Calling it again with the same dictionary gives the same result.
+
+        Parameters:
+        - category_dict: A dictionary containing the category labels as keys and lists of node classes as values.
+        - force_overwrite: If True, the categories are replaced by the ones of the dictionary (categories which are
+          not in it anymore are removed from the "Add" menu), otherwise the nodes are added to the existing categories.
+        """
+        self.unregister_categories()
+
+        if force_overwrite:
+            for label in [label for label in self.category_labels if label not in category_dict]:
+                try:    # the category could also be registered on its own by get_or_create_category()
+                    nodeitems_utils.unregister_node_categories(self.category_labels[label].identifier)
+                except KeyError:
+                    pass
+                self.remove_category_from_index(label)
+
+        for label, node_classes in category_dict.items():
+            category = self.category_labels.get(label)
+            if category is not None and force_overwrite:
+                category = None
+            if category is None:
+                category = CCNNodeCategory(name = label, node_editor = self)
+                self.add_category_to_index(category)
+            category.append_nodes(*node_classes)
+
+        try:
+            nodeitems_utils.register_node_categories(self.categories_identifier,
+                                                     [category.category_class for category in self.categories])
+            self.categories_registered = True
+            print(f"{len(self.categories)} categories of editor '{self.name}' successfully registered.")
+        except Exception as e:
+            print(f"Error registering the categories of editor '{self.name}': {e}")
+
+    # ------------------------------------------------
+    def unregister_categories(self):
+        """
+        Unregisters the categories registered with register_categories(), also if they were registered
+        by a previous instance of the editor (e.g. before reloading the add-on).
+        """
+        try:
+            nodeitems_utils.unregister_node_categories(self.categories_identifier)
+        except KeyError:
+            pass    # not registered
+        self.categories_registered = False
+
     # ------------------------------------------------
     def register(self):
         try:
@@ -223,39 +305,39 @@ class CCNNodeEditor:
         """
         Unregister all categories in reverse order.
         """
-        for category in reversed(self.categories):
-            category.unregister()
+        if self.categories_registered:
+            self.unregister_categories()
+        else:
+            for category in reversed(self.categories):
+                category.unregister()
 
         self.categories.clear()
+        self.category_labels.clear()
 
 # ----------------------------------------------------------------------------------
 class CCNNodeEditorManager:
     # ------------------------------------------------
     def __init__(self):
-        self.editors = []       # List to track all registered editor classes
+        self.editors = []           # List to track all registered editor classes
+        self.editor_labels = {}     # editor name (= bl_label) -> CCNNodeEditor, index of self.editors
+        self.editor_idnames = {}    # bl_idname -> CCNNodeEditor
 
     # ------------------------------------------------
     def is_idname_unique(self, idname: str) -> bool:
         """
         Checks if the bl_idname is unique among already registered editors.
         """
-        for editor in self.editors:
-            if editor.bl_idname == idname:
-                return False
-        return True
+        return idname not in self.editor_idnames
 
     # ------------------------------------------------
     def is_label_unique(self, label: str) -> bool:
         """
         Checks if the bl_label is unique among already registered editors.
         """
-        for editor in self.editors:
-            if editor.bl_label == label:
-                return False
-        return True
+        return label not in self.editor_labels
 
     # ------------------------------------------------
-    def add_editor(self, name: str, icon: str = 'NODETREE', force_overwrite:bool = False):
+    def add_editor(self, name: str, icon: str = 'NODETREE', force_overwrite:bool = False, tree_update = None):
         
         test_flag: bool
         if force_overwrite:
@@ -265,9 +347,11 @@ class CCNNodeEditorManager:
                         self.is_label_unique(name)
     
         if test_flag:
-            new_editor = CCNNodeEditor(name, icon, force_overwrite)
+            new_editor = CCNNodeEditor(name, icon, force_overwrite, tree_update)
             new_editor.register()
             self.editors.append(new_editor)
+            self.editor_labels[new_editor.bl_label] = new_editor
+            self.editor_idnames[new_editor.bl_idname] = new_editor
             return new_editor
         else:
             print(f"Error: Could not add editor '{name}'. Name or ID is not unique.")
@@ -278,10 +362,7 @@ class CCNNodeEditorManager:
         """
         Retrieves an editor by its name.
         """
-        for editor in self.editors:
-            if editor.name == name:
-                return editor
-        return None
+        return self.editor_labels.get(name)
     
     # ------------------------------------------------
     def get_or_create_editor(self, name):
@@ -299,6 +380,8 @@ class CCNNodeEditorManager:
         if editor:
             editor.unregister()
             self.editors.remove(editor)
+            del self.editor_labels[name]
+            self.editor_idnames.pop(editor.bl_idname, None)
             print(f"Editor '{name}' successfully unregistered.")
         else:
             print(f"No editor with name '{name}' found.")
@@ -312,4 +395,97 @@ class CCNNodeEditorManager:
             editor.unregister_all()
 
         self.editors.clear()
+        self.editor_labels.clear()
+        self.editor_idnames.clear()
         print("All nodes, categories, and editors successfully unregistered.")
+
+# ----------------------------------------------------------------------------------
+class CCNNodeEditorBuilder:
+    """
+    Collects editors, categories and nodes first and registers them with commit(), each editor with
+    one registration of all its categories. Example:
+
+        builder = CCNNodeEditorBuilder()
+        builder.add_editor("My Nodes", force_overwrite = True)
+        builder.add_categories_from_dict("My Nodes", {"Math": [MyNumberNode], "Output": [MyOutputNode]})
+        editors = builder.commit()
+    """
+    # ------------------------------------------------
+    def __init__(self, manager: CCNNodeEditorManager = None):
+        self.manager = manager if manager is not None else CCNNodeEditorManager()
+        self.editor_settings = {}   # editor name -> (icon, force_overwrite, tree_update)
+        self.editor_categories = {} # editor name -> {category label: {node class: None}} (ordered sets)
+
+    # ------------------------------------------------
+    def add_editor(self, name: str, icon: str = 'NODETREE', force_overwrite: bool = False,
+                   tree_update = None) -> CCNNodeEditorBuilder:
+        self.editor_settings[name] = (icon, force_overwrite, tree_update)
+        self.editor_categories.setdefault(name, {})
+        return self
+
+    # ------------------------------------------------
+    def add_category(self, editor_name: str, label: str, *node_classes: type[Node]) -> CCNNodeEditorBuilder:
+        """Adds a category (if new) and the nodes to an editor added with add_editor()."""
+        if editor_name not in self.editor_settings:
+            raise KeyError(f"Editor '{editor_name}' was not added to the builder.")
+        self.editor_categories[editor_name].setdefault(label, {}).update(dict.fromkeys(node_classes))
+        return self
+
+    # ------------------------------------------------
+    def add_categories_from_dict(self, editor_name: str, category_dict: dict[str, list[type[Node]]]) -> CCNNodeEditorBuilder:
+        for label, node_classes in category_dict.items():
+            self.add_category(editor_name, label, *node_classes)
+        return self
+
+    # ------------------------------------------------
+    def commit(self) -> List[CCNNodeEditor]:
+        """
+        Registers the collected editors and their categories and returns the editors.
+        Editors with force_overwrite are created again, other existing editors get the new categories and nodes.
+        An editor which can't be added (e.g. its name is not unique) is missing in the list.
+        """
+        editors = []
+        for name, (icon, force_overwrite, tree_update) in self.editor_settings.items():
+            editor = self.manager.get_editor(name)
+            if editor is not None and force_overwrite:
+                editor.unregister_all()
+                self.manager.unregister_editor(name)
+                editor = None
+            if editor is None:
+                editor = self.manager.add_editor(name, icon, force_overwrite, tree_update)
+            if editor is None:
+                continue
+
+            editor.register_categories(self.editor_categories[name], force_overwrite = force_overwrite)
+            editors.append(editor)
+        return editors
+
+# ----------------------------------------------------------------------------------
+# Application handlers (bpy.app.handlers) of the add-on modules, which survive a reload of the add-on
+
+# ------------------------------------------------
+def is_module_handler(handler, function) -> bool:
+    """True if the handler is the function or the function of the same name of a previous version of its module."""
+    return getattr(handler, "__module__", None) == function.__module__ and \
+           getattr(handler, "__name__", None) == function.__name__
+
+# ------------------------------------------------
+def register_app_handlers(handler_functions):
+    """
+    Appends the functions to the handler lists, given as (handler list name, function) pairs.
+    A reloaded module has new handler functions, the ones of the previous module version are replaced.
+    """
+    for list_name, function in handler_functions:
+        handlers = getattr(bpy.app.handlers, list_name)
+        for handler in [h for h in handlers if is_module_handler(h, function) and h is not function]:
+            handlers.remove(handler)
+        if function not in handlers:
+            handlers.append(function)
+
+# ------------------------------------------------
+def unregister_app_handlers(handler_functions):
+    """Removes the functions, also of previous module versions, from the handler lists."""
+    for list_name, function in handler_functions:
+        handlers = getattr(bpy.app.handlers, list_name)
+        for handler in [h for h in handlers if is_module_handler(h, function)]:
+            handlers.remove(handler)
@@ -0,0 +1,13 @@
+import os
+import sys
+import types
+
+# The add-on __init__ imports bpy, the modules under test don't: they are loaded as submodules of a package
+# module which points at the add-on folder, so their relative imports work without running __init__.
+PACKAGE_NAME = "ccustomnodes"
+ADDON_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if PACKAGE_NAME not in sys.modules:
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [ADDON_DIRECTORY]
+    sys.modules[PACKAGE_NAME] = package
@@ -0,0 +1,47 @@
+import numpy as np
+
+from ccustomnodes import ccn_arrays as ccna
+
+# ------------------------------------------------
+def test_fit_length():
+    np.testing.assert_array_equal(ccna.fit_length(2.0, 3), [2.0, 2.0, 2.0])
+    np.testing.assert_array_equal(ccna.fit_length(np.array([1.0, 2.0]), 5), [1.0, 2.0, 1.0, 2.0, 1.0])
+    np.testing.assert_array_equal(ccna.fit_length(np.array([1.0, 2.0, 3.0]), 2), [1.0, 2.0])
+    colors = np.arange(8.0).reshape(2, 4)
+    assert ccna.fit_length(colors, 3).shape == (3, 4)
+
+    values = np.array([1.0, 2.0, 3.0])
+    assert ccna.fit_length(values, 3) is values
+
+# ------------------------------------------------
+def test_fit_length_reports_mismatch_once(capsys):
+    ccna.reported_length_mismatches.clear()
+    ccna.fit_length(np.array([1.0, 2.0]), 7)
+    ccna.fit_length(np.array([3.0, 4.0]), 7)
+    ccna.fit_length(np.array([5.0]), 7)         # a single value is broadcast silently
+    assert capsys.readouterr().out.count("Warning") == 1
+
+# ------------------------------------------------
+def test_broadcast_values():
+    a, b, c = ccna.broadcast_values(np.array([1.0, 2.0]), 3.0, np.array([4.0, 5.0, 6.0, 7.0]))
+    np.testing.assert_array_equal(a, [1.0, 2.0, 1.0, 2.0])
+    assert b == 3.0
+    np.testing.assert_array_equal(c, [4.0, 5.0, 6.0, 7.0])
+    assert ccna.broadcast_values(1.0, 2.0) == [1.0, 2.0]
+
+# ------------------------------------------------
+def test_safe_divide():
+    assert ccna.safe_divide(1.0, 0.0) == 0.0
+    np.testing.assert_array_equal(ccna.safe_divide(np.array([1.0, 2.0]), np.array([0.0, 4.0])), [0.0, 0.5])
+
+# ------------------------------------------------
+def test_reduce_values():
+    assert ccna.reduce_values(1.0, 2.0, 3.0) == (6.0, 6.0, 1.0, 3.0, 2.0, 2.0 / 3.0)
+    total, *_ = ccna.reduce_values(np.array([1.0, 2.0]), 1.0)
+    np.testing.assert_array_equal(total, [2.0, 3.0])
+
+# ------------------------------------------------
+def test_fit_colors():
+    colors = ccna.fit_colors(np.array([[1.0, 0.0, 0.0, 1.0]]), 2)
+    assert colors.shape == (2, 4) and colors.dtype == np.float32
+    np.testing.assert_array_equal(ccna.fit_colors(np.array([0.5, 0.25]), 2)[1], [0.25, 0.25, 0.25, 1.0])
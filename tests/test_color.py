@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from ccustomnodes import ccn_color as ccnc
+
+# ------------------------------------------------
+def test_oklab_round_trip():
+    linear = np.random.default_rng(3).uniform(0.0, 1.0, (200, 3))
+    np.testing.assert_allclose(ccnc.oklab_to_linear_array(ccnc.linear_to_oklab_array(linear)), linear, atol = 1e-6)
+
+    # the steep sRGB curve near black amplifies the rounding of the published matrices
+    srgb = np.random.default_rng(4).uniform(0.0, 1.0, (200, 3))
+    np.testing.assert_allclose(ccnc.oklab_to_rgb_array(ccnc.rgb_to_oklab_array(srgb)), srgb, atol = 1e-5)
+
+# ------------------------------------------------
+def test_oklab_reference_values():
+    np.testing.assert_allclose(ccnc.linear_to_oklab_array([1.0, 1.0, 1.0]), [1.0, 0.0, 0.0], atol = 1e-4)
+    np.testing.assert_allclose(ccnc.linear_to_oklab_array([0.0, 0.0, 0.0]), [0.0, 0.0, 0.0], atol = 1e-9)
+
+# ------------------------------------------------
+def test_hsv_round_trip():
+    rgb = np.random.default_rng(5).uniform(0.0, 1.0, (100, 3))
+    np.testing.assert_allclose(ccnc.hsv_to_rgb_array(ccnc.rgb_to_hsv_array(rgb)), rgb, atol = 1e-9)
+
+# ------------------------------------------------
+def test_register_harmony_rejects_color_count():
+    too_many = ccnc.HarmonyDefinition("TEST_TOO_MANY", "Too Many", lambda angle: (angle, 2 * angle, 3 * angle, 4 * angle))
+    with pytest.raises(ValueError):
+        ccnc.register_harmony(too_many)
+    assert "TEST_TOO_MANY" not in ccnc.harmony_registry
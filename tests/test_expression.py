@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from ccustomnodes import ccn_expression as ccnx
+
+# ------------------------------------------------
+@pytest.mark.parametrize("text", [
+    "a.__class__",                  # attribute access
+    "__import__('os')",             # unknown function and string constant
+    "open('file')",
+    "(lambda: 1)()",
+    "a[0]",
+    "[a, b]",
+    "a if b else c",
+    "sin(x = a)",                   # keyword argument
+    "sin(a, b)",                    # too many arguments
+    "atan2(a)",                     # too few arguments
+    "lerp(a, b)",
+    "round(a, b)",                  # number of digits must be a whole number
+    "round(a, 1.5)",
+    "'text'",
+    "_a + 1",
+    "a +",                          # syntax error
+])
+def test_rejected_expressions(text):
+    with pytest.raises(ValueError):
+        ccnx.compile_expression(text)
+
+# ------------------------------------------------
+def test_variable_names_in_order_of_appearance():
+    assert ccnx.get_variable_names("b * sin(a) + pi * b + c") == ["b", "a", "c"]
+
+# ------------------------------------------------
+def test_evaluate_single_values():
+    assert ccnx.evaluate_expression("a * 2 + round(b, 1)", {"a": 1.5, "b": 0.26}) == pytest.approx(3.3)
+    assert ccnx.evaluate_expression("clamp(a) + lerp(0, 10, b)", {"a": 3.0, "b": 0.25}) == pytest.approx(3.5)
+
+# ------------------------------------------------
+def test_evaluate_arrays_and_invalid_values():
+    result = ccnx.evaluate_expression("a / b + log(b - 1)", {"a": np.array([1.0, 2.0, 3.0]), "b": np.array([0.0, 2.0, 4.0])})
+    np.testing.assert_allclose(result, [0.0, 1.0, 0.75 + np.log(3.0)])
+
+# ------------------------------------------------
+def test_missing_variable():
+    with pytest.raises(ValueError):
+        ccnx.evaluate_expression("a + b", {"a": 1.0})
@@ -0,0 +1,46 @@
+import numpy as np
+
+from ccustomnodes import ccn_arrays as ccna
+from ccustomnodes import ccn_expression as ccnx
+from ccustomnodes import ccn_fusion as ccnf
+
+EXPRESSION = "a * sin(b) + 1 / c"
+
+# x0 + x1 -> x2 / n0 -> Dynamic Input (n0, n1, x3) -> Expression (n1, Dynamic mean, Dynamic maximum) - x0
+STRUCTURE = ((('OPERATOR', 'ADD', (('x', 0), ('x', 1))),
+              ('OPERATOR', 'DIV', (('x', 2), ('n', 0, 0))),
+              ('DYNAMIC', None, (('n', 0, 0), ('n', 1, 0), ('x', 3))),
+              ('EXPRESSION', (EXPRESSION, ("a", "b", "c")), (('n', 1, 0), ('n', 2, 4), ('n', 2, 3))),
+              ('OPERATOR', 'SUB', (('n', 3, 0), ('x', 0)))),
+             4,
+             (('n', 4, 0), ('n', 2, 0), ('n', 1, 0)))
+
+# ------------------------------------------------
+def evaluate_node_by_node(*inputs):
+    """The results of the nodes of STRUCTURE, each node evaluated on its own like without fusion."""
+    x = ccna.broadcast_values(*inputs)
+    added = x[0] + x[1]
+    divided = ccna.safe_divide(x[2], added)
+    dynamic = ccna.reduce_values(added, divided, x[3])
+    expression = ccnx.evaluate_expression(EXPRESSION, {"a": divided, "b": dynamic[4], "c": dynamic[3]})
+    return (expression - x[0], dynamic[0], divided)
+
+# ------------------------------------------------
+def test_fused_kernel_single_values():
+    inputs = (1.0, 2.0, 6.0, -4.0)
+    fused = ccnf.get_kernel(STRUCTURE)(*inputs)
+    np.testing.assert_allclose(fused, evaluate_node_by_node(*inputs))
+
+# ------------------------------------------------
+def test_fused_kernel_arrays():
+    rng = np.random.default_rng(7)
+    inputs = (rng.uniform(-1.0, 1.0, 100), 0.5, rng.uniform(0.0, 2.0, 100), rng.uniform(-3.0, 3.0, 50))
+    inputs[0][:3] = -0.5        # divisions by zero
+    fused = ccnf.get_kernel(STRUCTURE)(*inputs)
+    for fused_result, result in zip(fused, evaluate_node_by_node(*inputs)):
+        assert fused_result.shape == (100,)
+        np.testing.assert_allclose(fused_result, result)
+
+# ------------------------------------------------
+def test_kernel_is_cached():
+    assert ccnf.get_kernel(STRUCTURE) is ccnf.get_kernel(STRUCTURE)
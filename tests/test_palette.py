@@ -0,0 +1,22 @@
+import numpy as np
+
+from ccustomnodes import ccn_palette as ccnp
+
+# ------------------------------------------------
+def test_extract_palette_dominant_colors():
+    red, blue = [0.9, 0.1, 0.1, 1.0], [0.1, 0.2, 0.8, 1.0]
+    pixels = np.array([red] * 3000 + [blue] * 1000 + [[0.0, 1.0, 0.0, 0.0]] * 2000)    # transparent green is ignored
+    palette = ccnp.extract_palette(pixels, 2)
+    assert palette.shape == (2, 4)
+    np.testing.assert_allclose(palette, [red, blue], atol = 1e-3)
+
+# ------------------------------------------------
+def test_extract_palette_fewer_colors_than_requested():
+    palette = ccnp.extract_palette(np.full((500, 3), 0.5), 3)
+    np.testing.assert_allclose(palette, np.tile([0.5, 0.5, 0.5, 1.0], (3, 1)), atol = 1e-6)
+
+# ------------------------------------------------
+def test_extract_palette_without_opaque_pixels():
+    transparent = np.tile([0.2, 0.4, 0.6, 0.0], (100, 1))        # all pixels are used if none is opaque
+    np.testing.assert_allclose(ccnp.extract_palette(transparent, 1), [[0.2, 0.4, 0.6, 1.0]], atol = 1e-6)
+    np.testing.assert_array_equal(ccnp.extract_palette(np.zeros((0, 4)), 2), np.zeros((2, 4)))